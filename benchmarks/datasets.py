@@ -0,0 +1,145 @@
+"""Module to generate synthetic databases and workbooks for the benchmarks"""
+
+import itertools
+import random
+from datetime import date, timedelta
+
+import openpyxl
+
+from setup.setup_db import connect_db
+
+CATEGORIES = ["Food", "Transport", "Entertainment", "Utilities", "Shopping"]
+LOCATIONS = ["Supermarket", "City Bus", "Cinema", "Home", "Mall", "Online"]
+CURRENCIES = ["SGD", "SGD", "SGD", "USD", "JPY"]
+MONTH_NAMES = [
+    "Jan",
+    "Feb",
+    "Mar",
+    "Apr",
+    "May",
+    "Jun",
+    "Jul",
+    "Aug",
+    "Sep",
+    "Oct",
+    "Nov",
+    "Dec",
+]
+
+
+def iter_expenses(year, rows, rng):
+    """Yield rows of synthetic expenses spread evenly over a year"""
+    first_day = date(year, 1, 1)
+    days = (date(year + 1, 1, 1) - first_day).days
+    for index in range(rows):
+        currency = rng.choice(CURRENCIES)
+        price = round(rng.uniform(1, 200), 2)
+        yield (
+            (first_day + timedelta(days=index * days // rows)).isoformat(),
+            rng.choice(CATEGORIES),
+            f"Item {year}-{index}",
+            rng.choice(LOCATIONS),
+            price,
+            currency,
+            price if currency == "SGD" else round(price * rng.uniform(0.01, 1.4), 2),
+        )
+
+
+def create_year_database(year, rows, seed=0):
+    """
+    Create the year database in the configured db_dir with synthetic data.
+
+    Args:
+        year (int): Year of the database.
+        rows (int): Number of expenses to generate.
+        seed (int): Random seed, so repeated runs produce the same data.
+
+    Returns:
+        int: Number of expenses inserted.
+    """
+    rng = random.Random(seed + year)
+    conn = connect_db(year)
+    try:
+        conn.executemany(
+            """INSERT INTO expenses (date, category, item, location, price,
+                    currency, price_sgd) VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            iter_expenses(year, rows, rng),
+        )
+        conn.executemany(
+            """INSERT INTO recurring_expenses (start_date, end_date, category, item,
+                    location, ori_price, currency, price_sgd)
+                VALUES (?, ?, 'Utilities', ?, 'Home', ?, 'SGD', ?)""",
+            [
+                (f"{year}-01-01", None, f"Bill {index}", 50 + index, 50 + index)
+                for index in range(10)
+            ],
+        )
+        conn.execute(
+            "INSERT INTO salary (start_date, end_date, amount) VALUES (?, NULL, 5000)",
+            (f"{year}-01-01",),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    return rows
+
+
+def create_workbook(path, year, rows, seed=0):
+    """
+    Write a workbook in the legacy import format with rows spread over 12 months.
+
+    The workbook is written in openpyxl write-only mode so large workbooks do
+    not need to be held in memory.
+
+    Returns:
+        str: Path of the workbook.
+    """
+    rng = random.Random(seed + year)
+    workbook = openpyxl.Workbook(write_only=True)
+
+    recurring = workbook.create_sheet("Recurring")
+    recurring.append(["Recurring Expenses"])
+    recurring.append(
+        [
+            "Category",
+            "Item",
+            "Location",
+            "Price",
+            "Start Month",
+            "Start Year",
+            "End Month",
+            "End Year",
+        ]
+    )
+    for index in range(10):
+        recurring.append(
+            ["Utilities", f"Bill {index}", "Home", 50 + index, "Jan", year, "-", "-"]
+        )
+
+    # Expenses are generated in date order, so each month is one contiguous group
+    by_month = itertools.groupby(
+        iter_expenses(year, rows, rng), key=lambda row: int(row[0][5:7])
+    )
+    month_group = next(by_month, None)
+    for month, month_name in enumerate(MONTH_NAMES, start=1):
+        sheet = workbook.create_sheet(month_name)
+        sheet.append([f"{month_name} {year}", "Expenses"])
+        sheet.append([None, None])
+        sheet.append(["Date", "Category", "Item", "Location", "Price", "Remarks"])
+        if month_group is None or month_group[0] != month:
+            continue
+        for (
+            expense_date,
+            category,
+            item,
+            location,
+            price,
+            currency,
+            price_sgd,
+        ) in month_group[1]:
+            remarks = None if currency == "SGD" else f"{int(price)} {currency}"
+            sheet.append([expense_date, category, item, location, price_sgd, remarks])
+        month_group = next(by_month, None)
+
+    workbook.save(path)
+    return path
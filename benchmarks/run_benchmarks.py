@@ -0,0 +1,297 @@
+"""Benchmark the request paths and the Excel import against synthetic datasets
+
+Usage:
+    python -m benchmarks.run_benchmarks --rows 10000 --years 3 --output results.json
+    python -m benchmarks.run_benchmarks --compare baseline.json --output new.json
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import yaml
+
+from benchmarks.datasets import create_workbook, create_year_database
+from setup import setup_config
+
+# Relative slowdown reported as a regression by --compare
+REGRESSION_THRESHOLD = 0.2
+
+
+def benchmark_settings(work_dir):
+    """Return the settings a run uses, keeping every file it touches in work_dir"""
+    return {
+        "api_key": "",
+        "error_bypass": True,
+        "db_dir": work_dir,
+        "storage_mode": "per_year",
+        "consolidated_db_path": os.path.join(work_dir, "expenses.db"),
+        "fx_cache_path": os.path.join(work_dir, "fx_cache.json"),
+        "fx_store_path": os.path.join(work_dir, "fx_rates.db"),
+        "fx_rate_file": "",
+        "async_fx_conversion": False,
+        "import_jobs_path": os.path.join(work_dir, "import_jobs.db"),
+        "instrumentation": False,
+    }
+
+
+@contextlib.contextmanager
+def isolated_settings(work_dir):
+    """Run with a config file in work_dir, ignoring the user's config
+
+    The values are also set as FINANCE_* environment variables, which take
+    precedence over the file, so overrides in the caller's environment such
+    as FINANCE_DB_DIR cannot point the benchmark at real databases.
+    """
+    values = benchmark_settings(work_dir)
+    config_path = os.path.join(work_dir, "benchmark_config.yaml")
+    with open(config_path, "w", encoding="utf-8") as f:
+        yaml.safe_dump(values, f)
+
+    overrides = {
+        setup_config.ENV_PREFIX + name.upper(): str(value)
+        for name, value in values.items()
+    }
+    overrides["FINANCE_CONFIG_PATH"] = config_path
+    saved_environ = {name: os.environ.get(name) for name in overrides}
+    saved_store = setup_config.config_store
+    os.environ.update(overrides)
+    setup_config.config_store = setup_config.ConfigStore(config_path)
+    try:
+        yield
+    finally:
+        setup_config.config_store = saved_store
+        for name, value in saved_environ.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def time_call(func, repeat, setup=None):
+    """Time func over several runs, returning summary statistics in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return {
+        "runs": repeat,
+        "min_ms": round(min(timings), 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "mean_ms": round(statistics.fmean(timings), 3),
+        "max_ms": round(max(timings), 3),
+    }
+
+
+def checked_get(client, url):
+    """Return a function that GETs url and fails on an error status"""
+
+    def request():
+        response = client.get(url)
+        if response.status_code >= 400:
+            raise RuntimeError(f"GET {url} returned {response.status_code}")
+        return response
+
+    return request
+
+
+def benchmark_requests(years, repeat):
+    """Time the dashboard, chart and admin request paths"""
+    # pylint: disable=import-outside-toplevel
+    from main import create_app
+    from routes.plot_routes import chart_cache
+
+    app = create_app()
+    app.config["TESTING"] = True
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["admin_logged_in"] = True
+
+    last_year = years[-1]
+    cases = {
+        "index": "/",
+        "plot_expenditure": "/plot_expenditure",
+        "series_month": f"/api/series/month?year={last_year}&month=6",
+        "series_year": f"/api/series/year?year={last_year}",
+        "plot_custom_expenditure": (
+            f"/plot_custom_expenditure?start_date={years[0]}-01-01"
+            f"&end_date={last_year}-12-31"
+        ),
+        "series_custom": (
+            f"/api/series/custom?start_date={years[0]}-01-01&end_date={last_year}-12-31"
+        ),
+        "edit_table": (
+            f"/admin/edit_table?year={last_year}&start_date={last_year}-01-01"
+            f"&end_date={last_year}-12-31"
+        ),
+    }
+
+    results = {}
+    for name, url in cases.items():
+        request = checked_get(client, url)
+        request()  # Warm up connections and templates
+        results[f"{name}_cold"] = time_call(request, repeat, setup=chart_cache.clear)
+        results[name] = time_call(request, repeat)
+    return results
+
+
+def benchmark_import(work_dir, year, rows, repeat, modes):
+    """Time update_database_from_excel for each import mode"""
+    # pylint: disable=import-outside-toplevel
+    from db_import.db_import import update_database_from_excel
+    from setup import setup_db
+
+    workbook_path = create_workbook(
+        os.path.join(work_dir, "benchmark.xlsx"), year, rows
+    )
+
+    path = os.path.join(work_dir, f"expenses_{year}.db")
+    if os.path.abspath(setup_db.db_path(year)) != os.path.abspath(path):
+        raise RuntimeError("Benchmark databases must live in the work directory")
+
+    def remove_database():
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        # Recreate the schema on the next connection
+        setup_db._schema_ready.discard(os.path.abspath(path))  # pylint: disable=protected-access
+
+    results = {}
+    for mode in modes:
+        results[f"import_{mode}"] = time_call(
+            lambda mode=mode: update_database_from_excel(
+                workbook_path, year, mode=mode, incremental=False
+            ),
+            repeat,
+            setup=remove_database,
+        )
+
+    # Re-importing an unchanged workbook should only cost the content hashing
+    remove_database()
+    update_database_from_excel(workbook_path, year, incremental=True)
+    results["import_unchanged_incremental"] = time_call(
+        lambda: update_database_from_excel(workbook_path, year, incremental=True),
+        repeat,
+    )
+    return results
+
+
+def compare_results(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """Return {name: ratio} for cases whose median slowed down beyond threshold"""
+    regressions = {}
+    for name, result in current["results"].items():
+        previous = baseline.get("results", {}).get(name)
+        if not previous or not previous["median_ms"]:
+            continue
+        ratio = result["median_ms"] / previous["median_ms"]
+        if ratio > 1 + threshold:
+            regressions[name] = round(ratio, 2)
+    return regressions
+
+
+def run(rows, years, repeat, import_rows, modes, work_dir):
+    """Generate the datasets in work_dir and run every benchmark"""
+    from setup import setup_db  # pylint: disable=import-outside-toplevel
+
+    current_year = datetime.now().year
+    year_list = list(range(current_year - years + 1, current_year + 1))
+
+    original_dir = os.getcwd()
+    with isolated_settings(work_dir):
+        os.chdir(work_dir)
+        try:
+            started = time.perf_counter()
+            for year in year_list:
+                create_year_database(year, rows)
+            setup_seconds = time.perf_counter() - started
+
+            results = benchmark_requests(year_list, repeat)
+            if import_rows:
+                results.update(
+                    benchmark_import(
+                        work_dir,
+                        year_list[0] - 1,
+                        import_rows,
+                        max(1, repeat // 5),
+                        modes,
+                    )
+                )
+        finally:
+            setup_db.pool.close_all()
+            os.chdir(original_dir)
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "rows_per_year": rows,
+            "years": years,
+            "import_rows": import_rows,
+            "repeat": repeat,
+            "dataset_seconds": round(setup_seconds, 3),
+        },
+        "results": results,
+    }
+
+
+def main(argv=None):
+    """Command line entry point for the benchmark suite"""
+    parser = argparse.ArgumentParser(description="Benchmark request paths and import.")
+    parser.add_argument(
+        "--rows", type=int, default=10000, help="Expenses per synthetic year database"
+    )
+    parser.add_argument(
+        "--years", type=int, default=3, help="Number of synthetic year databases"
+    )
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per request case")
+    parser.add_argument(
+        "--import-rows",
+        type=int,
+        default=5000,
+        help="Rows in the synthetic import workbook (0 skips the import benchmark)",
+    )
+    parser.add_argument(
+        "--modes",
+        nargs="+",
+        default=["pandas", "streaming", "parallel"],
+        help="Import modes to benchmark",
+    )
+    parser.add_argument("--output", help="Write the JSON results to this file")
+    parser.add_argument("--compare", help="Baseline JSON results to compare against")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="finance-bench-") as work_dir:
+        report = run(
+            args.rows, args.years, args.repeat, args.import_rows, args.modes, work_dir
+        )
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare_results(json.load(f), report)
+        for name, ratio in regressions.items():
+            print(f"Regression: {name} is {ratio}x slower than the baseline")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""This module contains the functions to export the databases to CSV or Parquet."""
+
+import argparse
+import csv
+import io
+import os
+import sys
+from datetime import datetime, timedelta
+
+from setup.merge_db import MERGE_TABLES
+from setup.setup_db import connect_db, db_path, existing_years, split_range_by_db
+
+# Number of rows fetched per round trip
+EXPORT_BATCH_SIZE = 5000
+
+EXPORT_FORMATS = ["csv", "parquet"]
+
+# Date filter per table; recurring items and salary are exported when their
+# [start_date, end_date] period overlaps the range. They are stored in their
+# start year's file, so every year file up to the end of the range is read.
+EXPORT_FILTERS = {
+    "expenses": "date >= ? AND date < ?",
+    "recurring_expenses": "start_date < ? AND (end_date IS NULL OR end_date = '' OR end_date >= ?)",
+    "salary": "start_date < ? AND (end_date IS NULL OR end_date = '' OR end_date >= ?)",
+}
+
+
+def export_columns(table):
+    """Return the columns exported for a table, preceded by the source year file"""
+    if table not in MERGE_TABLES:
+        raise ValueError(f"Unknown table: {table}")
+    return ["source"] + MERGE_TABLES[table]
+
+
+def parse_date_range(start_date, end_date):
+    """Return the half-open [start, end) range for an inclusive date range"""
+    start = datetime.strptime(start_date, "%Y-%m-%d")
+    end = datetime.strptime(end_date, "%Y-%m-%d")
+    if end < start:
+        raise ValueError("End date must not be before start date")
+    return start.strftime("%Y-%m-%d"), (end + timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+def iter_batches(table, start_date, end_date, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Yield batches of rows for a table across every database covering a range.
+
+    Only one batch is held in memory at a time. Year files that do not exist
+    are skipped rather than created. Recurring items and salary periods that
+    started in an earlier year are included if they overlap the range.
+
+    Args:
+        table (str): One of expenses, recurring_expenses or salary.
+        start_date (str): First date of the range (YYYY-MM-DD).
+        end_date (str): Last date of the range (YYYY-MM-DD), inclusive.
+        batch_size (int): Number of rows fetched per batch.
+
+    Yields:
+        list: Row tuples in export_columns(table) order.
+    """
+    columns = export_columns(table)[1:]
+    range_start, range_end = parse_date_range(start_date, end_date)
+
+    if table == "expenses":
+        years = [year for year, _, _ in split_range_by_db(range_start, range_end)]
+        params = (range_start, range_end)
+    else:
+        last_year = int(end_date[:4])
+        years = [year for year in existing_years() if year <= last_year]
+        params = (range_end, range_start)
+
+    for year in years:
+        source = db_path(year)
+        if not os.path.exists(source):
+            continue
+        conn = connect_db(year)
+        try:
+            cursor = conn.execute(
+                f"SELECT ?, {', '.join(columns)} FROM {table} "
+                f"WHERE {EXPORT_FILTERS[table]} ORDER BY id",
+                (source,) + params,
+            )
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            conn.close()
+
+
+def stream_csv(table, start_date, end_date, batch_size=EXPORT_BATCH_SIZE):
+    """Yield a table's rows in a date range as CSV text chunks"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(export_columns(table))
+    for rows in iter_batches(table, start_date, end_date, batch_size):
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    # Flush the header when the range is empty
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def write_parquet(table, start_date, end_date, output, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Write a table's rows in a date range to a Parquet file, one row group per batch.
+
+    Requires the optional pyarrow dependency.
+
+    Returns:
+        int: Number of rows written.
+    """
+    # pyarrow is optional and only needed here, so it is not imported at startup
+    try:
+        import pyarrow as pa  # pylint: disable=import-outside-toplevel
+        import pyarrow.parquet as pq  # pylint: disable=import-outside-toplevel
+    except ImportError as e:
+        raise RuntimeError(
+            "Parquet export requires pyarrow (pip install pyarrow)"
+        ) from e
+
+    columns = export_columns(table)
+    schema = pa.schema(
+        [
+            (
+                column,
+                pa.float64()
+                if column in ("price", "ori_price", "price_sgd", "amount")
+                else pa.string(),
+            )
+            for column in columns
+        ]
+    )
+    row_count = 0
+    with pq.ParquetWriter(output, schema) as writer:
+        for rows in iter_batches(table, start_date, end_date, batch_size):
+            writer.write_table(
+                pa.Table.from_arrays(
+                    [
+                        pa.array([row[index] for row in rows], type=field.type)
+                        for index, field in enumerate(schema)
+                    ],
+                    schema=schema,
+                )
+            )
+            row_count += len(rows)
+    return row_count
+
+
+def main(argv=None):
+    """Command line entry point for exporting the databases"""
+    parser = argparse.ArgumentParser(
+        description="Export expenses, recurring_expenses or salary for a date range."
+    )
+    parser.add_argument("start_date", help="First date of the range (YYYY-MM-DD)")
+    parser.add_argument("end_date", help="Last date of the range (YYYY-MM-DD)")
+    parser.add_argument(
+        "--table",
+        choices=list(MERGE_TABLES),
+        default="expenses",
+        help="Table to export",
+    )
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    parser.add_argument(
+        "--output", help="Output file (default: stdout for CSV, required for Parquet)"
+    )
+    args = parser.parse_args(argv)
+
+    if args.format == "parquet":
+        if not args.output:
+            parser.error("--output is required for Parquet exports")
+        row_count = write_parquet(
+            args.table, args.start_date, args.end_date, args.output
+        )
+        print(f"{args.table}: {row_count} rows exported to {args.output}")
+        return
+
+    chunks = stream_csv(args.table, args.start_date, args.end_date)
+    if not args.output:
+        sys.stdout.writelines(chunks)
+        return
+    with open(args.output, "w", encoding="utf-8", newline="") as f:
+        f.writelines(chunks)
+
+
+if __name__ == "__main__":
+    main()
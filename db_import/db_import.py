@@ -1,16 +1,40 @@
 """This module contains the function to update the database from an Excel file."""
 
-from datetime import datetime
-import sqlite3
+import hashlib
+import itertools
+import multiprocessing
+import os
+import posixpath
+import re
+import zipfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from xml.etree import ElementTree
+import numpy as np
+import openpyxl
 import pandas as pd
 
+from db_import.sheet_parser import (
+    DUPLICATE_KEY,
+    EXPENSES_COLUMNS,
+    RECURRING_COLUMNS,
+    month_name_to_int,
+    parse_sheet,
+    sheet_records,
+)
+from setup.setup_db import connect_db
+from setup.setup_config import get_settings
 
-def month_name_to_int(month_name):
-    """Convert a month name (e.g., 'Jan') to its corresponding integer (e.g., 1)."""
-    try:
-        return datetime.strptime(month_name, "%b").month  # Parse abbreviated month name
-    except ValueError:
-        return None  # Return None if the month name is invalid
+# Number of records inserted per batch in streaming mode
+IMPORT_BATCH_SIZE = 1000
+
+# Namespaces of the workbook parts read when hashing sheets
+SPREADSHEET_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+RELATIONSHIPS_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+# Value of a shared-string cell, e.g. <c r="B2" t="s"><v>3</v></c>
+SHARED_STRING_CELL = re.compile(
+    rb'<(?:\w+:)?c\b[^>]*?\st="s"[^>]*>\s*<(?:\w+:)?v>(\d+)</(?:\w+:)?v>'
+)
 
 
 def merge_start_date(row):
@@ -37,125 +61,528 @@ def merge_end_date(row):
         return None
 
 
-# pylint: disable=too-many-branches, too-many-locals
-def update_database_from_excel(file_path, db_year):
+def merge_month_year_columns(month_col, year_col, missing_default=None):
+    """Vectorized merge of month name and year columns into 'YYYY-MM-01' dates."""
+    months = pd.to_datetime(
+        month_col.astype("string"), format="%b", errors="coerce"
+    ).dt.month
+    years = pd.to_numeric(year_col, errors="coerce")
+    valid = months.notna() & years.notna()
+
+    dates = pd.Series([None] * len(month_col), index=month_col.index, dtype=object)
+    dates[valid] = (
+        years[valid].astype(int).astype(str)
+        + "-"
+        + months[valid].astype(int).map("{:02d}".format)
+        + "-01"
+    )
+    dates[month_col == "-"] = missing_default
+    return dates
+
+
+def parse_recurring_sheet(recurring_data):
+    """Normalize the Recurring sheet into recurring_expenses records."""
+    # Remove the first row and use the new first row as the header
+    recurring_data.columns = recurring_data.iloc[0]  # Set the first row as header
+    recurring_data = recurring_data[1:]
+
+    price = pd.to_numeric(recurring_data["Price"]).abs().astype(int)
+    return pd.DataFrame(
+        {
+            "start_date": merge_month_year_columns(
+                recurring_data["Start Month"],
+                recurring_data["Start Year"],
+                missing_default="2023-01-01",  # Default to January 1, 2023
+            ),
+            "end_date": merge_month_year_columns(
+                recurring_data["End Month"], recurring_data["End Year"]
+            ),
+            "category": recurring_data["Category"],
+            "item": recurring_data["Item"],
+            "location": recurring_data["Location"],
+            "ori_price": price,
+            "currency": "SGD",
+            "price_sgd": price,
+        }
+    )
+
+
+def parse_month_sheet(month_data):
+    """Normalize a month sheet (read with header=None) into expenses records."""
+    # The header row follows the first row with an empty second column
+    blank_rows = np.flatnonzero(month_data.iloc[:, 1].isna().to_numpy())
+    real_row_idx = int(blank_rows[0]) + 1 if len(blank_rows) else 0
+
+    new_month_data = month_data.iloc[real_row_idx:]
+    new_month_data.columns = month_data.iloc[real_row_idx]  # Set the new header
+    new_month_data = new_month_data.iloc[1:]
+
+    # Remarks such as "20 USD" hold the original price and currency
+    remark_parts = new_month_data["Remarks"].astype("string").str.split(" ")
+    has_ori_price = remark_parts.str[0].str.isdigit().fillna(False).astype(bool)
+    ori_price = new_month_data["Price"].astype(object).copy()
+    ori_price[has_ori_price] = (
+        pd.to_numeric(remark_parts[has_ori_price].str[0]).abs().astype(int)
+    )
+    ori_currency = remark_parts.str[1].where(has_ori_price, "SGD").astype(object)
+
+    # Missing prices are recorded as 0
+    fin_price = np.trunc(pd.to_numeric(new_month_data["Price"]).fillna(0)).abs()
+
+    parsed_dates = pd.to_datetime(new_month_data["Date"], errors="coerce")
+    dates = new_month_data["Date"].astype(object).copy()
+    dates[parsed_dates.notna()] = parsed_dates[parsed_dates.notna()].dt.strftime(
+        "%Y-%m-%d"
+    )
+
+    return pd.DataFrame(
+        {
+            "date": dates,
+            "category": new_month_data["Category"],
+            "item": new_month_data["Item"],
+            "location": new_month_data["Location"],
+            "price": ori_price,
+            "currency": ori_currency,
+            "price_sgd": fin_price.astype(int),
+        }
+    )
+
+
+def load_existing_keys(cursor, table):
+    """Load the duplicate-check keys already stored in a table."""
+    cursor.execute(f"SELECT {', '.join(DUPLICATE_KEY)} FROM {table}")
+    return set(cursor.fetchall())
+
+
+def insert_keyed_rows(cursor, table, columns, keyed_rows, existing_keys):
+    """Insert (key, row) pairs whose duplicate-check key is not yet in existing_keys.
+
+    Records with a missing key column never match an existing row, mirroring
+    SQL NULL comparison semantics. Newly inserted keys are added to
+    existing_keys so later batches are deduplicated against them as well.
     """
-    Update the database with data from an Excel file.
+    new_rows = []
+    for key, row in keyed_rows:
+        if None in key:
+            new_rows.append(row)
+        elif key not in existing_keys:
+            existing_keys.add(key)
+            new_rows.append(row)
 
-    Args:
-        file_path (str): Path to the Excel file.
-        db_year (int): Year of the database to update.
+    if new_rows:
+        placeholders = ", ".join("?" for _ in columns)
+        cursor.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})",
+            new_rows,
+        )
+    return len(new_rows)
+
+
+def keyed_rows_from_records(records, columns):
+    """Return (duplicate key, row tuple) pairs for a records DataFrame."""
+    records = records.astype(object).where(records.notna(), None)
+    keys = zip(*(records[column] for column in DUPLICATE_KEY))
+    rows = records[columns].itertuples(index=False, name=None)
+    return list(zip(keys, rows))
+
+
+def insert_new_rows(cursor, table, columns, records, existing_keys):
+    """Insert the rows of a records DataFrame that are not yet in the table."""
+    return insert_keyed_rows(
+        cursor, table, columns, keyed_rows_from_records(records, columns), existing_keys
+    )
+
+
+def read_shared_strings(archive):
+    """Return the workbook's shared strings table as a list of UTF-8 bytes."""
+    try:
+        data = archive.read("xl/sharedStrings.xml")
+    except KeyError:
+        return []
+    return [
+        "".join(item.itertext()).encode()
+        for item in ElementTree.fromstring(data).iter(f"{{{SPREADSHEET_NS}}}si")
+    ]
+
+
+def worksheet_paths(archive):
+    """Return {sheet_name: zip member path} in workbook order."""
+    workbook = ElementTree.fromstring(archive.read("xl/workbook.xml"))
+    rels = ElementTree.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+    targets = {rel.get("Id"): rel.get("Target") for rel in rels}
+
+    paths = {}
+    for sheet in workbook.iter(f"{{{SPREADSHEET_NS}}}sheet"):
+        target = targets[sheet.get(f"{{{RELATIONSHIPS_NS}}}id")]
+        # Targets are relative to xl/ unless they are absolute package paths
+        if target.startswith("/"):
+            paths[sheet.get("name")] = target.lstrip("/")
+        else:
+            paths[sheet.get("name")] = posixpath.normpath(posixpath.join("xl", target))
+    return paths
+
+
+def sheet_content_hashes(file_path):
     """
-    # Connect to the database
-    conn = sqlite3.connect(f"expenses_{db_year}.db")
-    cursor = conn.cursor()
+    Return {sheet_name: content hash} for every sheet of a workbook.
 
-    # Read the Excel file
-    excel_data = pd.ExcelFile(file_path)
+    Each sheet's raw worksheet XML is hashed as stored in the .xlsx archive,
+    without parsing cells. Text cells only hold an index into the shared
+    strings table, so the strings a sheet references are hashed with it.
+    Any edit to a sheet's cells therefore changes its hash, while edits to
+    other sheets do not.
+    """
+    with zipfile.ZipFile(file_path) as archive:
+        shared_strings = read_shared_strings(archive)
+        hashes = {}
+        for sheet_name, path in worksheet_paths(archive).items():
+            data = archive.read(path)
+            digest = hashlib.sha256(data)
+            for index in SHARED_STRING_CELL.findall(data):
+                index = int(index)
+                if index < len(shared_strings):
+                    digest.update(shared_strings[index])
+                digest.update(b"\0")
+            hashes[sheet_name] = digest.hexdigest()
+    return hashes
 
-    for sheet_name in excel_data.sheet_names:
-        # Update the Recurring sheet into the recurring_expenses table
-        if "Recurring" in sheet_name:
-            recurring_data = pd.read_excel(excel_data, sheet_name="Recurring")
 
-            # Remove the first row and use the new first row as the header
-            recurring_data.columns = recurring_data.iloc[
-                0
-            ]  # Set the first row as header
-            recurring_data = recurring_data[1:]
+def row_fingerprint(row):
+    """Return a stable fingerprint of a normalized row tuple."""
+    values = tuple(
+        value.item() if isinstance(value, np.generic) else value for value in row
+    )
+    return hashlib.sha1(repr(values).encode()).hexdigest()
+
+
+class ImportManifest:
+    """Content hashes of the sheets already imported into a database.
+
+    Sheets whose content hash matches the manifest are skipped entirely.
+    Rows of changed sheets are filtered by fingerprint so only rows not seen
+    in an earlier import of that sheet reach the duplicate check.
+    """
+
+    def __init__(self, cursor, year, sheet_hashes):
+        self.cursor = cursor
+        self.year = int(year)
+        self.sheet_hashes = sheet_hashes
+        cursor.execute(
+            "SELECT sheet_name, content_hash FROM import_manifest WHERE year = ?",
+            (self.year,),
+        )
+        stored_hashes = dict(cursor.fetchall())
+        self.unchanged = {
+            sheet_name
+            for sheet_name, content_hash in sheet_hashes.items()
+            if stored_hashes.get(sheet_name) == content_hash
+        }
+        self._fingerprints = {}
+
+    def is_unchanged(self, sheet_name):
+        """Return True if the sheet is identical to its last import."""
+        return sheet_name in self.unchanged
+
+    def new_rows(self, sheet_name, keyed_rows):
+        """Return the (key, row) pairs not seen in earlier imports of the sheet."""
+        if sheet_name not in self._fingerprints:
+            self.cursor.execute(
+                """SELECT fingerprint FROM import_row_fingerprints
+                    WHERE year = ? AND sheet_name = ?""",
+                (self.year, sheet_name),
+            )
+            self._fingerprints[sheet_name] = {row[0] for row in self.cursor.fetchall()}
+        seen = self._fingerprints[sheet_name]
+
+        new_rows = []
+        new_fingerprints = []
+        for key, row in keyed_rows:
+            fingerprint = row_fingerprint(row)
+            if fingerprint not in seen:
+                seen.add(fingerprint)
+                new_fingerprints.append((self.year, sheet_name, fingerprint))
+                new_rows.append((key, row))
+
+        self.cursor.executemany(
+            """INSERT OR IGNORE INTO import_row_fingerprints (year, sheet_name, fingerprint)
+                VALUES (?, ?, ?)""",
+            new_fingerprints,
+        )
+        return new_rows
+
+    def record_changed_sheets(self, row_counts):
+        """Store the content hash of every sheet that was (re-)imported."""
+        self.cursor.executemany(
+            """INSERT OR REPLACE INTO import_manifest
+                    (year, sheet_name, content_hash, row_count, imported_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)""",
+            [
+                (self.year, sheet_name, content_hash, row_counts.get(sheet_name, 0))
+                for sheet_name, content_hash in self.sheet_hashes.items()
+                if sheet_name not in self.unchanged
+            ],
+        )
 
-            recurring_data["start_date"] = recurring_data.apply(
-                merge_start_date, axis=1
+
+def write_sheet_rows(
+    cursor, sheet_name, table, columns, keyed_rows, existing_keys, manifest=None
+):
+    """Insert a sheet's new (key, row) pairs, returning the number inserted."""
+    if manifest:
+        keyed_rows = manifest.new_rows(sheet_name, keyed_rows)
+    if table not in existing_keys:
+        existing_keys[table] = load_existing_keys(cursor, table)
+    return insert_keyed_rows(cursor, table, columns, keyed_rows, existing_keys[table])
+
+
+def iter_workbook_batches(
+    file_path, batch_size=IMPORT_BATCH_SIZE, on_sheet_done=None, skip_sheets=()
+):
+    """
+    Stream a workbook sheet by sheet, yielding batches of normalized records.
+
+    The workbook is opened in openpyxl read-only mode, so only the current
+    batch is held in memory rather than whole sheets. on_sheet_done, if
+    given, is called with (sheets_done, sheets_total) before the first sheet
+    and after each sheet. Sheets named in skip_sheets are not read.
+
+    Yields:
+        tuple: (sheet_name, table, columns, list of record dicts)
+    """
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        sheets_total = len(workbook.sheetnames)
+        for sheets_done, sheet_name in enumerate(workbook.sheetnames):
+            if on_sheet_done:
+                on_sheet_done(sheets_done, sheets_total)
+            if sheet_name in skip_sheets:
+                continue
+            parsed = sheet_records(
+                sheet_name, workbook[sheet_name].iter_rows(values_only=True)
             )
+            if parsed is None:
+                continue
+            table, columns, records = parsed
+
+            while True:
+                batch = list(itertools.islice(records, batch_size))
+                if not batch:
+                    break
+                yield sheet_name, table, columns, batch
+        if on_sheet_done:
+            on_sheet_done(sheets_total, sheets_total)
+    finally:
+        workbook.close()
+
+
+def import_parallel(cursor, file_path, progress=None, manifest=None):
+    """Import a workbook by parsing its sheets in worker processes.
+
+    Parsed sheets are written by this process alone, in workbook order, so the
+    duplicate check and the single transaction behave as in the other modes.
+    """
+    workbook = openpyxl.load_workbook(file_path, read_only=True)
+    sheet_names = workbook.sheetnames
+    workbook.close()
+
+    sheets_total = len(sheet_names)
+    if manifest:
+        sheet_names = [name for name in sheet_names if not manifest.is_unchanged(name)]
 
-            recurring_data["end_date"] = recurring_data.apply(merge_end_date, axis=1)
-
-            # Insert data into the recurring_expenses table
-            for _, row in recurring_data.iterrows():
-                # Check if the record already exists
-                cursor.execute(
-                    """SELECT COUNT(*) FROM recurring_expenses WHERE
-                    category = ? AND item = ? AND location = ?""",
-                    (
-                        row["Category"],
-                        row["Item"],
-                        row["Location"],
-                    ),
+    inserted_rows = 0
+    rows_processed = 0
+    row_counts = {}
+    existing_keys = {}
+    # excel_import_workers defaults to every CPU
+    workers = get_settings().excel_import_workers or os.cpu_count() or 1
+    max_workers = max(1, min(workers, len(sheet_names)))
+    # Spawn rather than fork: imports run on a background thread of a threaded
+    # web worker, and a forked child can inherit locks held by other threads
+    with ProcessPoolExecutor(
+        max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        parsed_sheets = executor.map(
+            parse_sheet, itertools.repeat(file_path), sheet_names
+        )
+        sheets_done = sheets_total - len(sheet_names)
+        for sheet_name, parsed in zip(sheet_names, parsed_sheets):
+            if parsed is not None:
+                table, columns, keyed_rows = parsed
+                inserted_rows += write_sheet_rows(
+                    cursor,
+                    sheet_name,
+                    table,
+                    columns,
+                    keyed_rows,
+                    existing_keys,
+                    manifest,
                 )
-                if cursor.fetchone()[0] == 0:  # If the record does not exist
-                    cursor.execute(
-                        """INSERT OR REPLACE INTO recurring_expenses (
-                            start_date, end_date, category, item, location, ori_price, currency, price_sgd
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-                        (
-                            row["start_date"],
-                            row["end_date"],
-                            row["Category"],
-                            row["Item"],
-                            row["Location"],
-                            abs(int(row["Price"])),
-                            "SGD",
-                            abs(int(row["Price"])),
-                        ),
-                    )
+                rows_processed += len(keyed_rows)
+                row_counts[sheet_name] = len(keyed_rows)
+            sheets_done += 1
+            if progress:
+                progress(rows_processed, sheets_done, sheets_total)
+
+    if manifest:
+        manifest.record_changed_sheets(row_counts)
+    return inserted_rows
+
+
+def import_streaming(cursor, file_path, progress=None, manifest=None):
+    """Import a workbook with streaming reads and batched inserts."""
+    inserted_rows = 0
+    # [rows processed, sheets done, sheets total]
+    status = [0, 0, 0]
+
+    def on_sheet_done(sheets_done, sheets_total):
+        status[1:] = [sheets_done, sheets_total]
+        if progress:
+            progress(*status)
+
+    existing_keys = {}
+    row_counts = defaultdict(int)
+    for sheet_name, table, columns, batch in iter_workbook_batches(
+        file_path,
+        on_sheet_done=on_sheet_done,
+        skip_sheets=manifest.unchanged if manifest else (),
+    ):
+        keyed_rows = [
+            (
+                tuple(record[column] for column in DUPLICATE_KEY),
+                tuple(record[column] for column in columns),
+            )
+            for record in batch
+        ]
+        inserted_rows += write_sheet_rows(
+            cursor, sheet_name, table, columns, keyed_rows, existing_keys, manifest
+        )
+        row_counts[sheet_name] += len(batch)
+        status[0] += len(batch)
+        if progress:
+            progress(*status)
+
+    if manifest:
+        manifest.record_changed_sheets(row_counts)
+    return inserted_rows
+
+
+def import_pandas(cursor, file_path, progress=None, manifest=None):
+    """Import a workbook by loading each sheet into a DataFrame."""
+    inserted_rows = 0
+    rows_processed = 0
+    # Read the Excel file
+    excel_data = pd.ExcelFile(file_path)
+    existing_keys = {}
+    row_counts = {}
+    sheets_total = len(excel_data.sheet_names)
 
+    for sheets_done, sheet_name in enumerate(excel_data.sheet_names, start=1):
+        if progress:
+            progress(rows_processed, sheets_done - 1, sheets_total)
+        if manifest and manifest.is_unchanged(sheet_name):
+            continue
+        # Update the Recurring sheet into the recurring_expenses table
+        if "Recurring" in sheet_name:
+            table, columns = "recurring_expenses", RECURRING_COLUMNS
+            records = parse_recurring_sheet(
+                pd.read_excel(excel_data, sheet_name="Recurring")
+            )
         elif (
             "Summary" not in sheet_name
         ):  # Update the subsequent sheets (month names) into the expenses table
-            month_data = pd.read_excel(excel_data, sheet_name=sheet_name, header=None)
+            table, columns = "expenses", EXPENSES_COLUMNS
+            records = parse_month_sheet(
+                pd.read_excel(excel_data, sheet_name=sheet_name, header=None)
+            )
+        else:
+            continue
 
-            real_row_idx = 0
+        inserted_rows += write_sheet_rows(
+            cursor,
+            sheet_name,
+            table,
+            columns,
+            keyed_rows_from_records(records, columns),
+            existing_keys,
+            manifest,
+        )
+        rows_processed += len(records)
+        row_counts[sheet_name] = len(records)
 
-            for row_idx, row in month_data.iterrows():
-                if pd.isna(row.iloc[1]):
-                    real_row_idx = row_idx + 1
-                    break
+    if manifest:
+        manifest.record_changed_sheets(row_counts)
+    if progress:
+        progress(rows_processed, sheets_total, sheets_total)
+    return inserted_rows
 
-            new_month_data = month_data.iloc[real_row_idx:]
-            new_month_data.columns = month_data.iloc[real_row_idx]  # Set the new header
-            new_month_data = new_month_data.iloc[1:]
-
-            for _, row in new_month_data.iterrows():
-                # Check if the record already exists
-                cursor.execute(
-                    """SELECT COUNT(*) FROM expenses WHERE
-                    category = ? AND item = ? AND location = ?""",
-                    (
-                        row["Category"],
-                        row["Item"],
-                        row["Location"],
-                    ),
-                )
-                if cursor.fetchone()[0] == 0:  # If the record does not exist
-                    if (
-                        not (pd.isna(row["Remarks"]))
-                        and row["Remarks"].split(" ")[0].isdigit()
-                    ):
-                        split_remarks = row["Remarks"].split(" ")
-                        ori_price = abs(int(split_remarks[0]))
-                        ori_currency = split_remarks[1]
-                    else:
-                        ori_price = row["Price"]
-                        ori_currency = "SGD"
-                    if pd.isna(row["Price"]):  # Handle missing price
-                        fin_price = 0
-                    else:
-                        fin_price = abs(int(row["Price"]))
-                    cursor.execute(
-                        """INSERT OR REPLACE INTO expenses (
-                                date, category, item, location, price, currency, price_sgd
-                            ) VALUES (?, ?, ?, ?, ?, ?, ?)""",
-                        (
-                            row["Date"],
-                            row["Category"],
-                            row["Item"],
-                            row["Location"],
-                            ori_price,
-                            ori_currency,
-                            fin_price,
-                        ),
-                    )
-
-    # Commit changes and close the connection
-    conn.commit()
-    conn.close()
+
+def update_database_from_excel(
+    file_path, db_year, mode=None, progress=None, incremental=None
+):
+    """
+    Update the database with data from an Excel file.
+
+    In "pandas" mode each sheet is parsed with vectorized pandas operations.
+    In "streaming" mode the workbook is read row by row in openpyxl read-only
+    mode and inserted in batches, keeping memory flat for large workbooks.
+    In "parallel" mode sheets are parsed in worker processes and written by
+    this process as each sheet is ready.
+    Either way rows are deduplicated against the existing rows in memory and
+    inserted with executemany in a single transaction.
+
+    In incremental mode each sheet's content hash is compared with the
+    import_manifest table first: unchanged sheets are skipped, and only rows
+    with new fingerprints are considered from changed ones. The hashes are
+    taken from the raw .xlsx archive, so an unchanged workbook is never parsed.
+
+    Args:
+        file_path (str): Path to the Excel file.
+        db_year (int): Year of the database to update.
+        mode (str): "pandas", "streaming" or "parallel"; defaults to the
+            excel_import_mode setting.
+        progress (callable): Optional callback receiving (rows_processed,
+            sheets_done, sheets_total) as the import advances.
+        incremental (bool): Skip unchanged sheets; defaults to the
+            incremental_import setting.
+
+    Returns:
+        int: Number of rows inserted.
+    """
+    settings = get_settings()
+    mode = mode or settings.excel_import_mode
+    if mode not in IMPORT_MODES:
+        raise ValueError(f"Unknown import mode: {mode}")
+
+    # Connect to the database
+    conn = connect_db(db_year)
+    cursor = conn.cursor()
+
+    try:
+        manifest = None
+        if settings.incremental_import if incremental is None else incremental:
+            manifest = ImportManifest(cursor, db_year, sheet_content_hashes(file_path))
+        if manifest and manifest.unchanged == set(manifest.sheet_hashes):
+            # Nothing changed, so the workbook is not opened at all
+            inserted_rows = 0
+            if progress:
+                sheets_total = len(manifest.sheet_hashes)
+                progress(0, sheets_total, sheets_total)
+        else:
+            inserted_rows = IMPORT_MODES[mode](cursor, file_path, progress, manifest)
+
+        # Commit all sheets in one transaction
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    return inserted_rows
+
+
+IMPORT_MODES = {
+    "pandas": import_pandas,
+    "streaming": import_streaming,
+    "parallel": import_parallel,
+}
@@ -0,0 +1,230 @@
+"""This module runs Excel imports as background jobs tracked in a job table."""
+
+import functools
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from setup.setup_config import get_settings
+
+DEFAULT_IMPORT_JOBS_PATH = "import_jobs.db"
+# Imports running at once; each holds the write lock of its year database
+IMPORT_JOB_WORKERS = 1
+# Minimum seconds between progress writes to the job table
+PROGRESS_INTERVAL = 0.5
+
+JOB_COLUMNS = [
+    "id",
+    "file_path",
+    "year",
+    "status",
+    "rows_processed",
+    "rows_inserted",
+    "sheets_done",
+    "sheets_total",
+    "error",
+    "created_at",
+    "started_at",
+    "finished_at",
+    "duration",
+]
+
+# Error recorded for jobs whose worker process stopped before they finished
+INTERRUPTED_ERROR = "The import was interrupted before it finished"
+
+
+def _utc_now():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _process_alive(pid):
+    """Return whether the process that owns a job is still running"""
+    if pid is None or os.name == "nt":
+        # Signal 0 is CTRL_C_EVENT on Windows, where the app runs in one process
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Running under another user
+    return True
+
+
+class ImportJobManager:
+    """Runs imports on a local executor and records them in the import_jobs table.
+
+    The job table lives in its own SQLite file so that any web worker can
+    report the progress of a job started by another. Each job records the
+    process running it, and jobs left queued or running by a process that
+    no longer exists are marked failed when a manager starts. There is one
+    manager per process (see get_import_jobs), so jobs recorded under this
+    process's own id are from an earlier run that reused it, e.g. PID 1 in
+    a restarted container.
+    """
+
+    def __init__(self, path=DEFAULT_IMPORT_JOBS_PATH, max_workers=IMPORT_JOB_WORKERS):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS import_jobs (
+                    id TEXT PRIMARY KEY,
+                    file_path TEXT NOT NULL,
+                    year INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    rows_processed INTEGER DEFAULT 0,
+                    rows_inserted INTEGER,
+                    sheets_done INTEGER DEFAULT 0,
+                    sheets_total INTEGER,
+                    error TEXT,
+                    created_at TEXT NOT NULL,
+                    started_at TEXT,
+                    finished_at TEXT,
+                    duration REAL,
+                    worker_pid INTEGER)"""
+        )
+        columns = [
+            row[1] for row in self._conn.execute("PRAGMA table_info(import_jobs)")
+        ]
+        if "worker_pid" not in columns:
+            self._conn.execute("ALTER TABLE import_jobs ADD COLUMN worker_pid INTEGER")
+        self._conn.commit()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="excel-import"
+        )
+        self._futures = {}
+        self._futures_lock = threading.Lock()
+        self.fail_interrupted()
+
+    def fail_interrupted(self):
+        """Mark jobs left queued or running by a stopped process as failed
+
+        Called before this manager has run any job, so no job in the table
+        can belong to it yet.
+        """
+        with self._lock:
+            jobs = self._conn.execute(
+                """SELECT id, worker_pid FROM import_jobs
+                    WHERE status IN ('queued', 'running')"""
+            ).fetchall()
+            interrupted = [
+                (INTERRUPTED_ERROR, _utc_now(), job_id)
+                for job_id, pid in jobs
+                if pid == os.getpid() or not _process_alive(pid)
+            ]
+            self._conn.executemany(
+                """UPDATE import_jobs SET status = 'failed', error = ?,
+                    finished_at = ? WHERE id = ?""",
+                interrupted,
+            )
+            self._conn.commit()
+        for _, _, job_id in interrupted:
+            logging.warning("Import job %s was interrupted", job_id)
+        return len(interrupted)
+
+    def _update(self, job_id, **fields):
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE import_jobs SET {assignments} WHERE id = ?",
+                (*fields.values(), job_id),
+            )
+            self._conn.commit()
+
+    def submit(self, import_func, file_path, year):
+        """
+        Queue an import and return its job id immediately.
+
+        Args:
+            import_func (callable): Called as import_func(file_path, year,
+                progress=callback) and returning the number of rows inserted.
+            file_path (str): Path to the Excel file.
+            year (int): Year of the database to update.
+
+        Returns:
+            str: The job id.
+        """
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                """INSERT INTO import_jobs (id, file_path, year, status, created_at,
+                        worker_pid)
+                    VALUES (?, ?, ?, 'queued', ?, ?)""",
+                (job_id, str(file_path), int(year), _utc_now(), os.getpid()),
+            )
+            self._conn.commit()
+        # Register the future before the job can finish and remove it
+        with self._futures_lock:
+            self._futures[job_id] = self._executor.submit(
+                self._run, job_id, import_func, file_path, year
+            )
+        return job_id
+
+    def _run(self, job_id, import_func, file_path, year):
+        started = time.monotonic()
+        self._update(job_id, status="running", started_at=_utc_now())
+        last_write = [0.0]
+
+        def progress(rows_processed, sheets_done, sheets_total):
+            # Throttle writes, but always record the final sheet
+            now = time.monotonic()
+            if sheets_done == sheets_total or now - last_write[0] >= PROGRESS_INTERVAL:
+                last_write[0] = now
+                self._update(
+                    job_id,
+                    rows_processed=rows_processed,
+                    sheets_done=sheets_done,
+                    sheets_total=sheets_total,
+                )
+
+        try:
+            rows_inserted = import_func(file_path, year, progress=progress)
+        except Exception:  # pylint: disable=broad-exception-caught
+            logging.error("Import job %s failed", job_id, exc_info=True)
+            self._update(
+                job_id,
+                status="failed",
+                error="An internal error has occurred!",
+                finished_at=_utc_now(),
+                duration=time.monotonic() - started,
+            )
+        else:
+            self._update(
+                job_id,
+                status="succeeded",
+                rows_inserted=rows_inserted,
+                finished_at=_utc_now(),
+                duration=time.monotonic() - started,
+            )
+        finally:
+            with self._futures_lock:
+                self._futures.pop(job_id, None)
+
+    def get(self, job_id):
+        """Return a job as a dict, or None if it does not exist"""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(JOB_COLUMNS)} FROM import_jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        return dict(zip(JOB_COLUMNS, row)) if row else None
+
+    def wait(self, job_id, timeout=None):
+        """Block until a job submitted by this process has finished"""
+        with self._futures_lock:
+            future = self._futures.get(job_id)
+        if future is not None:
+            future.result(timeout=timeout)
+        return self.get(job_id)
+
+
+@functools.lru_cache(maxsize=None)
+def get_import_jobs():
+    """Return the process-wide import job manager"""
+    return ImportJobManager(get_settings().import_jobs_path)
@@ -0,0 +1,178 @@
+"""This module parses workbook sheets into records without pandas.
+
+It only needs openpyxl, so the worker processes of a parallel import load
+it without importing pandas or the Flask application.
+"""
+
+import itertools
+from datetime import datetime
+
+import openpyxl
+
+# Columns used to detect records that already exist in the database
+DUPLICATE_KEY = ["category", "item", "location"]
+
+EXPENSES_COLUMNS = [
+    "date",
+    "category",
+    "item",
+    "location",
+    "price",
+    "currency",
+    "price_sgd",
+]
+RECURRING_COLUMNS = [
+    "start_date",
+    "end_date",
+    "category",
+    "item",
+    "location",
+    "ori_price",
+    "currency",
+    "price_sgd",
+]
+
+
+def month_name_to_int(month_name):
+    """Convert a month name (e.g., 'Jan') to its corresponding integer (e.g., 1)."""
+    try:
+        return datetime.strptime(month_name, "%b").month  # Parse abbreviated month name
+    except ValueError:
+        return None  # Return None if the month name is invalid
+
+
+def merge_month_year(month, year, missing_default=None):
+    """Merge a month name and year cell into a 'YYYY-MM-01' date."""
+    if month == "-":
+        return missing_default
+    month_int = month_name_to_int(str(month)) if month is not None else None
+    try:
+        return f"{int(float(year))}-{month_int:02d}-01" if month_int else None
+    except (ValueError, TypeError):
+        return None
+
+
+def iter_recurring_records(rows):
+    """Yield recurring_expenses records from the rows of the Recurring sheet."""
+    rows = iter(rows)
+    next(rows, None)  # The first row is a title row above the real header
+    header = next(rows, None) or ()
+    for values in rows:
+        if all(value is None for value in values):
+            continue
+        # Read-only rows drop trailing empty cells when the sheet has no dimensions
+        row = dict(itertools.zip_longest(header, values))
+        price = abs(int(float(row["Price"])))
+        yield {
+            "start_date": merge_month_year(
+                row["Start Month"], row["Start Year"], missing_default="2023-01-01"
+            ),
+            "end_date": merge_month_year(row["End Month"], row["End Year"]),
+            "category": row["Category"],
+            "item": row["Item"],
+            "location": row["Location"],
+            "ori_price": price,
+            "currency": "SGD",
+            "price_sgd": price,
+        }
+
+
+def normalize_date(value):
+    """Return a date cell as 'YYYY-MM-DD', leaving unparseable values as-is."""
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d")
+    try:
+        return datetime.fromisoformat(str(value)).strftime("%Y-%m-%d")
+    except ValueError:
+        return value
+
+
+def iter_month_records(rows):
+    """Yield expenses records from the rows of a month sheet.
+
+    The header row follows the first row with an empty second column. Rows
+    are buffered only until that row is found; if the sheet has none, the
+    first row is the header.
+    """
+    rows = iter(rows)
+    buffered = []
+    header = None
+    for values in rows:
+        buffered.append(values)
+        if len(values) < 2 or values[1] is None:
+            header = next(rows, None)
+            buffered = []
+            break
+    if header is None:
+        if not buffered:
+            return
+        header, buffered = buffered[0], buffered[1:]
+
+    for values in itertools.chain(buffered, rows):
+        if all(value is None for value in values):
+            continue
+        row = dict(itertools.zip_longest(header, values))
+
+        # Remarks such as "20 USD" hold the original price and currency
+        remarks = row["Remarks"]
+        remark_parts = str(remarks).split(" ") if remarks is not None else [""]
+        if remark_parts[0].isdigit():
+            price = abs(int(remark_parts[0]))
+            currency = remark_parts[1] if len(remark_parts) > 1 else None
+        else:
+            price, currency = row["Price"], "SGD"
+
+        # Missing prices are recorded as 0
+        price_sgd = row["Price"] if row["Price"] is not None else 0
+        yield {
+            "date": normalize_date(row["Date"]),
+            "category": row["Category"],
+            "item": row["Item"],
+            "location": row["Location"],
+            "price": price,
+            "currency": currency,
+            "price_sgd": abs(int(float(price_sgd))),
+        }
+
+
+def sheet_records(sheet_name, rows):
+    """
+    Return the table, columns and records iterator for a sheet's rows.
+
+    Returns:
+        tuple: (table, columns, iterator of record dicts), or None for sheets
+        that are not imported.
+    """
+    if "Recurring" in sheet_name:
+        return "recurring_expenses", RECURRING_COLUMNS, iter_recurring_records(rows)
+    if "Summary" not in sheet_name:
+        return "expenses", EXPENSES_COLUMNS, iter_month_records(rows)
+    return None
+
+
+def parse_sheet(file_path, sheet_name):
+    """
+    Parse one sheet into (key, row) pairs; runs inside an import worker process.
+
+    Returns:
+        tuple: (table, columns, list of (duplicate key, row tuple)), or None for
+        sheets that are not imported.
+    """
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        parsed = sheet_records(
+            sheet_name, workbook[sheet_name].iter_rows(values_only=True)
+        )
+        if parsed is None:
+            return None
+        table, columns, records = parsed
+        keyed_rows = [
+            (
+                tuple(record[column] for column in DUPLICATE_KEY),
+                tuple(record[column] for column in columns),
+            )
+            for record in records
+        ]
+    finally:
+        workbook.close()
+    return table, columns, keyed_rows
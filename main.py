@@ -4,6 +4,8 @@ import os
 from flask import Flask
 from routes import register_blueprints
 from routes.admin_routes import admin_bp  # Import admin blueprint
+from setup import setup_db, setup_fx_queue, setup_metrics, setup_stg
+from setup.setup_config import get_settings
 
 
 def create_app():
@@ -12,6 +14,13 @@ def create_app():
     app.secret_key = os.urandom(24)  # Set a random secret key for session management
     register_blueprints(app)
     app.register_blueprint(admin_bp, url_prefix="/admin")  # Register admin blueprint
+    setup_db.init_app(app)  # Return pooled database connections on teardown
+    settings = get_settings()
+    if settings.instrumentation:
+        setup_metrics.init_app(app)  # Server-Timing headers and /metrics
+    if settings.async_fx_conversion and setup_stg.get_api_url():
+        # Settle conversions that were still pending when the last run stopped
+        setup_fx_queue.recover_pending(setup_stg.get_api_url())
     return app
 
 
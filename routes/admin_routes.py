@@ -1,10 +1,14 @@
 """This module contains the routes for the admin panel of the application."""
 
-import os
+import csv
+import functools
+import io
 import sqlite3
-import yaml
+import tempfile
+
 from flask import (
     Blueprint,
+    Response,
     render_template,
     request,
     redirect,
@@ -13,27 +17,86 @@ from flask import (
     flash,
     jsonify,
     current_app,
+    send_file,
+    stream_with_context,
 )
 from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.utils import secure_filename
+
+from db_export.db_export import EXPORT_FORMATS, stream_csv, write_parquet
+from setup.merge_db import MERGE_TABLES
+from setup.setup_config import get_settings
+from setup.setup_db import connect_db
 
 admin_bp = Blueprint("admin", __name__)
 
-# Load admin credentials from user_config.yaml
-CONFIG_PATH = os.path.join(os.path.dirname(__file__), "../cfg/user_config.yaml")
 
-try:
-    with open(CONFIG_PATH, "r", encoding="utf-8") as config_file:
-        config = yaml.safe_load(config_file)
-        ADMIN_USERNAME = config.get("admin_username", "adm1n")  # Default to "admin"
-        ADMIN_PASSWORD = config.get(
-            "admin_password", "securepassw0rd"
-        )  # Default to "securepassword"
-except FileNotFoundError:  # pragma: no cover
-    ADMIN_USERNAME = "adm2n"
-    ADMIN_PASSWORD = "securepassw1rd"
+# Hashing is deliberately slow, so the admin password is hashed on the first
+# login and again only when the configured password changes
+@functools.lru_cache(maxsize=1)
+def hash_password(password):
+    """Return the hash of a password, computed once per password"""
+    return generate_password_hash(password)
+
+
+def admin_password_hash():
+    """Return the hash the admin password is checked against"""
+    return hash_password(get_settings().admin_password)
+
 
-# Hash the admin password
-ADMIN_PASSWORD_HASH = generate_password_hash(ADMIN_PASSWORD)
+# Columns of the expenses table that may be edited from the admin panel
+ALLOWED_EXPENSES_COLUMNS = {
+    "id": "id",
+    "date": "date",
+    "category": "category",
+    "item": "item",
+    "location": "location",
+}
+
+# Number of rows sent per page of the table editor
+PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+# Number of rows fetched per round trip when streaming a CSV export
+EXPORT_BATCH_SIZE = 1000
+
+
+def fetch_expense_page(
+    cursor, start_date, end_date, after_date=None, after_id=None, limit=None
+):
+    """
+    Fetch one page of expenses in a date range using keyset pagination.
+
+    Rows are ordered by (date, id), and the next page starts after the last
+    (date, id) seen, so deep pages cost the same as the first one.
+
+    Returns:
+        tuple: The rows, the column names and the (date, id) cursor of the
+        next page, or None on the last page.
+    """
+    limit = limit or PAGE_SIZE
+    if after_date is not None and after_id is not None:
+        cursor.execute(
+            """SELECT * FROM expenses
+                WHERE date BETWEEN ? AND ? AND (date, id) > (?, ?)
+                ORDER BY date, id LIMIT ?""",
+            (start_date, end_date, after_date, int(after_id), limit + 1),
+        )
+    else:
+        cursor.execute(
+            """SELECT * FROM expenses
+                WHERE date BETWEEN ? AND ?
+                ORDER BY date, id LIMIT ?""",
+            (start_date, end_date, limit + 1),
+        )
+    rows = cursor.fetchall()
+    columns = [description[0] for description in cursor.description]
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last_row = dict(zip(columns, rows[-1]))
+        next_cursor = {"after_date": last_row["date"], "after_id": last_row["id"]}
+    return rows, columns, next_cursor
 
 
 @admin_bp.route("/login", methods=["GET", "POST"])
@@ -44,8 +107,8 @@ def login():
         password = request.form.get("password")
 
         # pylint: disable=no-else-return
-        if username == ADMIN_USERNAME and check_password_hash(
-            ADMIN_PASSWORD_HASH, password
+        if username == get_settings().admin_username and check_password_hash(
+            admin_password_hash(), password
         ):
             session["admin_logged_in"] = True
             flash("Login successful!", "success")
@@ -74,9 +137,7 @@ def edit_table():  # pylint: disable=too-many-return-statements
         return render_template("select_date_range.html")
 
     try:
-        conn = sqlite3.connect(
-            f"expenses_{db_year}.db"
-        )  # Connect to the selected database
+        conn = connect_db(db_year)  # Connect to the selected database
         cursor = conn.cursor()
 
         if request.method == "POST":
@@ -86,18 +147,11 @@ def edit_table():  # pylint: disable=too-many-return-statements
             value = request.form.get("value")
 
             # Validate the column name against a predefined list of allowed columns
-            allowed_expenses_columns = {
-                "id": "id",
-                "date": "date",
-                "category": "category",
-                "item": "item",
-                "location": "location",
-            }
-            if column not in allowed_expenses_columns:
+            if column not in ALLOWED_EXPENSES_COLUMNS:
                 return jsonify({"success": False, "error": "Invalid column name."}), 400
 
             try:
-                sql_query = f"UPDATE expenses SET {allowed_expenses_columns[column]} = ? WHERE id = ?"
+                sql_query = f"UPDATE expenses SET {ALLOWED_EXPENSES_COLUMNS[column]} = ? WHERE id = ?"
                 cursor.execute(sql_query, (value, record_id))
                 conn.commit()
                 return jsonify({"success": True})
@@ -107,19 +161,15 @@ def edit_table():  # pylint: disable=too-many-return-statements
                     {"success": False, "error": "An internal error occurred."}
                 )
 
-        # Fetch data for the table based on the date range
-        cursor.execute(
-            "SELECT * FROM expenses WHERE date BETWEEN ? AND ?",
-            (start_date, end_date),
-        )
-        rows = cursor.fetchall()
-        columns = [description[0] for description in cursor.description]
+        # Fetch the first page; later pages are loaded from edit_table_rows
+        rows, columns, next_cursor = fetch_expense_page(cursor, start_date, end_date)
         conn.close()
 
         return render_template(
             "edit_table.html",
             rows=rows,
             columns=columns,
+            next_cursor=next_cursor,
             year=db_year,
             start_date=start_date,
             end_date=end_date,
@@ -132,6 +182,219 @@ def edit_table():  # pylint: disable=too-many-return-statements
         return redirect(url_for("admin.edit_table"))
 
 
+def validate_edits(edits):
+    """
+    Check a list of {id, column, value} edits against the column whitelist.
+
+    Returns:
+        tuple: Per-edit results (None for edits still to be applied) and the
+        valid edits as (index, column, value, id) tuples.
+    """
+    results = [None] * len(edits)
+    valid_edits = []
+    for index, edit in enumerate(edits):
+        if not isinstance(edit, dict) or "id" not in edit or "value" not in edit:
+            results[index] = {"success": False, "error": "Edit needs an id and value."}
+        elif edit.get("column") not in ALLOWED_EXPENSES_COLUMNS:
+            results[index] = {"success": False, "error": "Invalid column name."}
+        else:
+            valid_edits.append((index, edit["column"], edit["value"], edit["id"]))
+    return results, valid_edits
+
+
+@admin_bp.route("/edit_table/bulk", methods=["POST"])
+def bulk_edit_table():
+    """Apply a batch of cell edits to the expenses table in one transaction."""
+    if not session.get("admin_logged_in"):
+        return jsonify({"error": "Please log in to access the admin dashboard."}), 401
+
+    payload = request.get_json(silent=True) or {}
+    db_year = payload.get("year") or request.args.get("year")
+    edits = payload.get("edits")
+    if not db_year or not isinstance(edits, list):
+        return jsonify({"error": "Year and a list of edits are required"}), 400
+
+    results, valid_edits = validate_edits(edits)
+    try:
+        conn = connect_db(db_year)
+        try:
+            # Apply the edits in request order, so an id edit and later edits
+            # to the renumbered row behave as they would one at a time
+            with conn:  # One transaction (and one commit) for the whole batch
+                for index, column, value, record_id in valid_edits:
+                    try:
+                        cursor = conn.execute(
+                            f"UPDATE expenses SET {ALLOWED_EXPENSES_COLUMNS[column]} = ? WHERE id = ?",
+                            (value, record_id),
+                        )
+                    except sqlite3.IntegrityError:
+                        results[index] = {
+                            "success": False,
+                            "error": "Invalid value for this column.",
+                        }
+                        continue
+                    if cursor.rowcount:
+                        results[index] = {"success": True}
+                    else:
+                        results[index] = {
+                            "success": False,
+                            "error": "Record not found.",
+                        }
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        current_app.logger.error(f"Database error: {str(e)}")
+        return jsonify({"success": False, "error": "An internal error occurred."}), 500
+
+    for result, edit in zip(results, edits):
+        if isinstance(edit, dict):
+            result.update({"id": edit.get("id"), "column": edit.get("column")})
+    return jsonify(
+        {"success": all(result["success"] for result in results), "results": results}
+    )
+
+
+@admin_bp.route("/edit_table/rows")
+def edit_table_rows():
+    """Return the next page of the table editor as JSON."""
+    if not session.get("admin_logged_in"):
+        return jsonify({"error": "Please log in to access the admin dashboard."}), 401
+
+    db_year = request.args.get("year")
+    start_date = request.args.get("start_date")
+    end_date = request.args.get("end_date")
+    if not db_year or not start_date or not end_date:
+        return jsonify({"error": "Year, start date and end date are required"}), 400
+
+    try:
+        limit = min(int(request.args.get("limit", PAGE_SIZE)), MAX_PAGE_SIZE)
+        conn = connect_db(db_year)
+        try:
+            rows, columns, next_cursor = fetch_expense_page(
+                conn.cursor(),
+                start_date,
+                end_date,
+                after_date=request.args.get("after_date"),
+                after_id=request.args.get("after_id"),
+                limit=max(limit, 1),
+            )
+        finally:
+            conn.close()
+        return jsonify(
+            {
+                "columns": columns,
+                "rows": [list(row) for row in rows],
+                "next": next_cursor,
+            }
+        )
+    except ValueError:
+        return jsonify({"error": "Invalid pagination parameters"}), 400
+    except sqlite3.Error as e:
+        current_app.logger.error(f"Database error: {str(e)}")
+        return jsonify({"error": "An internal error occurred."}), 500
+
+
+@admin_bp.route("/edit_table/export.csv")
+def export_table_csv():
+    """Stream every expense in a date range as CSV."""
+    if not session.get("admin_logged_in"):
+        flash("Please log in to access the admin dashboard.", "warning")
+        return redirect(url_for("admin.login"))
+
+    db_year = request.args.get("year")
+    start_date = request.args.get("start_date")
+    end_date = request.args.get("end_date")
+    if not db_year or not start_date or not end_date:
+        return jsonify({"error": "Year, start date and end date are required"}), 400
+
+    try:
+        conn = connect_db(db_year)
+        cursor = conn.execute(
+            "SELECT * FROM expenses WHERE date BETWEEN ? AND ? ORDER BY date, id",
+            (start_date, end_date),
+        )
+    except sqlite3.Error as e:
+        current_app.logger.error(f"Database error: {str(e)}")
+        return jsonify({"error": "An internal error occurred."}), 500
+
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        try:
+            writer.writerow([description[0] for description in cursor.description])
+            while True:
+                rows = cursor.fetchmany(EXPORT_BATCH_SIZE)
+                if not rows:
+                    break
+                writer.writerows(rows)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
+            # Flush the header when the range is empty
+            if buffer.tell():
+                yield buffer.getvalue()
+        finally:
+            conn.close()
+
+    filename = secure_filename(f"expenses_{db_year}_{start_date}_{end_date}.csv")
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/csv",
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
+
+
+@admin_bp.route("/export")
+def export_data():
+    """Export a table across every year database as CSV or Parquet."""
+    if not session.get("admin_logged_in"):
+        flash("Please log in to access the admin dashboard.", "warning")
+        return redirect(url_for("admin.login"))
+
+    table = request.args.get("table", "expenses")
+    export_format = request.args.get("format", "csv")
+    start_date = request.args.get("start_date")
+    end_date = request.args.get("end_date")
+    if not start_date or not end_date:
+        return jsonify({"error": "Start date and end date are required"}), 400
+    if table not in MERGE_TABLES or export_format not in EXPORT_FORMATS:
+        return jsonify({"error": "Invalid table or export format"}), 400
+
+    filename = secure_filename(f"{table}_{start_date}_{end_date}.{export_format}")
+    try:
+        if export_format == "parquet":
+            # Parquet needs the whole file written before it can be sent
+            output = tempfile.TemporaryFile()
+            write_parquet(table, start_date, end_date, output)
+            output.seek(0)
+            return send_file(
+                output,
+                mimetype="application/vnd.apache.parquet",
+                as_attachment=True,
+                download_name=filename,
+            )
+
+        chunks = stream_csv(table, start_date, end_date)
+        first_chunk = next(chunks)  # Validate the range before streaming
+
+        def generate():
+            yield first_chunk
+            yield from chunks
+
+        return Response(
+            stream_with_context(generate()),
+            mimetype="text/csv",
+            headers={"Content-Disposition": f"attachment; filename={filename}"},
+        )
+    except ValueError:
+        return jsonify({"error": "Invalid date range"}), 400
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 400
+    except sqlite3.Error as e:
+        current_app.logger.error(f"Database error: {str(e)}")
+        return jsonify({"error": "An internal error occurred."}), 500
+
+
 @admin_bp.route("/logout")
 def logout():
     """Admin logout."""
@@ -1,18 +1,25 @@
 """This module contains the routes for add_expense."""
 
+import csv
+import io
 import sqlite3
 import logging
+from collections import defaultdict
 from datetime import datetime
 from flask import Blueprint, request, jsonify
+import requests
 
 from setup.setup_db import get_db
 from setup import setup_stg
+from setup.setup_config import get_settings
+from setup.setup_fx_queue import get_fx_queue
 
-api_key, error_bypass = setup_stg.cfg_setup()
-if api_key:
-    API_URL = f"https://v6.exchangerate-api.com/v6/{api_key}/latest/"
-else:
-    API_URL = None
+# Fields every expense row must provide
+EXPENSE_FIELDS = ["date", "category", "item", "location", "price", "currency"]
+# Fields stored as text
+TEXT_FIELDS = ["category", "item", "location", "currency"]
+INSERT_EXPENSE = """INSERT INTO expenses (date, category, item, location, price,
+        currency, price_sgd) VALUES (?, ?, ?, ?, ?, ?, ?)"""
 
 expense_bp = Blueprint("expense", __name__)
 
@@ -28,9 +35,16 @@ def add_expense():
         year = datetime.strptime(data["date"], "%Y-%m-%d").year
         conn = get_db(year)
         cursor = conn.cursor()
-        if API_URL:
+        api_url = setup_stg.get_api_url()
+        # Insert immediately and convert the currency in the background
+        fx_pending = (
+            api_url and get_settings().async_fx_conversion and data["currency"] != "SGD"
+        )
+        if fx_pending:
+            price_sgd = None  # Filled in by the background FX queue
+        elif api_url:
             price_sgd = setup_stg.convert_to_sgd(
-                API_URL, data["price"], data["currency"]
+                api_url, data["price"], data["currency"], on_date=data["date"]
             )
         else:
             price_sgd = data["price"]
@@ -48,8 +62,150 @@ def add_expense():
             ),
         )
         conn.commit()
-        conn.close()
+        if fx_pending:
+            get_fx_queue(api_url).submit(
+                year, cursor.lastrowid, data["price"], data["currency"], data["date"]
+            )
+            return jsonify(
+                {"message": "Expense added successfully", "price_sgd_pending": True}
+            )
         return jsonify({"message": "Expense added successfully"})
     except (KeyError, ValueError, TypeError, sqlite3.DatabaseError):
         logging.error("Exception occurred", exc_info=True)
         return jsonify({"error": "An internal error has occurred!"}), 500
+
+
+def read_bulk_rows():
+    """Return the expense rows of a bulk request from a JSON array or CSV body"""
+    if request.mimetype == "text/csv":
+        stream = io.TextIOWrapper(request.stream, encoding="utf-8-sig", newline="")
+        return list(csv.DictReader(stream))
+    rows = request.get_json(silent=True)
+    if isinstance(rows, dict):
+        rows = rows.get("expenses")
+    if not isinstance(rows, list):
+        raise ValueError("Expected a JSON array or CSV of expenses")
+    return rows
+
+
+def validate_bulk_row(row):
+    """Return a normalised expense row, raising ValueError if it is invalid"""
+    if not isinstance(row, dict):
+        raise ValueError("Expense must be an object")
+    missing = [field for field in EXPENSE_FIELDS if row.get(field) in (None, "")]
+    if missing:
+        raise ValueError(f"Missing fields: {', '.join(missing)}")
+    expense = {field: row[field] for field in EXPENSE_FIELDS}
+    for field in TEXT_FIELDS:
+        if not isinstance(expense[field], (str, int, float)):
+            raise ValueError(f"Field {field} must be text")
+        expense[field] = str(expense[field])
+    # Accept a date or timestamp, but store only the normalised date
+    expense_date = datetime.fromisoformat(str(expense["date"]).strip()).date()
+    expense["date"] = expense_date.strftime("%Y-%m-%d")
+    expense["year"] = expense_date.year
+    expense["price"] = float(expense["price"])
+    expense["currency"] = str(expense["currency"]).upper()
+    return expense
+
+
+def expense_values(expense):
+    """Return the INSERT_EXPENSE parameters for a validated expense row"""
+    return tuple(expense[field] for field in EXPENSE_FIELDS) + (expense["price_sgd"],)
+
+
+@expense_bp.route("/add_expenses_bulk", methods=["POST"])
+def add_expenses_bulk():
+    """Function to add many expenses at once from a JSON array or CSV upload
+
+    Rows are converted with one rate lookup per currency and inserted with a
+    single transaction per year database. Each row gets its own status.
+    """
+    try:
+        rows = read_bulk_rows()
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        return jsonify({"error": str(e)}), 400
+
+    results = [None] * len(rows)
+    expenses = []
+    for index, row in enumerate(rows):
+        try:
+            expenses.append((index, validate_bulk_row(row)))
+        except (ValueError, TypeError) as e:
+            results[index] = {"row": index, "success": False, "error": str(e)}
+
+    # Convert every currency with one rate lookup
+    api_url = setup_stg.get_api_url()
+    by_currency = defaultdict(list)
+    for index, expense in expenses:
+        by_currency[expense["currency"]].append((index, expense))
+    for currency, items in by_currency.items():
+        if api_url:
+            try:
+                prices_sgd = setup_stg.convert_many_to_sgd(
+                    api_url,
+                    currency,
+                    [expense["price"] for _, expense in items],
+                    [expense["date"] for _, expense in items],
+                )
+            except requests.RequestException:
+                # Leave the rows pending for the background queue to retry
+                logging.warning("FX lookup for %s failed", currency, exc_info=True)
+                prices_sgd = [None] * len(items)
+        else:
+            prices_sgd = [expense["price"] for _, expense in items]
+        for (_, expense), price_sgd in zip(items, prices_sgd):
+            expense["price_sgd"] = price_sgd
+
+    # Insert each year's rows in a single transaction
+    by_year = defaultdict(list)
+    for index, expense in expenses:
+        by_year[expense["year"]].append((index, expense))
+    for year, items in by_year.items():
+        try:
+            conn = get_db(year)
+            pending = []
+            with conn:
+                cursor = conn.cursor()
+                cursor.executemany(
+                    INSERT_EXPENSE,
+                    [
+                        expense_values(expense)
+                        for _, expense in items
+                        if expense["price_sgd"] is not None
+                    ],
+                )
+                # Insert pending rows one by one to learn their ids for the queue
+                for _, expense in items:
+                    if expense["price_sgd"] is None:
+                        cursor.execute(INSERT_EXPENSE, expense_values(expense))
+                        pending.append((cursor.lastrowid, expense))
+        except sqlite3.DatabaseError:
+            logging.error("Exception occurred", exc_info=True)
+            for index, _ in items:
+                results[index] = {
+                    "row": index,
+                    "success": False,
+                    "error": "An internal error has occurred!",
+                }
+            continue
+
+        for index, expense in items:
+            results[index] = {"row": index, "success": True}
+            if expense["price_sgd"] is None:
+                results[index]["price_sgd_pending"] = True
+        if api_url:
+            # Let the background queue retry conversions that had no rate
+            for expense_id, expense in pending:
+                get_fx_queue(api_url).submit(
+                    year,
+                    expense_id,
+                    expense["price"],
+                    expense["currency"],
+                    expense["date"],
+                )
+
+    inserted = sum(1 for result in results if result["success"])
+    return jsonify(
+        {"inserted": inserted, "failed": len(results) - inserted, "results": results}
+    )
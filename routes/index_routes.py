@@ -6,8 +6,8 @@ import sqlite3
 from datetime import datetime
 from flask import Blueprint, render_template, jsonify, request, redirect, url_for
 
-from setup.setup_db import get_db
-from db_import.db_import import update_database_from_excel
+from setup.setup_db import get_db, month_range, schedule_years
+from db_import.import_jobs import get_import_jobs
 
 index_bp = Blueprint("index", __name__)
 
@@ -17,53 +17,38 @@ def index():
     """Function to render the index page"""
     try:
         current_year = datetime.now().year
-        current_month = datetime.now().strftime("%m")
+        current_month = datetime.now().month
+        month_start, next_month_start = month_range(current_year, current_month)
         conn = get_db(current_year)
         cursor = conn.cursor()
         cursor.execute(
-            "SELECT SUM(price_sgd) FROM expenses WHERE strftime('%m', date) = ?",
-            (current_month,),
+            "SELECT total FROM monthly_totals WHERE month = ?",
+            (month_start[:7],),
         )
-        month_spend = cursor.fetchone()[0] or 0
-        cursor.execute(
-            "SELECT SUM(price_sgd) FROM recurring_expenses WHERE \
-            (CAST(strftime('%m', start_date) AS INTEGER) <= ? AND \
-            CAST(strftime('%Y', start_date) AS INTEGER) <= ?) AND \
-            (end_date IS ? OR \
-            (CAST(strftime('%m', end_date) AS INTEGER) >= ? AND \
-            CAST(strftime('%Y', end_date) AS INTEGER) >= ?))",
-            (
-                int(current_month),
-                int(current_year),
-                "",
-                int(current_month),
-                int(current_year),
-            ),
-        )
-        month_recur_spend = cursor.fetchone()[0] or 0
+        month_row = cursor.fetchone()
+        month_spend = (month_row[0] if month_row else 0) or 0
+        # Recurring expenses charged this month, from the materialized schedule
+        # of every database holding items that started up to this year
+        month_recur_spend = 0
+        for year in schedule_years(current_year):
+            schedule = cursor if year == current_year else get_db(year).cursor()
+            schedule.execute(
+                "SELECT total FROM recurring_schedule WHERE month = ?",
+                (month_start[:7],),
+            )
+            recur_row = schedule.fetchone()
+            month_recur_spend += (recur_row[0] if recur_row else 0) or 0
         total_month_spend = month_spend + month_recur_spend
 
+        # Salaries that started before next month and end after this month
         cursor.execute(
-            "SELECT SUM(amount) FROM salary WHERE \
-            (CAST(strftime('%m', start_date) AS INTEGER) <= ? AND \
-            CAST(strftime('%Y', start_date) AS INTEGER) <= ?) AND \
-            (end_date IS ? OR \
-            (CAST(strftime('%m', end_date) AS INTEGER) > ? AND \
-            CAST(strftime('%Y', end_date) AS INTEGER) = ?) OR \
-            (CAST(strftime('%Y', end_date) AS INTEGER) > ?))",
-            (
-                int(current_month),
-                int(current_year),
-                "",
-                int(current_month),
-                int(current_year),
-                int(current_year),
-            ),
+            "SELECT SUM(amount) FROM salary WHERE start_date < ? AND \
+            (end_date IS NULL OR end_date = '' OR end_date >= ?)",
+            (next_month_start, next_month_start),
         )
         month_salary = cursor.fetchone()[0] or 0
         total_month_balance = month_salary - total_month_spend
 
-        conn.close()
         return render_template(
             "index.html",
             monthly_spending=total_month_spend,
@@ -76,9 +61,17 @@ def index():
         return jsonify({"error": "An internal error has occurred!"}), 500
 
 
+def update_database_from_excel(file_path, db_year, **kwargs):
+    """Run an Excel import, loading pandas and openpyxl on first use"""
+    # The importer's dependencies add most of the app's startup time
+    from db_import import db_import  # pylint: disable=import-outside-toplevel
+
+    return db_import.update_database_from_excel(file_path, db_year, **kwargs)
+
+
 @index_bp.route("/upload_excel", methods=["GET", "POST"])
 def upload_excel():
-    """Render the page to input the Excel file path and handle the upload."""
+    """Render the page to input the Excel file path and queue the import."""
     if request.method == "POST":
         excel_path = request.form.get("excel_path")
         year = request.form.get("year")
@@ -88,13 +81,34 @@ def upload_excel():
             return redirect(url_for("index.upload_excel"))
 
         try:
-            # Call the function to update the database
-            update_database_from_excel(excel_path, int(year))
-            jsonify({"message": "Database updated successfully!"})
+            # Queue the import; progress is polled from import_job_status
+            job_id = get_import_jobs().submit(
+                update_database_from_excel, excel_path, int(year)
+            )
         except (KeyError, ValueError, TypeError, sqlite3.DatabaseError):
             logging.error("Exception occurred", exc_info=True)
             return jsonify({"error": "An internal error has occurred!"}), 500
 
-        return redirect(url_for("index.index"))
+        if request.accept_mimetypes.best == "application/json":
+            return jsonify(
+                {
+                    "job_id": job_id,
+                    "status_url": url_for("index.import_job_status", job_id=job_id),
+                }
+            ), 202
+        return redirect(url_for("index.upload_excel", job_id=job_id))
 
-    return render_template("upload_excel.html")
+    return render_template("upload_excel.html", job_id=request.args.get("job_id"))
+
+
+@index_bp.route("/import_jobs/<job_id>")
+def import_job_status(job_id):
+    """Return the status and progress of a background import job."""
+    try:
+        job = get_import_jobs().get(job_id)
+    except sqlite3.DatabaseError:
+        logging.error("Exception occurred", exc_info=True)
+        return jsonify({"error": "An internal error has occurred!"}), 500
+    if job is None:
+        return jsonify({"error": "Import job not found"}), 404
+    return jsonify(job)
@@ -1,203 +1,337 @@
 """This module contains the routes for plotting expenditure."""
 
+import hashlib
 import sqlite3
 import logging
+import threading
 
-from datetime import datetime
+from collections import OrderedDict
+from datetime import datetime, timedelta
 from flask import Blueprint, request, render_template, jsonify
-import plotly.graph_objects as go
 
-from setup.setup_db import get_db
+from setup import setup_metrics
+from setup.setup_db import (
+    get_db,
+    db_path,
+    month_range,
+    year_range,
+    schedule_years,
+    split_range_by_db,
+)
 
 plot_bp = Blueprint("plot", __name__)
 
+# Maximum number of chart series kept in memory
+CHART_CACHE_SIZE = 32
 
-@plot_bp.route("/plot_expenditure")
-def plot_expenditure():
-    """Function to plot the monthly and yearly expenditure"""
-    try:
-        current_year = datetime.now().strftime("%Y")
-        current_month = datetime.now().strftime("%m")
-        conn = get_db(current_year)
-        cursor = conn.cursor()
-
-        # Get monthly expenditure
-        cursor.execute(
-            "SELECT strftime('%d', date) as day, SUM(price_sgd) FROM expenses WHERE strftime('%m', date) = ? GROUP BY day",
-            (current_month,),
-        )
-        month_data = cursor.fetchall()
+MONTH_NAMES = [
+    "Jan",
+    "Feb",
+    "Mar",
+    "Apr",
+    "May",
+    "Jun",
+    "Jul",
+    "Aug",
+    "Sep",
+    "Oct",
+    "Nov",
+    "Dec",
+]
 
-        # Get yearly expenditure
-        cursor.execute(
-            "SELECT strftime('%m', date) as month, SUM(price_sgd) FROM expenses WHERE strftime('%Y', date) = ? GROUP BY month",
-            (current_year,),
-        )
-        year_data = cursor.fetchall()
-
-        conn.close()
-
-        # Prepare data for monthly expenditure
-        days = [int(day) for day, _ in month_data]
-        month_expenses = [expense for _, expense in month_data]
-
-        # Create a Plotly figure for monthly expenditure
-        month_fig = go.Figure()
-        month_fig.add_trace(
-            go.Scatter(
-                x=days,
-                y=month_expenses,
-                mode="lines+markers",
-                marker=dict(size=8),
-                line=dict(color="blue"),
-                hovertemplate="<b>Day:</b> %{x}<br><b>Expenditure:</b> SGD %{y}<extra></extra>",
-            )
-        )
-        month_fig.update_layout(
-            title="Current Month's Expenditure",
-            xaxis_title="Day",
-            yaxis_title="Expenditure (SGD)",
-            xaxis=dict(tickmode="linear"),
-            template="plotly_white",
+
+class ChartCache:
+    """Bounded LRU cache of chart series keyed by data version"""
+
+    def __init__(self, max_entries=CHART_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        """Return the cached series for key, or None on a miss"""
+        with self._lock:
+            series = self._entries.get(key)
+            if series is not None:
+                self._entries.move_to_end(key)
+            return series
+
+    def put(self, key, series):
+        """Store a series, evicting the least recently used entry"""
+        with self._lock:
+            self._entries[key] = series
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop every cached series"""
+        with self._lock:
+            self._entries.clear()
+
+
+chart_cache = ChartCache()
+
+
+def last_month_before(period_end):
+    """Return the YYYY-MM of the day before an exclusive end date"""
+    last_day = datetime.strptime(period_end, "%Y-%m-%d") - timedelta(days=1)
+    return last_day.strftime("%Y-%m")
+
+
+def get_data_versions(cursor, period_start, period_end):
+    """Return (version sum, last updated_at) for the months in a date range"""
+    cursor.execute(
+        "SELECT SUM(version), MAX(updated_at) FROM data_versions WHERE month >= ? AND month <= ?",
+        (period_start[:7], last_month_before(period_end)),
+    )
+    version, updated_at = cursor.fetchone() or (None, None)
+    return version or 0, updated_at
+
+
+def get_schedule_versions(period_start, period_end):
+    """Return (version key, last updated_at) over every database a period reads
+
+    Recurring items charged in the period may be stored in any earlier year's
+    database, whose triggers bump that database's versions for the months
+    they touch. The key holds one (path, version, updated_at) per database.
+    """
+    version_key = []
+    last_modified = None
+    for year in schedule_years(int(last_month_before(period_end)[:4])):
+        version, updated_at = get_data_versions(
+            get_db(year).cursor(), period_start, period_end
         )
-        month_plot_html = month_fig.to_html(full_html=False)
-
-        # Prepare data for yearly expenditure
-        month_names = [
-            "Jan",
-            "Feb",
-            "Mar",
-            "Apr",
-            "May",
-            "Jun",
-            "Jul",
-            "Aug",
-            "Sep",
-            "Oct",
-            "Nov",
-            "Dec",
-        ]
-        months = [month_names[int(month) - 1] for month, _ in year_data]
-        year_expenses = [expense for _, expense in year_data]
-
-        # Create a Plotly figure for yearly expenditure
-        year_fig = go.Figure()
-        year_fig.add_trace(
-            go.Scatter(
-                x=months,
-                y=year_expenses,
-                mode="lines+markers",
-                marker=dict(size=8),
-                line=dict(color="green"),
-                hovertemplate="<b>Month:</b> %{x}<br><b>Expenditure:</b> SGD %{y}<extra></extra>",
+        version_key.append((db_path(year), version, updated_at))
+        if updated_at and (last_modified is None or updated_at > last_modified):
+            last_modified = updated_at
+    return tuple(version_key), last_modified
+
+
+def query_recurring_totals(cursor, first_month, last_month):
+    """Return {month: total} of recurring expenses for the months in a range"""
+    cursor.execute(
+        "SELECT month, total FROM recurring_schedule WHERE month >= ? AND month <= ? ORDER BY month",
+        (first_month, last_month),
+    )
+    return dict(cursor.fetchall())
+
+
+def query_schedule_totals(first_month, last_month):
+    """Return {month: total} of recurring expenses summed across databases"""
+    totals = {}
+    for year in schedule_years(int(last_month[:4])):
+        for month, total in query_recurring_totals(
+            get_db(year).cursor(), first_month, last_month
+        ).items():
+            totals[month] = totals.get(month, 0) + total
+    return dict(sorted(totals.items()))
+
+
+def query_month_series(cursor, month_start, next_month_start):
+    """Return the daily expenditure series and recurring total for a month"""
+    # Get monthly expenditure from the daily rollup
+    cursor.execute(
+        "SELECT substr(day, 9, 2), total FROM daily_totals WHERE day >= ? AND day < ? ORDER BY day",
+        (month_start, next_month_start),
+    )
+    month_data = cursor.fetchall()
+    month = month_start[:7]
+    return {
+        "x": [int(day) for day, _ in month_data],
+        "y": [expense for _, expense in month_data],
+        "recurring": query_schedule_totals(month, month).get(month, 0),
+    }
+
+
+def query_year_series(cursor, year_start, next_year_start):
+    """Return the monthly expenditure and recurring series for a year"""
+    # Get yearly expenditure from the monthly rollup
+    cursor.execute(
+        "SELECT month, total FROM monthly_totals WHERE month >= ? AND month < ? ORDER BY month",
+        (year_start[:7], next_year_start[:7]),
+    )
+    spend = dict(cursor.fetchall())
+    recurring = query_schedule_totals(year_start[:7], year_start[:4] + "-12")
+    # Months without rows are None (a gap in the chart), not a spend of 0; an
+    # open-ended recurring item otherwise adds zero points up to December
+    months = sorted(set(spend) | set(recurring))
+    return {
+        "x": [MONTH_NAMES[int(month[5:7]) - 1] for month in months],
+        "y": [spend.get(month) for month in months],
+        "recurring": [recurring.get(month) for month in months],
+    }
+
+
+def query_custom_series(start_date, end_date_exclusive):
+    """Return the daily expenditure series across every database in a range
+
+    Returns the series, a version key covering every database queried and
+    the most recent updated_at among them.
+    """
+    custom_data = []
+    version_key = ["custom"]
+    last_modified = None
+
+    # Query each database covering the range (one in consolidated mode)
+    for year, range_start, range_end in split_range_by_db(
+        start_date, end_date_exclusive
+    ):
+        cursor = get_db(year).cursor()
+        version, updated_at = get_data_versions(cursor, range_start, range_end)
+        range_key = (db_path(year), range_start, range_end, version, updated_at)
+        version_key.append(range_key)
+        if updated_at and (last_modified is None or updated_at > last_modified):
+            last_modified = updated_at
+
+        range_data = chart_cache.get(("custom", range_key))
+        if range_data is None:
+            # Query expenditures within the custom date range for this database
+            cursor.execute(
+                """
+                SELECT day, total
+                FROM daily_totals
+                WHERE day >= ? AND day < ?
+                ORDER BY day
+                """,
+                (range_start, range_end),
             )
-        )
-        year_fig.update_layout(
-            title="Current Year's Expenditure",
-            xaxis_title="Month",
-            yaxis_title="Expenditure (SGD)",
-            template="plotly_white",
-        )
-        year_plot_html = year_fig.to_html(full_html=False)
+            range_data = cursor.fetchall()
+            chart_cache.put(("custom", range_key), range_data)
+        custom_data.extend(range_data)
 
-        # Render the template with the Plotly plots
-        return render_template(
-            "graph_plot.html",
-            month_plot_html=month_plot_html,
-            year_plot_html=year_plot_html,
-        )
+    # Recurring items can be stored in any year up to the end of the range
+    first_month, last_month = start_date[:7], last_month_before(end_date_exclusive)
+    schedule_key, updated_at = get_schedule_versions(start_date, end_date_exclusive)
+    version_key.append(schedule_key)
+    if updated_at and (last_modified is None or updated_at > last_modified):
+        last_modified = updated_at
+    recurring_key = ("recurring", first_month, last_month, schedule_key)
+    recurring = chart_cache.get(recurring_key)
+    if recurring is None:
+        recurring = query_schedule_totals(first_month, last_month)
+        chart_cache.put(recurring_key, recurring)
+
+    custom_data.sort(key=lambda x: x[0])  # Sort by date
+    series = {
+        "x": [date for date, _ in custom_data],
+        "y": [expense for _, expense in custom_data],
+        "recurring": {
+            "x": list(recurring),
+            "y": list(recurring.values()),
+        },
+    }
+    return series, tuple(version_key), last_modified
+
+
+def series_response(series, version_key, last_modified):
+    """Return a JSON series response that browsers can revalidate with a 304"""
+    with setup_metrics.timed("serialize"):
+        response = jsonify(series)
+    response.set_etag(hashlib.sha1(repr(version_key).encode()).hexdigest())
+    if last_modified:
+        response.last_modified = datetime.strptime(last_modified, "%Y-%m-%dT%H:%M:%SZ")
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+def parse_custom_range():
+    """Parse the start_date/end_date query parameters
+
+    Returns the start date, the end date and the exclusive upper bound used
+    so that timestamped dates on end_date are included.
+    """
+    start_date = datetime.strptime(request.args["start_date"], "%Y-%m-%d")
+    end_date = datetime.strptime(request.args["end_date"], "%Y-%m-%d")
+    return (
+        start_date.strftime("%Y-%m-%d"),
+        end_date.strftime("%Y-%m-%d"),
+        (end_date + timedelta(days=1)).strftime("%Y-%m-%d"),
+    )
+
+
+@plot_bp.route("/api/series/month")
+def month_series():
+    """Return a month's daily expenditure and recurring total as columnar JSON"""
+    try:
+        year = int(request.args.get("year", datetime.now().year))
+        month = int(request.args.get("month", datetime.now().month))
+        month_start, next_month_start = month_range(year, month)
+        cursor = get_db(year).cursor()
+
+        versions, updated_at = get_schedule_versions(month_start, next_month_start)
+        version_key = ("month", month_start, versions)
+        series = chart_cache.get(version_key)
+        if series is None:
+            series = query_month_series(cursor, month_start, next_month_start)
+            chart_cache.put(version_key, series)
+        return series_response(series, version_key, updated_at)
     except (KeyError, ValueError, TypeError, sqlite3.DatabaseError):
         logging.error("Exception occurred", exc_info=True)
         return jsonify({"error": "An internal error has occurred!"}), 500
 
 
-@plot_bp.route("/plot_custom_expenditure")
-def plot_custom_expenditure():
-    """Function to plot expenditure for a custom date range"""
+@plot_bp.route("/api/series/year")
+def year_series():
+    """Return a year's monthly expenditure and recurring costs as columnar JSON"""
     try:
-        # Get start_date and end_date from query parameters
-        start_date = request.args.get("start_date")
-        end_date = request.args.get("end_date")
+        year = int(request.args.get("year", datetime.now().year))
+        year_start, next_year_start = year_range(year)
+        cursor = get_db(year).cursor()
+
+        versions, updated_at = get_schedule_versions(year_start, next_year_start)
+        version_key = ("year", year_start, versions)
+        series = chart_cache.get(version_key)
+        if series is None:
+            series = query_year_series(cursor, year_start, next_year_start)
+            chart_cache.put(version_key, series)
+        return series_response(series, version_key, updated_at)
+    except (KeyError, ValueError, TypeError, sqlite3.DatabaseError):
+        logging.error("Exception occurred", exc_info=True)
+        return jsonify({"error": "An internal error has occurred!"}), 500
 
-        if not start_date or not end_date:
+
+@plot_bp.route("/api/series/custom")
+def custom_series():
+    """Return the daily expenditure for a custom date range as columnar JSON"""
+    try:
+        if not request.args.get("start_date") or not request.args.get("end_date"):
             return jsonify({"error": "Start date and end date are required"}), 400
 
-        # Parse the start and end dates
-        start_date = datetime.strptime(start_date, "%Y-%m-%d").strftime("%Y-%m-%d")
-        end_date = datetime.strptime(end_date, "%Y-%m-%d").strftime("%Y-%m-%d")
-        start_year = int(start_date.split("-")[0])
-        end_year = int(end_date.split("-")[0])
+        start_date, _, end_date_exclusive = parse_custom_range()
+        series, version_key, last_modified = query_custom_series(
+            start_date, end_date_exclusive
+        )
+        return series_response(series, version_key, last_modified)
+    except (KeyError, ValueError, TypeError, sqlite3.DatabaseError):
+        logging.error("Exception occurred", exc_info=True)
+        return jsonify({"error": "An internal error has occurred!"}), 500
 
-        # Initialize list to store all data
-        custom_data = []
 
-        # Loop through each year in the range and query the respective database
-        for year in range(start_year, end_year + 1):
-            conn = get_db(year)
-            cursor = conn.cursor()
+@plot_bp.route("/plot_expenditure")
+def plot_expenditure():
+    """Function to plot the monthly and yearly expenditure"""
+    # The charts are rendered client-side from the /api/series endpoints
+    return render_template("graph_plot.html")
 
-            # Adjust the date range for the current year
-            year_start_date = max(start_date, f"{year}-01-01")
-            year_end_date = min(end_date, f"{year}-12-31")
 
-            # Query expenditures within the custom date range for the current year
-            cursor.execute(
-                """
-                SELECT date, SUM(price_sgd)
-                FROM expenses
-                WHERE date BETWEEN ? AND ?
-                GROUP BY date
-                """,
-                (year_start_date, year_end_date),
-            )
-            # Format the date to ensure consistency
-            custom_data.extend(
-                [
-                    (
-                        datetime.strptime(row[0].split(" ")[0], "%Y-%m-%d").strftime(
-                            "%Y-%m-%d"
-                        ),
-                        row[1],
-                    )
-                    for row in cursor.fetchall()
-                ]
-            )
-            conn.close()
-
-        # Prepare data for plotting
-        custom_data.sort(key=lambda x: x[0])  # Sort by date
-        dates = [date for date, _ in custom_data]
-        expenses = [expense for _, expense in custom_data]
-
-        # Create an interactive plot using Plotly
-        fig = go.Figure()
-        fig.add_trace(
-            go.Scatter(
-                x=dates,
-                y=expenses,
-                mode="lines+markers",
-                marker={"size": 8},
-                line={"color": "blue"},
-                hovertemplate="<b>Date:</b> %{x}<br><b>Expenditure:</b> SGD %{y}<extra></extra>",
-            )
-        )
-        fig.update_layout(
-            title=f"Expenditure from {start_date} to {end_date}",
-            xaxis_title="Date",
-            yaxis_title="Expenditure (SGD)",
-            xaxis={"tickformat": "%d %b"},
-            template="plotly_white",
-        )
+@plot_bp.route("/plot_custom_expenditure")
+def plot_custom_expenditure():
+    """Function to plot expenditure for a custom date range"""
+    try:
+        # Get start_date and end_date from query parameters
+        if not request.args.get("start_date") or not request.args.get("end_date"):
+            return jsonify({"error": "Start date and end date are required"}), 400
 
-        # Convert the plot to HTML
-        plot_html = fig.to_html(full_html=False)
+        # Parse the start and end dates
+        start_date, end_date, _ = parse_custom_range()
 
+        # The chart is rendered client-side from /api/series/custom
         return render_template(
             "custom_plot.html",
-            plot_html=plot_html,
             start_date=start_date,
             end_date=end_date,
         )
-    except (KeyError, ValueError, TypeError, sqlite3.DatabaseError):
+    except (KeyError, ValueError, TypeError):
         logging.error("Exception occurred", exc_info=True)
         return jsonify({"error": "An internal error has occurred!"}), 500
@@ -9,12 +9,6 @@ from flask import Blueprint, request, jsonify
 from setup.setup_db import get_db
 from setup import setup_stg
 
-api_key, error_bypass = setup_stg.cfg_setup()
-if api_key:
-    API_URL = f"https://v6.exchangerate-api.com/v6/{api_key}/latest/"
-else:
-    API_URL = None
-
 recurring_bp = Blueprint("recurring", __name__)
 
 
@@ -31,7 +25,12 @@ def add_recurring():
             end_year = None
         conn = get_db(start_year)
         cursor = conn.cursor()
-        price_sgd = setup_stg.convert_to_sgd(API_URL, data["price"], data["currency"])
+        price_sgd = setup_stg.convert_to_sgd(
+            setup_stg.get_api_url(),
+            data["price"],
+            data["currency"],
+            on_date=data["start_date"],
+        )
         if end_year:
             months_count = (end_year - start_year) * 12 + (
                 datetime.strptime(end_date, "%Y-%m-%d").month
@@ -57,7 +56,6 @@ def add_recurring():
             ),
         )
         conn.commit()
-        conn.close()
         return jsonify({"message": "Recurring expense added successfully"})
     except (KeyError, ValueError, TypeError, sqlite3.DatabaseError):
         logging.error("Exception occurred", exc_info=True)
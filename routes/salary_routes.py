@@ -9,12 +9,6 @@ from flask import Blueprint, request, jsonify
 from setup.setup_db import get_db
 from setup import setup_stg
 
-api_key, error_bypass = setup_stg.cfg_setup()
-if api_key:
-    API_URL = f"https://v6.exchangerate-api.com/v6/{api_key}/latest/"
-else:
-    API_URL = None
-
 salary_bp = Blueprint("salary", __name__)
 
 
@@ -26,7 +20,12 @@ def add_salary():
         start_year = datetime.strptime(data["start_date"], "%Y-%m-%d").year
         conn = get_db(start_year)
         cursor = conn.cursor()
-        amount_sgd = setup_stg.convert_to_sgd(API_URL, data["amount"], data["currency"])
+        amount_sgd = setup_stg.convert_to_sgd(
+            setup_stg.get_api_url(),
+            data["amount"],
+            data["currency"],
+            on_date=data["start_date"],
+        )
 
         # Update end_date of previous salary entry if exists
         cursor.execute("SELECT COUNT(*) FROM salary")
@@ -51,7 +50,6 @@ def add_salary():
             (data["start_date"], "", amount_sgd),
         )
         conn.commit()
-        conn.close()
         return jsonify({"message": "Salary added successfully"})
 
     except (KeyError, ValueError, TypeError, sqlite3.DatabaseError):
@@ -0,0 +1,125 @@
+"""Module to merge per-year expenses_<year>.db files into a single database"""
+
+import argparse
+import os
+import sqlite3
+
+from setup.setup_config import get_settings
+from setup.setup_db import (
+    apply_pragmas,
+    ensure_schema,
+    find_year_databases,
+    storage_config,
+)
+
+# Columns copied for each table; ids are renumbered in the merged database
+MERGE_TABLES = {
+    "expenses": [
+        "date",
+        "category",
+        "item",
+        "location",
+        "price",
+        "currency",
+        "price_sgd",
+    ],
+    "recurring_expenses": [
+        "start_date",
+        "end_date",
+        "category",
+        "item",
+        "location",
+        "ori_price",
+        "currency",
+        "price_sgd",
+    ],
+    "salary": ["start_date", "end_date", "amount"],
+}
+
+
+def merge_year_databases(output_path, source_paths):
+    """
+    Merge per-year databases into one consolidated database.
+
+    Each source file is recorded in a merge_log table so running the merge
+    again skips files that were already merged.
+
+    Args:
+        output_path (str): Path of the consolidated database.
+        source_paths (list): Paths of the expenses_<year>.db files to merge.
+
+    Returns:
+        dict: Number of rows merged per table.
+    """
+    conn = sqlite3.connect(output_path)
+    apply_pragmas(conn)
+    ensure_schema(conn, output_path)
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS merge_log (
+                source TEXT PRIMARY KEY,
+                merged_at TEXT DEFAULT CURRENT_TIMESTAMP)"""
+    )
+    conn.commit()
+
+    merged_rows = {table: 0 for table in MERGE_TABLES}
+    try:
+        for source_path in source_paths:
+            source = os.path.basename(source_path)
+            if conn.execute(
+                "SELECT 1 FROM merge_log WHERE source = ?", (source,)
+            ).fetchone():
+                continue
+
+            conn.execute("ATTACH DATABASE ? AS src", (source_path,))
+            try:
+                source_tables = {
+                    row[0]
+                    for row in conn.execute(
+                        "SELECT name FROM src.sqlite_master WHERE type = 'table'"
+                    )
+                }
+                with conn:
+                    for table, columns in MERGE_TABLES.items():
+                        if table not in source_tables:
+                            continue
+                        column_list = ", ".join(columns)
+                        cursor = conn.execute(
+                            f"""INSERT INTO main.{table} ({column_list})
+                                SELECT {column_list} FROM src.{table} ORDER BY id"""
+                        )
+                        merged_rows[table] += cursor.rowcount
+                    conn.execute("INSERT INTO merge_log (source) VALUES (?)", (source,))
+            finally:
+                conn.execute("DETACH DATABASE src")
+    finally:
+        conn.close()
+
+    return merged_rows
+
+
+def main(argv=None):
+    """Command line entry point for merging the per-year databases"""
+    parser = argparse.ArgumentParser(
+        description="Merge expenses_<year>.db files into a single database."
+    )
+    parser.add_argument(
+        "--output",
+        default=storage_config()[1],
+        help="Path of the consolidated database (default: consolidated_db_path)",
+    )
+    parser.add_argument(
+        "--source-dir",
+        default=get_settings().db_dir or ".",
+        help="Directory containing the expenses_<year>.db files (default: db_dir)",
+    )
+    args = parser.parse_args(argv)
+
+    merged_rows = merge_year_databases(
+        args.output, find_year_databases(args.source_dir)
+    )
+    for table, count in merged_rows.items():
+        print(f"{table}: {count} rows merged")
+
+
+if __name__ == "__main__":
+    main()
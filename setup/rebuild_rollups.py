@@ -0,0 +1,48 @@
+"""Module to rebuild the spend rollups and the recurring schedule from raw rows"""
+
+import argparse
+
+from setup.setup_db import (
+    connect_db,
+    db_path,
+    existing_years,
+    rebuild_recurring_schedule,
+    rebuild_rollups,
+)
+
+
+def rebuild_years(years):
+    """Rebuild the rollups and recurring schedule for each year's database,
+    returning the years done"""
+    for year in years:
+        conn = connect_db(year)
+        try:
+            rebuild_rollups(conn)
+            rebuild_recurring_schedule(conn)
+            conn.commit()
+        finally:
+            conn.close()
+    return years
+
+
+def main(argv=None):
+    """Command line entry point for rebuilding the rollup and schedule tables"""
+    parser = argparse.ArgumentParser(
+        description="Rebuild the spend rollups and the recurring_schedule table."
+    )
+    parser.add_argument(
+        "years",
+        nargs="*",
+        type=int,
+        help="Years to rebuild (default: every expenses_<year>.db found)",
+    )
+    args = parser.parse_args(argv)
+
+    years = args.years or existing_years()
+
+    for year in rebuild_years(years):
+        print(f"Rebuilt rollups for {db_path(year)}")
+
+
+if __name__ == "__main__":
+    main()
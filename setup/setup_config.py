@@ -0,0 +1,162 @@
+"""Module to load the user configuration once and expose it as typed settings
+
+Every setting can be overridden with an environment variable named
+FINANCE_<SETTING>, e.g. FINANCE_API_KEY or FINANCE_POOL_SIZE. The file is
+re-read when its modification time changes, so most settings take effect
+without a restart; objects built once per process (the connection pool, the
+exchange-rate cache and the import job table) keep the values they started
+with.
+"""
+
+import os
+import threading
+import time
+
+import yaml
+
+DEFAULT_CONFIG_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "cfg",
+    "user_config.yaml",
+)
+ENV_PREFIX = "FINANCE_"
+# Minimum seconds between checks of the config file's modification time
+RELOAD_INTERVAL = 1.0
+
+# Setting name -> (type, default)
+SETTINGS = {
+    "api_key": (str, ""),
+    "error_bypass": (bool, True),
+    "admin_username": (str, "adm1n"),
+    "admin_password": (str, "securepassw0rd"),
+    "db_dir": (str, ""),
+    "storage_mode": (str, "per_year"),
+    "consolidated_db_path": (str, "expenses.db"),
+    "pool_size": (int, 5),
+    "pool_timeout": (float, 30.0),
+    "sqlite_pragmas": (dict, {}),
+    "fx_cache_ttl": (int, 12 * 60 * 60),
+    "fx_cache_path": (str, "fx_cache.json"),
+    "fx_store_path": (str, "fx_rates.db"),
+    "fx_rate_file": (str, ""),
+    "fx_rate_max_age_days": (int, 4),
+    "async_fx_conversion": (bool, False),
+    "excel_import_mode": (str, "pandas"),
+    "excel_import_workers": (int, None),
+    "import_jobs_path": (str, "import_jobs.db"),
+    "incremental_import": (bool, True),
+    "instrumentation": (bool, False),
+}
+
+TRUE_VALUES = {"1", "true", "yes", "on"}
+FALSE_VALUES = {"0", "false", "no", "off"}
+
+
+def parse_value(name, value):
+    """Convert a config or environment value to the type of a setting"""
+    kind, default = SETTINGS[name]
+    if value is None or (value == "" and kind is not str):
+        return dict(default) if kind is dict else default
+    if kind is bool:
+        if isinstance(value, bool):
+            return value
+        if str(value).lower() in TRUE_VALUES:
+            return True
+        if str(value).lower() in FALSE_VALUES:
+            return False
+        raise ValueError(f"Invalid boolean for setting {name}: {value!r}")
+    if kind is dict:
+        # Environment overrides are given as YAML, e.g. "{busy_timeout: 10000}"
+        value = yaml.safe_load(value) if isinstance(value, str) else value
+        if not isinstance(value, dict):
+            raise ValueError(f"Setting {name} must be a mapping")
+        return dict(value)
+    try:
+        return kind(value)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid value for setting {name}: {value!r}") from e
+
+
+class Settings:
+    """Typed, read-only view of the user configuration"""
+
+    def __init__(self, values=None):
+        values = values or {}
+        for name in SETTINGS:
+            object.__setattr__(self, name, parse_value(name, values.get(name)))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Settings are read-only")
+
+    def __repr__(self):
+        # Never print credentials
+        shown = {
+            name: getattr(self, name)
+            for name in SETTINGS
+            if name not in ("api_key", "admin_password")
+        }
+        return f"Settings({shown})"
+
+
+def load_settings(path=DEFAULT_CONFIG_PATH, environ=None):
+    """
+    Read the config file and apply environment overrides.
+
+    Args:
+        path (str): Path to the YAML config; a missing file leaves the defaults.
+        environ (dict): Environment to read overrides from; defaults to os.environ.
+
+    Returns:
+        Settings: The typed settings.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            values = yaml.safe_load(f) or {}
+    except FileNotFoundError:
+        values = {}
+
+    environ = os.environ if environ is None else environ
+    for name in SETTINGS:
+        override = environ.get(ENV_PREFIX + name.upper())
+        if override is not None:
+            values[name] = override
+    return Settings(values)
+
+
+class ConfigStore:
+    """Caches the settings and reloads them when the config file changes"""
+
+    def __init__(self, path=None, reload_interval=RELOAD_INTERVAL):
+        self.path = path or os.environ.get("FINANCE_CONFIG_PATH", DEFAULT_CONFIG_PATH)
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._settings = None
+        self._mtime = None
+        self._checked_at = 0.0
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def get(self):
+        """Return the current settings, reloading them if the file changed"""
+        now = time.monotonic()
+        if self._settings is not None and now - self._checked_at < self.reload_interval:
+            return self._settings
+        with self._lock:
+            self._checked_at = now
+            mtime = self._file_mtime()
+            if self._settings is None or mtime != self._mtime:
+                self._settings = load_settings(self.path)
+                self._mtime = mtime
+            return self._settings
+
+
+config_store = ConfigStore()
+
+
+def get_settings():
+    """Return the process-wide settings shared by every module"""
+    return config_store.get()
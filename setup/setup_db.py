@@ -1,15 +1,20 @@
 """Module used to create a SQLite database for the expenses and salary data"""
 
+import functools
+import glob
+import os
+import queue
+import re
 import sqlite3
+import threading
 
+from flask import g, has_app_context
 
-def get_db(year):
-    """Function to get SQL database and create table if no exists"""
-    db_name = f"expenses_{year}.db"
-    conn = sqlite3.connect(db_name)
-    cursor = conn.cursor()
-    cursor.execute(
-        """CREATE TABLE IF NOT EXISTS expenses (
+from setup import setup_metrics
+from setup.setup_config import get_settings
+
+SCHEMA_STATEMENTS = [
+    """CREATE TABLE IF NOT EXISTS expenses (
                         id INTEGER PRIMARY KEY AUTOINCREMENT,
                         date TEXT,
                         category TEXT,
@@ -17,10 +22,8 @@ def get_db(year):
                         location TEXT,
                         price REAL,
                         currency TEXT,
-                        price_sgd REAL)"""
-    )
-    cursor.execute(
-        """CREATE TABLE IF NOT EXISTS recurring_expenses (
+                        price_sgd REAL)""",
+    """CREATE TABLE IF NOT EXISTS recurring_expenses (
                         id INTEGER PRIMARY KEY AUTOINCREMENT,
                         start_date TEXT,
                         end_date TEXT,
@@ -29,14 +32,503 @@ def get_db(year):
                         location TEXT,
                         ori_price REAL,
                         currency TEXT,
-                        price_sgd REAL)"""
-    )
-    cursor.execute(
-        """CREATE TABLE IF NOT EXISTS salary (
+                        price_sgd REAL)""",
+    """CREATE TABLE IF NOT EXISTS salary (
                         id INTEGER PRIMARY KEY AUTOINCREMENT,
                         start_date TEXT,
                         end_date TEXT,
-                        amount REAL)"""
+                        amount REAL)""",
+]
+
+# Daily and monthly spend rollups, kept current by triggers on expenses
+ROLLUP_TABLES = {"daily_totals": ("day", 10), "monthly_totals": ("month", 7)}
+
+
+def _rollup_add_sql(table, key, length, row):
+    return f"""INSERT INTO {table} ({key}, total, count)
+                SELECT substr({row}.date, 1, {length}), COALESCE({row}.price_sgd, 0), 1
+                WHERE {row}.date IS NOT NULL
+                ON CONFLICT ({key}) DO UPDATE
+                SET total = total + excluded.total, count = count + 1;"""
+
+
+def _rollup_remove_sql(table, key, length, row):
+    return f"""UPDATE {table}
+                SET total = total - COALESCE({row}.price_sgd, 0), count = count - 1
+                WHERE {key} = substr({row}.date, 1, {length});
+            DELETE FROM {table} WHERE {key} = substr({row}.date, 1, {length})
+                AND count <= 0;"""
+
+
+def _rollup_statements():
+    statements = []
+    for table, (key, _) in ROLLUP_TABLES.items():
+        statements.append(
+            f"""CREATE TABLE IF NOT EXISTS {table} (
+                    {key} TEXT PRIMARY KEY,
+                    total REAL NOT NULL DEFAULT 0,
+                    count INTEGER NOT NULL DEFAULT 0) WITHOUT ROWID"""
+        )
+    add_new = "".join(
+        _rollup_add_sql(table, key, length, "NEW")
+        for table, (key, length) in ROLLUP_TABLES.items()
+    )
+    remove_old = "".join(
+        _rollup_remove_sql(table, key, length, "OLD")
+        for table, (key, length) in ROLLUP_TABLES.items()
+    )
+    statements += [
+        f"""CREATE TRIGGER IF NOT EXISTS expenses_rollup_insert
+                AFTER INSERT ON expenses BEGIN {add_new} END""",
+        f"""CREATE TRIGGER IF NOT EXISTS expenses_rollup_delete
+                AFTER DELETE ON expenses BEGIN {remove_old} END""",
+        f"""CREATE TRIGGER IF NOT EXISTS expenses_rollup_update
+                AFTER UPDATE OF date, price_sgd ON expenses
+                BEGIN {remove_old} {add_new} END""",
+    ]
+    return statements
+
+
+def rebuild_rollups(db):
+    """Recompute the rollup tables from the expenses table
+
+    Accepts a connection or cursor; the caller is responsible for committing.
+    """
+    for table, (key, length) in ROLLUP_TABLES.items():
+        db.execute(f"DELETE FROM {table}")
+        db.execute(
+            f"""INSERT INTO {table} ({key}, total, count)
+                SELECT substr(date, 1, {length}) AS period,
+                    SUM(COALESCE(price_sgd, 0)), COUNT(*)
+                FROM expenses WHERE date IS NOT NULL GROUP BY period"""
+        )
+
+
+ROLLUP_STATEMENTS = _rollup_statements()
+
+
+def _version_bump_sql(row):
+    return f"""INSERT INTO data_versions (month, version, updated_at)
+                SELECT substr({row}.date, 1, 7), 1, strftime('%Y-%m-%dT%H:%M:%SZ', 'now')
+                WHERE {row}.date IS NOT NULL
+                ON CONFLICT (month) DO UPDATE
+                SET version = version + 1, updated_at = excluded.updated_at;"""
+
+
+# Per-month data version counters, bumped whenever expenses in that month change
+DATA_VERSION_STATEMENTS = [
+    """CREATE TABLE IF NOT EXISTS data_versions (
+            month TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0,
+            updated_at TEXT) WITHOUT ROWID""",
+    f"""CREATE TRIGGER IF NOT EXISTS expenses_version_insert
+            AFTER INSERT ON expenses BEGIN {_version_bump_sql("NEW")} END""",
+    f"""CREATE TRIGGER IF NOT EXISTS expenses_version_delete
+            AFTER DELETE ON expenses BEGIN {_version_bump_sql("OLD")} END""",
+    f"""CREATE TRIGGER IF NOT EXISTS expenses_version_update
+            AFTER UPDATE ON expenses
+            BEGIN {_version_bump_sql("OLD")} {_version_bump_sql("NEW")} END""",
+]
+
+# Per-sheet content hashes and per-row fingerprints of imported workbooks, used to
+# skip unchanged sheets and insert only new rows when a workbook is re-imported
+IMPORT_MANIFEST_STATEMENTS = [
+    """CREATE TABLE IF NOT EXISTS import_manifest (
+            year INTEGER NOT NULL,
+            sheet_name TEXT NOT NULL,
+            content_hash TEXT NOT NULL,
+            row_count INTEGER NOT NULL,
+            imported_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (year, sheet_name)) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS import_row_fingerprints (
+            year INTEGER NOT NULL,
+            sheet_name TEXT NOT NULL,
+            fingerprint TEXT NOT NULL,
+            PRIMARY KEY (year, sheet_name, fingerprint)) WITHOUT ROWID""",
+]
+
+# Months covered by the recurring schedule; open-ended items run to the last one
+SCHEDULE_FIRST_MONTH = "1970-01"
+SCHEDULE_LAST_MONTH = "2099-12"
+
+
+def _schedule_months_sql(row):
+    """Return a SELECT of the months a recurring expense row is charged in"""
+    return f"""SELECT month FROM schedule_months
+                WHERE {row}.start_date IS NOT NULL
+                AND month >= substr({row}.start_date, 1, 7)
+                AND month <= COALESCE(substr(NULLIF({row}.end_date, ''), 1, 7),
+                    '{SCHEDULE_LAST_MONTH}')"""
+
+
+def _schedule_add_sql(row):
+    return f"""INSERT INTO recurring_schedule (month, total, count)
+                SELECT month, COALESCE({row}.price_sgd, 0), 1
+                FROM ({_schedule_months_sql(row)}) WHERE true
+                ON CONFLICT (month) DO UPDATE
+                SET total = total + excluded.total, count = count + 1;"""
+
+
+def _schedule_remove_sql(row):
+    return f"""UPDATE recurring_schedule
+                SET total = total - COALESCE({row}.price_sgd, 0), count = count - 1
+                WHERE month IN ({_schedule_months_sql(row)});
+            DELETE FROM recurring_schedule
+                WHERE month IN ({_schedule_months_sql(row)}) AND count <= 0;"""
+
+
+def _schedule_version_bump_sql(row):
+    return f"""INSERT INTO data_versions (month, version, updated_at)
+                SELECT month, 1, strftime('%Y-%m-%dT%H:%M:%SZ', 'now')
+                FROM ({_schedule_months_sql(row)}) WHERE true
+                ON CONFLICT (month) DO UPDATE
+                SET version = version + 1, updated_at = excluded.updated_at;"""
+
+
+def populate_schedule_months(db):
+    """Fill the schedule_months calendar table"""
+    first_year, first_month = map(int, SCHEDULE_FIRST_MONTH.split("-"))
+    last_year, last_month = map(int, SCHEDULE_LAST_MONTH.split("-"))
+    db.executemany(
+        "INSERT OR IGNORE INTO schedule_months (month) VALUES (?)",
+        (
+            (f"{index // 12:04d}-{index % 12 + 1:02d}",)
+            for index in range(
+                first_year * 12 + first_month - 1, last_year * 12 + last_month
+            )
+        ),
+    )
+
+
+def rebuild_recurring_schedule(db):
+    """Recompute the recurring schedule from the recurring_expenses table
+
+    Accepts a connection or cursor; the caller is responsible for committing.
+    """
+    db.execute("DELETE FROM recurring_schedule")
+    db.execute(
+        f"""INSERT INTO recurring_schedule (month, total, count)
+            SELECT m.month, SUM(COALESCE(r.price_sgd, 0)), COUNT(*)
+            FROM recurring_expenses r
+            JOIN schedule_months m
+                ON m.month >= substr(r.start_date, 1, 7)
+                AND m.month <= COALESCE(substr(NULLIF(r.end_date, ''), 1, 7),
+                    '{SCHEDULE_LAST_MONTH}')
+            WHERE r.start_date IS NOT NULL
+            GROUP BY m.month"""
     )
-    conn.commit()
+
+
+# Recurring expenses expanded into a per-month schedule, kept current by triggers
+# on recurring_expenses so a month's recurring total is a single lookup. Changes
+# also bump the data version of every month they touch.
+RECURRING_SCHEDULE_STATEMENTS = [
+    "CREATE TABLE IF NOT EXISTS schedule_months (month TEXT PRIMARY KEY) WITHOUT ROWID",
+    """CREATE TABLE IF NOT EXISTS recurring_schedule (
+            month TEXT PRIMARY KEY,
+            total REAL NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 0) WITHOUT ROWID""",
+    f"""CREATE TRIGGER IF NOT EXISTS recurring_schedule_insert
+            AFTER INSERT ON recurring_expenses
+            BEGIN {_schedule_add_sql("NEW")} {_schedule_version_bump_sql("NEW")} END""",
+    f"""CREATE TRIGGER IF NOT EXISTS recurring_schedule_delete
+            AFTER DELETE ON recurring_expenses
+            BEGIN {_schedule_remove_sql("OLD")} {_schedule_version_bump_sql("OLD")} END""",
+    f"""CREATE TRIGGER IF NOT EXISTS recurring_schedule_update
+            AFTER UPDATE OF start_date, end_date, price_sgd ON recurring_expenses
+            BEGIN {_schedule_remove_sql("OLD")} {_schedule_add_sql("NEW")}
+                {_schedule_version_bump_sql("OLD")} {_schedule_version_bump_sql("NEW")}
+            END""",
+    populate_schedule_months,
+    rebuild_recurring_schedule,
+]
+
+# Versioned schema migrations, applied in order and tracked with PRAGMA user_version.
+# Each step is either an SQL statement or a callable taking the cursor.
+SCHEMA_MIGRATIONS = [
+    (
+        1,
+        [
+            "CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses (date)",
+            """CREATE INDEX IF NOT EXISTS idx_expenses_key
+                ON expenses (category, item, location)""",
+            """CREATE INDEX IF NOT EXISTS idx_recurring_dates
+                ON recurring_expenses (start_date, end_date)""",
+            """CREATE INDEX IF NOT EXISTS idx_recurring_key
+                ON recurring_expenses (category, item, location)""",
+            """CREATE INDEX IF NOT EXISTS idx_salary_dates
+                ON salary (start_date, end_date)""",
+        ],
+    ),
+    (2, ROLLUP_STATEMENTS + [rebuild_rollups]),
+    (3, DATA_VERSION_STATEMENTS),
+    (4, IMPORT_MANIFEST_STATEMENTS),
+    (5, RECURRING_SCHEDULE_STATEMENTS),
+]
+
+_schema_lock = threading.Lock()
+_schema_ready = set()
+
+
+# Storage modes: one expenses_<year>.db file per year, or a single database
+PER_YEAR_STORAGE = "per_year"
+CONSOLIDATED_STORAGE = "consolidated"
+
+
+# Connection PRAGMAs; WAL lets dashboard reads proceed while an import writes
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,  # Milliseconds to wait on a locked database
+    "cache_size": -16000,  # Negative values are KiB, so 16 MB per connection
+    "mmap_size": 0,
+}
+
+
+def storage_config():
+    """Return the configured (storage_mode, consolidated_db_path)"""
+    settings = get_settings()
+    return (
+        settings.storage_mode,
+        os.path.join(settings.db_dir, settings.consolidated_db_path),
+    )
+
+
+def pragma_config():
+    """Return the validated connection PRAGMAs, defaults overridden by the config"""
+    return validate_pragmas(tuple(get_settings().sqlite_pragmas.items()))
+
+
+@functools.lru_cache(maxsize=None)
+def validate_pragmas(overrides):
+    """Merge (name, value) PRAGMA overrides into the defaults and validate them"""
+    pragmas = dict(DEFAULT_PRAGMAS)
+    pragmas.update(overrides)
+    for name, value in pragmas.items():
+        if name not in DEFAULT_PRAGMAS:
+            raise ValueError(f"Unsupported SQLite PRAGMA in user_config.yaml: {name}")
+        if isinstance(value, bool) or not re.fullmatch(r"-?\w+", str(value)):
+            raise ValueError(f"Invalid value for SQLite PRAGMA {name}: {value!r}")
+    return pragmas
+
+
+def db_path(year):
+    """Return the database file name used for the given year"""
+    storage_mode, consolidated_db_path = storage_config()
+    if storage_mode == CONSOLIDATED_STORAGE:
+        return consolidated_db_path
+    return os.path.join(get_settings().db_dir, f"expenses_{year}.db")
+
+
+def find_year_databases(directory="."):
+    """Return the per-year database files in a directory, oldest year first"""
+    return sorted(
+        glob.glob(os.path.join(directory, "expenses_[0-9][0-9][0-9][0-9].db"))
+    )
+
+
+def existing_years():
+    """Return the years that have a database under the current storage settings"""
+    if storage_config()[0] == CONSOLIDATED_STORAGE:
+        return [0]  # Any year maps to the consolidated database
+    return [
+        int(re.search(r"(\d{4})\.db$", path).group(1))
+        for path in find_year_databases(get_settings().db_dir or os.getcwd())
+    ]
+
+
+def schedule_years(last_year):
+    """Return one year per database whose recurring items can reach last_year
+
+    A recurring expense is stored in its start year's database, so months of
+    last_year can be charged by items in any earlier year file. Each database
+    appears once, last_year's own first.
+    """
+    years = {}
+    for year in [last_year] + existing_years():
+        if year <= last_year:
+            years.setdefault(db_path(year), year)
+    return list(years.values())
+
+
+def split_range_by_db(start_date, end_date):
+    """Split a half-open date range into (year, start, end) per database
+
+    In consolidated mode the whole range is served by a single database.
+    """
+    start_year, end_year = int(start_date[:4]), int(end_date[:4])
+    if storage_config()[0] == CONSOLIDATED_STORAGE:
+        return [(start_year, start_date, end_date)]
+
+    ranges = []
+    for year in range(start_year, end_year + 1):
+        year_start, next_year_start = year_range(year)
+        range_start = max(start_date, year_start)
+        range_end = min(end_date, next_year_start)
+        if range_start < range_end:
+            ranges.append((year, range_start, range_end))
+    return ranges
+
+
+def month_range(year, month):
+    """Return the half-open ISO date range [start, end) covering a month"""
+    year, month = int(year), int(month)
+    next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return f"{year}-{month:02d}-01", f"{next_year}-{next_month:02d}-01"
+
+
+def year_range(year):
+    """Return the half-open ISO date range [start, end) covering a year"""
+    year = int(year)
+    return f"{year}-01-01", f"{year + 1}-01-01"
+
+
+def migrate_schema(conn):
+    """Apply any schema migrations newer than the database's user_version"""
+    cursor = conn.cursor()
+    current_version = cursor.execute("PRAGMA user_version").fetchone()[0]
+    for version, statements in SCHEMA_MIGRATIONS:
+        if version <= current_version:
+            continue
+        for statement in statements:
+            if callable(statement):
+                statement(cursor)
+            else:
+                cursor.execute(statement)
+        # PRAGMA does not accept bound parameters
+        cursor.execute(f"PRAGMA user_version = {int(version)}")
+        conn.commit()
+
+
+def ensure_schema(conn, db_name):
+    """Create the tables and run migrations once per database file per process"""
+    schema_key = os.path.abspath(db_name)
+    with _schema_lock:
+        if schema_key in _schema_ready:
+            return
+        cursor = conn.cursor()
+        for statement in SCHEMA_STATEMENTS:
+            cursor.execute(statement)
+        conn.commit()
+        migrate_schema(conn)
+        _schema_ready.add(schema_key)
+
+
+def apply_pragmas(conn):
+    """Apply the configured connection PRAGMAs to a connection"""
+    for name, value in pragma_config().items():
+        # PRAGMA does not accept bound parameters; names and values are validated
+        conn.execute(f"PRAGMA {name} = {value}")
+
+
+def connect_db(year):
+    """Open a new caller-owned connection with the schema in place"""
+    return connect_file(db_path(year))
+
+
+def connect_file(db_name):
+    """Open a new caller-owned connection to a database file with the schema"""
+    conn = sqlite3.connect(
+        db_name, check_same_thread=False, factory=setup_metrics.connection_factory()
+    )
+    apply_pragmas(conn)
+    ensure_schema(conn, db_name)
     return conn
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of connections per database file"""
+
+    def __init__(self, size=None, timeout=None):
+        settings = get_settings()
+        # Maximum open connections per database file, and seconds to wait for one
+        self.size = size or settings.pool_size
+        self.timeout = timeout or settings.pool_timeout
+        self._lock = threading.Lock()
+        self._idle = {}
+        self._slots = {}
+
+    def _get_slots(self, db_name):
+        with self._lock:
+            if db_name not in self._slots:
+                self._slots[db_name] = threading.BoundedSemaphore(self.size)
+                self._idle[db_name] = queue.LifoQueue()
+            return self._slots[db_name], self._idle[db_name]
+
+    def acquire(self, db_name):
+        """Borrow a connection to a database file, opening one if needed"""
+        slots, idle = self._get_slots(db_name)
+        if not slots.acquire(timeout=self.timeout):
+            raise sqlite3.OperationalError(
+                f"Timed out waiting for a connection to {db_name}"
+            )
+        try:
+            return idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            return connect_file(db_name)
+        except Exception:
+            slots.release()
+            raise
+
+    def release(self, db_name, conn):
+        """Return a connection borrowed from a database file to the pool
+
+        db_name must be the name it was acquired with, not one recomputed
+        from the settings, which may have been reloaded in the meantime.
+        """
+        slots, idle = self._get_slots(db_name)
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            idle.put_nowait(conn)
+        except sqlite3.Error:
+            conn.close()
+        finally:
+            slots.release()
+
+    def close_all(self):
+        """Close every idle connection held by the pool"""
+        with self._lock:
+            idle_queues = list(self._idle.values())
+        for idle in idle_queues:
+            while True:
+                try:
+                    idle.get_nowait().close()
+                except queue.Empty:
+                    break
+
+
+pool = ConnectionPool()
+
+
+def get_db(year):
+    """Function to get SQL database and create table if no exists
+
+    Inside a Flask app context the connection is borrowed from the pool and
+    returned on app context teardown, so callers must not close it. Outside
+    an app context a new caller-owned connection is returned.
+    """
+    if not has_app_context():
+        return connect_db(year)
+
+    if "db_conns" not in g:
+        g.db_conns = {}
+    db_name = db_path(year)
+    if db_name not in g.db_conns:
+        g.db_conns[db_name] = pool.acquire(db_name)
+    return g.db_conns[db_name]
+
+
+def release_db(exception=None):  # pylint: disable=unused-argument
+    """Return all connections borrowed during the app context to the pool"""
+    db_conns = g.pop("db_conns", {})
+    # Release under the names they were acquired with
+    for db_name, conn in db_conns.items():
+        pool.release(db_name, conn)
+
+
+def init_app(app):
+    """Register the connection pool teardown with the Flask app"""
+    app.teardown_appcontext(release_db)
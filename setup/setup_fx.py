@@ -0,0 +1,137 @@
+"""Module to store historical exchange rates keyed by date"""
+
+import bisect
+import csv
+import sqlite3
+import threading
+from datetime import date as dt_date, timedelta
+
+
+def is_stale(rate_date, on_date, newest_date, max_age_days):
+    """Return True if a rate is too old to stand in for on_date
+
+    Dates inside the recorded history always take the nearest previous rate,
+    which covers weekends and holidays. Only dates after the newest recorded
+    rate are limited to max_age_days, so a rate fetched long ago is not used
+    as today's rate forever.
+    """
+    if max_age_days is None or on_date <= newest_date:
+        return False
+    oldest = dt_date.fromisoformat(on_date) - timedelta(days=max_age_days)
+    return rate_date < oldest.isoformat()
+
+
+class FxRateStore:
+    """Local SQLite store of exchange rates in the fx_rates table.
+
+    Rates are looked up for a transaction's own date by taking the nearest
+    rate recorded on or before that date. Past the newest recorded rate, the
+    rate may optionally be no more than max_age_days older than the date.
+    """
+
+    def __init__(self, path="fx_rates.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS fx_rates (
+                    date TEXT NOT NULL,
+                    base TEXT NOT NULL,
+                    quote TEXT NOT NULL,
+                    rate REAL NOT NULL,
+                    PRIMARY KEY (base, quote, date)) WITHOUT ROWID"""
+        )
+        self._conn.commit()
+
+    def record_rates(self, date, base, rates):
+        """Store a conversion_rates table for one base currency on one date"""
+        self.record_many(
+            (date, base, quote, rate)
+            for quote, rate in rates.items()
+            if isinstance(rate, (int, float))
+        )
+
+    def record_many(self, rows):
+        """Store (date, base, quote, rate) rows in bulk"""
+        with self._lock:
+            self._conn.executemany(
+                """INSERT OR REPLACE INTO fx_rates (date, base, quote, rate)
+                    VALUES (?, ?, ?, ?)""",
+                rows,
+            )
+            self._conn.commit()
+
+    def load_rate_file(self, file_path):
+        """Load a CSV file with date, base, quote and rate columns"""
+        with open(file_path, "r", encoding="utf-8", newline="") as f:
+            rows = [
+                (row["date"], row["base"], row["quote"], float(row["rate"]))
+                for row in csv.DictReader(f)
+            ]
+        self.record_many(rows)
+        return len(rows)
+
+    def _pair_history(self, base, quote):
+        """Return (dates, rates) for a currency pair, oldest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                """SELECT date, rate FROM fx_rates
+                    WHERE base = ? AND quote = ?
+                    ORDER BY date""",
+                (base, quote),
+            ).fetchall()
+        return [row[0] for row in rows], [row[1] for row in rows]
+
+    def _nearest_rate(self, base, quote, on_date, max_age_days):
+        """Return the stored base->quote rate for on_date in one direction"""
+        row = self._conn.execute(
+            """SELECT date, rate,
+                    (SELECT MAX(date) FROM fx_rates WHERE base = ? AND quote = ?)
+                FROM fx_rates
+                WHERE base = ? AND quote = ? AND date <= ?
+                ORDER BY date DESC LIMIT 1""",
+            (base, quote, base, quote, on_date),
+        ).fetchone()
+        if row is None or is_stale(row[0], on_date, row[2], max_age_days):
+            return None
+        return row[1]
+
+    def lookup_rate(self, base, quote, on_date, max_age_days=None):
+        """Return the base->quote rate on or before on_date, or None"""
+        if base == quote:
+            return 1.0
+        with self._lock:
+            rate = self._nearest_rate(base, quote, on_date, max_age_days)
+            if rate is None:
+                # A table fetched for the quote currency also answers the inverse
+                inverse = self._nearest_rate(quote, base, on_date, max_age_days)
+                if inverse:
+                    rate = 1.0 / inverse
+        return rate
+
+    def lookup_rates(self, base, quote, dates, max_age_days=None):
+        """Return the base->quote rate for each date using a single query"""
+        if base == quote:
+            return [1.0 for _ in dates]
+        if not dates:
+            return []
+        history_dates, history_rates = self._pair_history(base, quote)
+        if not history_dates:
+            return [self.lookup_rate(base, quote, date, max_age_days) for date in dates]
+
+        newest_date = history_dates[-1]
+        rates = []
+        for date in dates:
+            idx = bisect.bisect_right(history_dates, date) - 1
+            if idx >= 0 and not is_stale(
+                history_dates[idx], date, newest_date, max_age_days
+            ):
+                rates.append(history_rates[idx])
+            else:
+                rates.append(None)
+        return rates
+
+    def close(self):
+        """Close the underlying connection"""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,189 @@
+"""Module to convert pending expense prices to SGD in the background"""
+
+import functools
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from setup import setup_stg
+from setup.setup_db import connect_db, existing_years
+
+# Maximum number of pending conversions settled together
+BATCH_SIZE = 100
+# Seconds to wait for more conversions before settling a batch
+BATCH_WAIT = 0.5
+# Attempts per batch when the rate API cannot be reached, and the base delay
+# in seconds between them (doubled after each failure)
+MAX_ATTEMPTS = 3
+RETRY_DELAY = 5.0
+
+
+class FxConversionQueue:
+    """Background worker that fills in price_sgd for pending expenses.
+
+    Expenses are inserted with price_sgd NULL and submitted here. Pending
+    conversions are settled in batches grouped by currency, so one rate
+    lookup covers every expense in that currency.
+    """
+
+    def __init__(
+        self,
+        api_url,
+        batch_size=BATCH_SIZE,
+        batch_wait=BATCH_WAIT,
+        retry_delay=RETRY_DELAY,
+    ):
+        self.api_url = api_url
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.retry_delay = retry_delay
+        self._queue = queue.Queue()
+        self._executor = ThreadPoolExecutor(
+            max_workers=4, thread_name_prefix="fx-convert"
+        )
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def submit(self, year, expense_id, price, currency, on_date):
+        """Queue an expense whose price_sgd is still pending"""
+        self._ensure_worker()
+        self._queue.put((year, expense_id, price, currency, on_date))
+
+    def enqueue_pending(self, year):
+        """Queue every expense in a year's database still missing price_sgd"""
+        conn = connect_db(year)
+        try:
+            rows = conn.execute(
+                """SELECT id, price, currency, date FROM expenses
+                    WHERE price_sgd IS NULL AND currency != 'SGD'"""
+            ).fetchall()
+        finally:
+            conn.close()
+        for expense_id, price, currency, on_date in rows:
+            self.submit(year, expense_id, price, currency, on_date)
+        return len(rows)
+
+    def enqueue_all_pending(self):
+        """Queue the pending expenses of every existing database"""
+        return sum(self.enqueue_pending(year) for year in existing_years())
+
+    def join(self):
+        """Block until all queued conversions have been settled"""
+        self._queue.join()
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run, name="fx-queue", daemon=True
+                )
+                self._worker.start()
+
+    def _next_batch(self):
+        """Wait for one item, then gather more for up to batch_wait seconds"""
+        batch = [self._queue.get()]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get(timeout=self.batch_wait))
+            except queue.Empty:
+                break
+        return batch
+
+    def _settle(self, batch):
+        """Process a batch, retrying with backoff while the rate API is down
+
+        Rows still unconverted after the last attempt stay pending and are
+        queued again by enqueue_pending, e.g. on the next start.
+        """
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            try:
+                self.process_batch(batch)
+                return
+            except requests.RequestException:
+                logging.warning(
+                    "FX rate lookup failed (attempt %d of %d)",
+                    attempt,
+                    MAX_ATTEMPTS,
+                    exc_info=True,
+                )
+                if attempt < MAX_ATTEMPTS:
+                    time.sleep(self.retry_delay * 2 ** (attempt - 1))
+        logging.error("Giving up on %d FX conversions for now", len(batch))
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                self._settle(batch)
+            except (sqlite3.Error, ValueError, TypeError):
+                logging.error("FX conversion batch failed", exc_info=True)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _convert_currency(self, currency, items):
+        """Convert all items of one currency, returning (price_sgd, year, id) rows"""
+        prices_sgd = setup_stg.convert_many_to_sgd(
+            self.api_url,
+            currency,
+            [price for _, _, price, _, _ in items],
+            [on_date for _, _, _, _, on_date in items],
+        )
+
+        updates = []
+        for (year, expense_id, _, _, _), price_sgd in zip(items, prices_sgd):
+            if price_sgd is not None:
+                updates.append((year, price_sgd, expense_id))
+        return updates
+
+    def process_batch(self, batch):
+        """Settle a batch of pending conversions, one rate lookup per currency"""
+        by_currency = defaultdict(list)
+        for item in batch:
+            by_currency[item[3]].append(item)
+
+        results = self._executor.map(
+            lambda group: self._convert_currency(*group), by_currency.items()
+        )
+
+        by_year = defaultdict(list)
+        for updates in results:
+            for year, price_sgd, expense_id in updates:
+                by_year[year].append((price_sgd, expense_id))
+
+        for year, rows in by_year.items():
+            conn = connect_db(year)
+            try:
+                conn.executemany(
+                    "UPDATE expenses SET price_sgd = ? WHERE id = ? AND price_sgd IS NULL",
+                    rows,
+                )
+                conn.commit()
+            finally:
+                conn.close()
+
+        unresolved = len(batch) - sum(len(rows) for rows in by_year.values())
+        if unresolved:
+            logging.warning("%d FX conversions are still pending", unresolved)
+        return sum(len(rows) for rows in by_year.values())
+
+
+@functools.lru_cache(maxsize=None)
+def get_fx_queue(api_url):
+    """Return the process-wide FX conversion queue for an API URL"""
+    return FxConversionQueue(api_url)
+
+
+def recover_pending(api_url):
+    """Re-queue conversions left pending by a previous run, in the background"""
+    fx_queue = get_fx_queue(api_url)
+    threading.Thread(
+        target=fx_queue.enqueue_all_pending, name="fx-recover", daemon=True
+    ).start()
+    return fx_queue
@@ -0,0 +1,274 @@
+"""Module to record request, SQL, FX and template timings for profiling
+
+Instrumentation is opt-in (instrumentation: True in user_config.yaml). When
+enabled, every response carries a Server-Timing header breaking down where
+the request spent its time, and cumulative totals are served at /metrics in
+the Prometheus text format.
+"""
+
+import contextlib
+import sqlite3
+import threading
+import time
+
+import jinja2
+from flask import Response, g, has_app_context, has_request_context, request
+
+METRIC_PREFIX = "finance"
+
+METRIC_HELP = {
+    "request": "Time spent handling requests",
+    "sql": "Time spent executing SQL statements and fetching their rows",
+    "fx": "Time spent calling the exchange-rate API",
+    "render": "Time spent rendering templates",
+    "serialize": "Time spent serializing chart series to JSON",
+}
+
+
+class Metrics:
+    """Thread-safe running totals of durations and row counts per label set"""
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, kind, seconds, rows=None, count=1, **labels):
+        """Add an observation of kind, e.g. one SQL statement, to its totals"""
+        key = (kind, tuple(sorted(labels.items())))
+        with self._lock:
+            totals = self._series.setdefault(key, [0, 0.0, 0])
+            totals[0] += count
+            totals[1] += seconds
+            totals[2] += rows or 0
+
+    def snapshot(self):
+        """Return {(kind, labels): (count, seconds, rows)} for every series"""
+        with self._lock:
+            return {key: tuple(totals) for key, totals in self._series.items()}
+
+    def render_prometheus(self):
+        """Return the totals in the Prometheus text exposition format"""
+        by_kind = {}
+        for (kind, labels), totals in sorted(self.snapshot().items()):
+            by_kind.setdefault(kind, []).append((format_labels(labels), totals))
+
+        lines = []
+        for kind, series in by_kind.items():
+            name = f"{METRIC_PREFIX}_{kind}_duration_seconds"
+            lines.append(f"# HELP {name} {METRIC_HELP.get(kind, kind)}")
+            lines.append(f"# TYPE {name} summary")
+            for labels, (count, seconds, _) in series:
+                lines.append(f"{name}_count{labels} {count}")
+                lines.append(f"{name}_sum{labels} {seconds:.6f}")
+            if kind == "sql":
+                rows_name = f"{METRIC_PREFIX}_sql_rows_total"
+                lines.append(f"# HELP {rows_name} Rows fetched or modified by SQL")
+                lines.append(f"# TYPE {rows_name} counter")
+                for labels, (_, _, rows) in series:
+                    lines.append(f"{rows_name}{labels} {rows}")
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels):
+    """Format (name, value) pairs as a Prometheus label set"""
+    if not labels:
+        return ""
+    escaped = (
+        (
+            name,
+            str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+metrics = Metrics()
+
+
+def current_endpoint():
+    """Return the endpoint handling the current request, if any"""
+    if not has_request_context():
+        return "background"
+    return request.endpoint or "unknown"
+
+
+def record(kind, seconds, rows=None, count=1, **labels):
+    """Record a timing in the metrics and in the current request's Server-Timing
+
+    count is 0 for time that belongs to an earlier call, such as fetching the
+    rows of a statement that was already counted.
+    """
+    if not metrics.enabled:
+        return
+    labels.setdefault("endpoint", current_endpoint())
+    metrics.observe(kind, seconds, rows, count, **labels)
+    if has_app_context() and "server_timing" in g:
+        totals = g.server_timing.setdefault(kind, [0, 0.0])
+        totals[0] += count
+        totals[1] += seconds
+
+
+@contextlib.contextmanager
+def timed(kind, **labels):
+    """Context manager recording the time spent in its block under kind"""
+    if not metrics.enabled:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(kind, time.perf_counter() - started, **labels)
+
+
+def sql_operation(sql):
+    """Return the leading keyword of a statement, e.g. SELECT or INSERT"""
+    words = sql.split(None, 1)
+    return words[0].upper() if words else "EMPTY"
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor recording the time and row count of every statement and fetch"""
+
+    _operation = "EMPTY"
+
+    def _record(self, started, rows, count=1):
+        record(
+            "sql",
+            time.perf_counter() - started,
+            rows,
+            count,
+            operation=self._operation,
+        )
+
+    def execute(self, sql, parameters=(), /):
+        """Execute a statement, recording its time and affected rows"""
+        self._operation = sql_operation(sql)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._record(started, max(self.rowcount, 0))
+
+    def executemany(self, sql, seq_of_parameters, /):
+        """Execute a statement per parameter set, recording the total"""
+        self._operation = sql_operation(sql)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._record(started, max(self.rowcount, 0))
+
+    def executescript(self, sql_script, /):
+        """Execute a script, recording its time"""
+        self._operation = "SCRIPT"
+        started = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            self._record(started, 0)
+
+    def fetchone(self):
+        """Fetch the next row, recording the time spent"""
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._record(started, 0 if row is None else 1, count=0)
+        return row
+
+    def fetchmany(self, size=None):
+        """Fetch the next rows, recording the time spent"""
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._record(started, len(rows), count=0)
+        return rows
+
+    def fetchall(self):
+        """Fetch the remaining rows, recording the time spent"""
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._record(started, len(rows), count=0)
+        return rows
+
+    def __next__(self):
+        """Fetch the next row while iterating, recording the time spent"""
+        started = time.perf_counter()
+        row = super().__next__()
+        self._record(started, 1, count=0)
+        return row
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose cursors, and so every statement, are instrumented"""
+
+    def cursor(self, factory=InstrumentedCursor):  # pylint: disable=useless-parent-delegation
+        """Return a cursor, instrumented unless another factory is given"""
+        return super().cursor(factory)
+
+    # The C shortcuts create plain cursors, so route them through cursor()
+    def execute(self, sql, parameters=(), /):
+        """Execute a statement on a new instrumented cursor"""
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters, /):
+        """Execute a statement per parameter set on a new instrumented cursor"""
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script, /):
+        """Execute a script on a new instrumented cursor"""
+        return self.cursor().executescript(sql_script)
+
+
+def connection_factory():
+    """Return the connection class to open databases with"""
+    return InstrumentedConnection if metrics.enabled else sqlite3.Connection
+
+
+class TimedTemplate(jinja2.Template):
+    """Template recording its render time"""
+
+    def render(self, *args, **kwargs):
+        with timed("render", template=self.name):
+            return super().render(*args, **kwargs)
+
+
+def start_timer():
+    """Start timing the current request"""
+    g.server_timing = {}
+    g.request_started = time.perf_counter()
+
+
+def add_server_timing(response):
+    """Record the request duration and attach the Server-Timing header"""
+    started = g.pop("request_started", None)
+    if started is None:
+        return response
+    total = time.perf_counter() - started
+    metrics.observe(
+        "request",
+        total,
+        endpoint=current_endpoint(),
+        method=request.method,
+        status=response.status_code,
+    )
+
+    entries = [f"total;dur={total * 1000:.2f}"]
+    for kind, (count, seconds) in g.pop("server_timing", {}).items():
+        entries.append(f'{kind};dur={seconds * 1000:.2f};desc="{count} calls"')
+    response.headers["Server-Timing"] = ", ".join(entries)
+    return response
+
+
+def metrics_endpoint():
+    """Serve the cumulative metrics in the Prometheus text format"""
+    return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+
+def init_app(app):
+    """Time every request of the Flask app and serve the totals at /metrics"""
+    metrics.enabled = True
+    app.jinja_env.template_class = TimedTemplate
+    app.before_request(start_timer)
+    app.after_request(add_server_timing)
+    app.add_url_rule("/metrics", "metrics", metrics_endpoint)
@@ -1,16 +1,29 @@
 """Module to setup user configuration and convert other currencies to SGD"""
 
+import functools
+import json
+import os
+import threading
+import time
+from datetime import date
+
 import requests
-import yaml
 
+from setup import setup_metrics
+from setup.setup_config import get_settings
+from setup.setup_fx import FxRateStore
+
+# Default lifetime of cached exchange rates in seconds
+DEFAULT_FX_CACHE_TTL = 12 * 60 * 60
+DEFAULT_FX_CACHE_PATH = "fx_cache.json"
 
-def cfg_setup():
-    """Function to map yaml file's user-config to parameters"""
-    # Load config file
-    config_path = "cfg/user_config.yaml"
 
-    with open(config_path, "r", encoding="utf-8") as f:
-        config = yaml.safe_load(f)
+def cfg_setup(config=None):
+    """Function to map the user settings to the API key and error bypass"""
+    # Read the shared settings, which include FINANCE_* environment overrides
+    if config is None:
+        settings = get_settings()
+        config = {"api_key": settings.api_key, "error_bypass": settings.error_bypass}
 
     # Accessing config settings
     error_bypass = config["error_bypass"]
@@ -33,17 +46,181 @@ def cfg_setup():
         return api_key, error_bypass
 
 
+def get_api_url():
+    """Return the exchange-rate API URL, or None when no API key is configured"""
+    settings = get_settings()
+    return api_url_for(settings.api_key, settings.error_bypass)
+
+
+@functools.lru_cache(maxsize=None)
+def api_url_for(api_key, error_bypass):
+    """Build the API URL for a key; the missing-key warning prints once per key"""
+    api_key, _ = cfg_setup({"api_key": api_key, "error_bypass": error_bypass})
+    if not api_key:
+        return None
+    return f"https://v6.exchangerate-api.com/v6/{api_key}/latest/"
+
+
+class RateCache:
+    """In-process exchange-rate cache keyed by base currency.
+
+    Each entry holds the full conversion_rates table returned by the API and
+    is persisted to a JSON file so restarts begin with a warm cache.
+    """
+
+    def __init__(
+        self, ttl=DEFAULT_FX_CACHE_TTL, path=DEFAULT_FX_CACHE_PATH, on_fetch=None
+    ):
+        self.ttl = ttl
+        self.path = path
+        self.on_fetch = on_fetch  # Called with (base, rates) after each API fetch
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    def _load(self):
+        """Read persisted entries, ignoring a missing or corrupt file"""
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return entries if isinstance(entries, dict) else {}
+
+    def _save(self):
+        """Atomically persist all entries to disk"""
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass  # The in-memory cache is still valid
+
+    def get(self, base, allow_stale=False):
+        """Return the cached rates for a base currency, or None if missing/expired"""
+        with self._lock:
+            entry = self._entries.get(base)
+        if not entry:
+            return None
+        if allow_stale or time.time() - entry["fetched_at"] < self.ttl:
+            return entry["rates"]
+        return None
+
+    def put(self, base, rates):
+        """Store the rates for a base currency and persist the cache"""
+        with self._lock:
+            self._entries[base] = {"fetched_at": time.time(), "rates": rates}
+            self._save()
+
+    def get_rates(self, api_url, base):
+        """Return conversion rates for base, fetching from the API when stale"""
+        rates = self.get(base)
+        if rates is not None:
+            return rates
+
+        with setup_metrics.timed("fx", base=base):
+            response = requests.get(api_url + base, timeout=100)
+        if response.status_code == 200:
+            rates = response.json().get("conversion_rates", {})
+            if rates:
+                self.put(base, rates)
+                if self.on_fetch:
+                    self.on_fetch(base, rates)
+                return rates
+
+        # Fall back to expired rates rather than failing the conversion
+        return self.get(base, allow_stale=True)
+
+
+@functools.lru_cache(maxsize=None)
+def get_fx_store():
+    """Return the process-wide historical exchange-rate store"""
+    settings = get_settings()
+    store = FxRateStore(settings.fx_store_path)
+    # Optional stand-in rate file for offline/test runs
+    if settings.fx_rate_file:
+        store.load_rate_file(settings.fx_rate_file)
+    return store
+
+
+def stored_rate_max_age():
+    """Return how many days a stored rate may be used past the newest one"""
+    return get_settings().fx_rate_max_age_days
+
+
+def record_latest_rates(base, rates):
+    """Record freshly fetched rates in the historical store under today's date"""
+    get_fx_store().record_rates(date.today().isoformat(), base, rates)
+
+
+@functools.lru_cache(maxsize=None)
+def get_rate_cache():
+    """Return the process-wide exchange-rate cache shared by all routes"""
+    settings = get_settings()
+    return RateCache(
+        ttl=settings.fx_cache_ttl,
+        path=settings.fx_cache_path,
+        on_fetch=record_latest_rates,
+    )
+
+
+def convert_many_to_sgd(api_url, currency, prices, dates):
+    """Convert many prices in one currency to SGD with a single rate lookup
+
+    Historical rates are looked up in bulk for the given dates. Dates without
+    a usable recorded rate share one fetch of the latest rate. Prices that
+    cannot be converted are returned as None.
+    """
+    if currency == "SGD":
+        return [float(price) for price in prices]
+
+    rates = get_fx_store().lookup_rates(
+        currency,
+        "SGD",
+        [str(on_date)[:10] for on_date in dates],
+        max_age_days=stored_rate_max_age(),
+    )
+
+    latest_rate = None
+    if None in rates and api_url:
+        latest_rates = get_rate_cache().get_rates(api_url, currency)
+        latest_rate = (latest_rates or {}).get("SGD")
+
+    converted = []
+    for price, rate in zip(prices, rates):
+        rate = rate or latest_rate
+        converted.append(float(price) * rate if rate else None)
+    return converted
+
+
 # Use exchangerate-api.com for exchange rate data
-def convert_to_sgd(api_url, cost, currency):  # pragma: no cover
-    """Function to convert other currencies to SGD"""
+def convert_to_sgd(api_url, cost, currency, on_date=None):  # pragma: no cover
+    """Function to convert other currencies to SGD
+
+    When on_date is given the rate recorded on or before that date is used,
+    falling back to the latest rate if the local store has no usable rate for
+    that date.
+    """
 
     if currency == "SGD":
         return cost
 
-    curr_url = api_url + currency
-    response = requests.get(curr_url, timeout=100)
-    if response.status_code == 200:
-        rates = response.json().get("conversion_rates", {})
+    if on_date:
+        rate = get_fx_store().lookup_rate(
+            currency, "SGD", str(on_date)[:10], max_age_days=stored_rate_max_age()
+        )
+        if rate:
+            return float(cost) * rate
+
+    if not api_url:
+        return None
+
+    rates = get_rate_cache().get_rates(api_url, currency)
+    if rates:
         sgd_rate = rates.get("SGD")
         if sgd_rate:
             return float(cost) * sgd_rate
@@ -0,0 +1,84 @@
+"""Smoke tests for the benchmark suite"""
+
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+from benchmarks import run_benchmarks
+from setup import setup_config
+
+
+def test_main_writes_results(tmp_path):
+    """A tiny benchmark run writes timings for every case"""
+    output = tmp_path / "results.json"
+    run_benchmarks.main(
+        [
+            "--rows",
+            "50",
+            "--years",
+            "2",
+            "--repeat",
+            "1",
+            "--import-rows",
+            "30",
+            "--modes",
+            "streaming",
+            "--output",
+            str(output),
+        ]
+    )
+
+    report = json.loads(output.read_text(encoding="utf-8"))
+    results = report["results"]
+    for name in ("index", "series_custom_cold", "edit_table", "import_streaming"):
+        if name not in results:
+            error_msg = f"Missing benchmark result: {name}"  # pragma: no cover
+            raise AssertionError(error_msg)
+    if report["meta"]["years"] != 2:
+        error_msg = "Benchmark metadata does not record the scale"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+
+def test_run_ignores_configured_db_dir(tmp_path, monkeypatch):
+    """A run never touches the databases named by the user's settings"""
+    real_dir = tmp_path / "realdata"
+    real_dir.mkdir()
+    real_db = real_dir / f"expenses_{datetime.now().year}.db"
+    conn = sqlite3.connect(real_db)
+    conn.execute("CREATE TABLE expenses (id INTEGER PRIMARY KEY, item TEXT)")
+    conn.execute("INSERT INTO expenses (item) VALUES ('real')")
+    conn.commit()
+    conn.close()
+    monkeypatch.setenv("FINANCE_DB_DIR", str(real_dir))
+    # As if the variable had been set before the settings were first read
+    monkeypatch.setattr(setup_config, "config_store", setup_config.ConfigStore())
+    work_dir = tmp_path / "work"
+    work_dir.mkdir()
+
+    run_benchmarks.run(20, 1, 1, 20, ["streaming"], str(work_dir))
+
+    if sorted(os.listdir(real_dir)) != [real_db.name]:
+        error_msg = f"Benchmark wrote to {os.listdir(real_dir)}"  # pragma: no cover
+        raise AssertionError(error_msg)
+    conn = sqlite3.connect(real_db)
+    items = conn.execute("SELECT item FROM expenses").fetchall()
+    conn.close()
+    if items != [("real",)]:
+        error_msg = f"Real database was modified: {items}"  # pragma: no cover
+        raise AssertionError(error_msg)
+    if os.environ["FINANCE_DB_DIR"] != str(real_dir):
+        error_msg = "The caller's environment should be restored"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+
+def test_compare_results_flags_regressions():
+    """Only cases slower than the threshold are reported"""
+    baseline = {"results": {"fast": {"median_ms": 10.0}, "slow": {"median_ms": 10.0}}}
+    current = {"results": {"fast": {"median_ms": 11.0}, "slow": {"median_ms": 20.0}}}
+
+    regressions = run_benchmarks.compare_results(baseline, current)
+
+    if regressions != {"slow": 2.0}:
+        error_msg = f"Unexpected regressions: {regressions}"  # pragma: no cover
+        raise AssertionError(error_msg)
@@ -0,0 +1,28 @@
+"""Shared fixtures for the test suite."""
+
+import pytest
+from setup import setup_config, setup_db
+
+
+@pytest.fixture(autouse=True)
+def isolated_databases(tmp_path, monkeypatch):
+    """Run each test in a temporary directory, away from the user's data.
+
+    The user's config file and FINANCE_* environment overrides are ignored,
+    so db_dir, storage_mode and every other file setting keep their defaults
+    and resolve inside tmp_path. Each test also starts with a clean schema
+    cache and an empty connection pool.
+    """
+    for name in setup_config.SETTINGS:
+        monkeypatch.delenv(setup_config.ENV_PREFIX + name.upper(), raising=False)
+    monkeypatch.delenv("FINANCE_CONFIG_PATH", raising=False)
+    monkeypatch.setattr(
+        setup_config,
+        "config_store",
+        setup_config.ConfigStore(str(tmp_path / "user_config.yaml")),
+    )
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(setup_db, "_schema_ready", set())
+    monkeypatch.setattr(setup_db, "pool", setup_db.ConnectionPool())
+    yield tmp_path
+    setup_db.pool.close_all()
@@ -0,0 +1,132 @@
+"""This module contains tests for the db_export module."""
+
+import sys
+
+import pytest
+from setup import setup_db
+from db_export.db_export import iter_batches, stream_csv, write_parquet, main
+
+
+@pytest.fixture
+def year_databases(tmp_path):
+    """Fixture to create two per-year databases with rows in every table."""
+    for year in (2023, 2024):
+        conn = setup_db.connect_db(year)
+        conn.executemany(
+            """INSERT INTO expenses (date, category, item, location, price, currency,
+                price_sgd) VALUES (?, 'Food', ?, 'Cafe', 10, 'SGD', 10)""",
+            [(f"{year}-03-01", "Lunch"), (f"{year}-12-31", "Dinner")],
+        )
+        conn.execute(
+            "INSERT INTO salary (start_date, end_date, amount) VALUES (?, ?, 5000)",
+            (f"{year}-01-01", f"{year}-06-30"),
+        )
+        conn.commit()
+        conn.close()
+    return tmp_path
+
+
+# pylint: disable=redefined-outer-name, unused-argument
+def test_iter_batches_spans_year_files(year_databases):
+    """Test that batches cover every year file in the range, batch by batch."""
+    batches = list(iter_batches("expenses", "2023-12-31", "2024-03-01", batch_size=1))
+
+    rows = [row for batch in batches for row in batch]
+    if [len(batch) for batch in batches] != [1, 1]:
+        error_msg = (
+            f"Expected two single-row batches, got {batches}"  # pragma: no cover
+        )
+        raise AssertionError(error_msg)
+    if [(row[0], row[1], row[3]) for row in rows] != [
+        ("expenses_2023.db", "2023-12-31", "Dinner"),
+        ("expenses_2024.db", "2024-03-01", "Lunch"),
+    ]:
+        error_msg = f"Unexpected exported rows, got {rows}"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+
+def test_iter_batches_skips_missing_years(year_databases):
+    """Test that exporting a range never creates missing year files."""
+    list(iter_batches("expenses", "2022-01-01", "2025-12-31"))
+
+    if (year_databases / "expenses_2022.db").exists():
+        error_msg = "Export should not create missing year files"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+
+def test_stream_csv_salary_overlap(year_databases):
+    """Test that salary periods overlapping the range are exported as CSV."""
+    lines = "".join(stream_csv("salary", "2024-06-01", "2024-12-31")).splitlines()
+
+    if lines != [
+        "source,start_date,end_date,amount",
+        "expenses_2024.db,2024-01-01,2024-06-30,5000.0",
+    ]:
+        error_msg = f"Unexpected salary CSV, got {lines}"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+
+def test_stream_csv_includes_items_from_earlier_years(year_databases):
+    """Test that items stored in an earlier year file are exported if they overlap."""
+    conn = setup_db.connect_db(2023)
+    conn.execute(
+        """INSERT INTO recurring_expenses (start_date, end_date, category, item,
+            location, ori_price, currency, price_sgd)
+            VALUES ('2023-06-01', NULL, 'Housing', 'Rent', 'Home', 1000, 'SGD', 1000)"""
+    )
+    conn.commit()
+    conn.close()
+
+    lines = "".join(
+        stream_csv("recurring_expenses", "2024-03-01", "2024-03-31")
+    ).splitlines()
+    salary = "".join(stream_csv("salary", "2024-03-01", "2024-03-31")).splitlines()
+
+    if len(lines) != 2 or not lines[1].startswith("expenses_2023.db,2023-06-01"):
+        error_msg = f"Expected the 2023 rent, got {lines}"  # pragma: no cover
+        raise AssertionError(error_msg)
+    if salary[1:] != ["expenses_2024.db,2024-01-01,2024-06-30,5000.0"]:
+        error_msg = f"Expected only the 2024 salary, got {salary}"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+
+def test_stream_csv_rejects_invalid_input(year_databases):
+    """Test that unknown tables and reversed ranges are rejected."""
+    with pytest.raises(ValueError):
+        list(stream_csv("sqlite_master", "2024-01-01", "2024-12-31"))
+    with pytest.raises(ValueError):
+        list(stream_csv("expenses", "2024-12-31", "2024-01-01"))
+
+
+def test_write_parquet(year_databases):
+    """Test that Parquet exports round-trip when pyarrow is installed."""
+    pq = pytest.importorskip("pyarrow.parquet")
+    output = year_databases / "expenses.parquet"
+
+    row_count = write_parquet("expenses", "2023-01-01", "2024-12-31", str(output))
+
+    if row_count != 4 or pq.read_table(str(output)).num_rows != 4:
+        error_msg = f"Expected 4 exported rows, got {row_count}"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+
+def test_write_parquet_without_pyarrow(year_databases, monkeypatch):
+    """Test that a missing pyarrow is reported only when Parquet is requested."""
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+    monkeypatch.setitem(sys.modules, "pyarrow.parquet", None)
+
+    with pytest.raises(RuntimeError):
+        write_parquet(
+            "expenses", "2023-01-01", "2024-12-31", str(year_databases / "out.parquet")
+        )
+
+
+def test_main_writes_csv_file(year_databases):
+    """Test the command line export to a CSV file."""
+    output = year_databases / "export.csv"
+
+    main(["2023-01-01", "2024-12-31", "--output", str(output)])
+
+    if len(output.read_text(encoding="utf-8").splitlines()) != 5:
+        error_msg = "Expected a header and 4 rows in the CSV"  # pragma: no cover
+        raise AssertionError(error_msg)
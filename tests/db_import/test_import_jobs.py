@@ -0,0 +1,118 @@
+"""This module contains unit tests for the import_jobs module."""
+
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+from db_import.import_jobs import INTERRUPTED_ERROR, ImportJobManager
+
+
+@pytest.fixture
+def manager(tmp_path):
+    """Fixture to create a job manager with a temporary job table."""
+    return ImportJobManager(str(tmp_path / "import_jobs.db"))
+
+
+# pylint: disable=redefined-outer-name
+def test_job_records_progress_and_result(manager):
+    """Test that a job records its progress, result and duration."""
+
+    def fake_import(file_path, year, progress):
+        progress(5, 1, 2)
+        progress(10, 2, 2)
+        return 7
+
+    job_id = manager.submit(fake_import, "workbook.xlsx", 2024)
+    job = manager.wait(job_id, timeout=5)
+
+    if job["status"] != "succeeded" or job["rows_inserted"] != 7:
+        error_msg = f"Unexpected job result, got {job}"  # pragma: no cover
+        raise AssertionError(error_msg)
+    if (job["rows_processed"], job["sheets_done"], job["sheets_total"]) != (10, 2, 2):
+        error_msg = f"Final progress should be recorded, got {job}"  # pragma: no cover
+        raise AssertionError(error_msg)
+    if job["duration"] is None or not job["started_at"] or not job["finished_at"]:
+        error_msg = f"Timing should be recorded, got {job}"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+
+def test_job_is_visible_to_another_manager(manager):
+    """Test that jobs are read from the shared table, not process memory."""
+    job_id = manager.submit(lambda file_path, year, progress: 0, "a.xlsx", 2024)
+    manager.wait(job_id, timeout=5)
+
+    other = ImportJobManager(manager.path)
+    if other.get(job_id)["status"] != "succeeded":
+        error_msg = "Job should be visible from another manager"  # pragma: no cover
+        raise AssertionError(error_msg)
+    if other.get("missing") is not None:
+        error_msg = "Unknown jobs should return None"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+
+def test_jobs_of_stopped_workers_are_marked_failed(manager):
+    """Test that a new manager fails jobs whose worker process is gone."""
+    stopped = subprocess.Popen([sys.executable, "-c", "pass"])
+    stopped.wait()
+    conn = sqlite3.connect(manager.path)
+    conn.executemany(
+        """INSERT INTO import_jobs (id, file_path, year, status, created_at,
+                worker_pid) VALUES (?, 'a.xlsx', 2024, ?, '2024-01-01T00:00:00Z', ?)""",
+        [
+            ("stopped", "running", stopped.pid),
+            ("legacy", "queued", None),
+            ("done", "succeeded", None),
+        ],
+    )
+    conn.commit()
+    conn.close()
+    live_id = manager.submit(lambda file_path, year, progress: 0, "b.xlsx", 2024)
+    manager.wait(live_id, timeout=5)
+
+    other = ImportJobManager(manager.path)
+    statuses = {
+        job_id: (other.get(job_id)["status"], other.get(job_id)["error"])
+        for job_id in ("stopped", "legacy", "done", live_id)
+    }
+    if statuses != {
+        "stopped": ("failed", INTERRUPTED_ERROR),
+        "legacy": ("failed", INTERRUPTED_ERROR),
+        "done": ("succeeded", None),
+        live_id: ("succeeded", None),
+    }:
+        error_msg = f"Unexpected job statuses, got {statuses}"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+
+def test_jobs_under_a_reused_pid_are_marked_failed(manager):
+    """Test that a job left running under this process's PID is interrupted."""
+    conn = sqlite3.connect(manager.path)
+    conn.execute(
+        """INSERT INTO import_jobs (id, file_path, year, status, created_at,
+                worker_pid) VALUES ('restarted', 'a.xlsx', 2024, 'running',
+                '2024-01-01T00:00:00Z', ?)""",
+        (os.getpid(),),
+    )
+    conn.commit()
+    conn.close()
+
+    job = ImportJobManager(manager.path).get("restarted")
+    if (job["status"], job["error"]) != ("failed", INTERRUPTED_ERROR):
+        error_msg = f"Expected an interrupted job, got {job}"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+
+def test_finished_jobs_leave_no_futures(manager):
+    """Test that jobs finishing before submit returns are not left registered."""
+    job_ids = [
+        manager.submit(lambda file_path, year, progress: 0, "a.xlsx", 2024)
+        for _ in range(50)
+    ]
+    for job_id in job_ids:
+        manager.wait(job_id, timeout=5)
+
+    if manager._futures:  # pylint: disable=protected-access
+        error_msg = f"Stale futures left: {len(manager._futures)}"  # pragma: no cover
+        raise AssertionError(error_msg)
@@ -6,6 +6,7 @@ import pytest
 from flask import Flask, session
 from routes.index_routes import index_bp
 from routes.admin_routes import admin_bp
+from setup.setup_config import Settings, load_settings
 
 
 # pylint: disable=redefined-outer-name, unused-argument, import-outside-toplevel
@@ -23,28 +24,25 @@ def client():
             yield client
 
 
-@patch("builtins.open", side_effect=FileNotFoundError)
-def test_file_not_found(mock_open):
-    """Test handling of FileNotFoundError when loading user_config.yaml."""
-    with (
-        patch("routes.admin_routes.ADMIN_USERNAME", "adm1n"),
-        patch("routes.admin_routes.ADMIN_PASSWORD", "securepassw0rd"),
-    ):
-        from routes.admin_routes import ADMIN_USERNAME, ADMIN_PASSWORD_HASH
+def test_file_not_found(tmp_path, monkeypatch):
+    """Test the default admin credentials when user_config.yaml is missing."""
+    settings = load_settings(str(tmp_path / "missing.yaml"), environ={})
+    monkeypatch.setattr("routes.admin_routes.get_settings", lambda: settings)
+    from routes.admin_routes import admin_password_hash
 
-        if ADMIN_USERNAME != "adm1n":
-            error_msg = "ADMIN_USERNAME should be 'adm1n'"  # pragma: no cover
-            raise AssertionError(error_msg)
-        if ADMIN_PASSWORD_HASH is None:
-            error_msg = "ADMIN_PASSWORD_HASH should not be None"  # pragma: no cover
-            raise AssertionError(error_msg)
+    if settings.admin_username != "adm1n":
+        error_msg = "The default admin username should be 'adm1n'"  # pragma: no cover
+        raise AssertionError(error_msg)
+    if admin_password_hash() is None:
+        error_msg = "The admin password hash should not be None"  # pragma: no cover
+        raise AssertionError(error_msg)
 
 
 def test_login_success(client, monkeypatch):
     """Test successful admin login with default ADMIN_USERNAME and ADMIN_PASSWORD."""
     # Mock the default admin credentials
-    monkeypatch.setattr("routes.admin_routes.ADMIN_USERNAME", "adm1n")
-    monkeypatch.setattr("routes.admin_routes.ADMIN_PASSWORD", "")
+    settings = Settings({"admin_username": "adm1n", "admin_password": ""})
+    monkeypatch.setattr("routes.admin_routes.get_settings", lambda: settings)
 
     # Mock the password hash check to return True
     with patch("werkzeug.security.check_password_hash", return_value=True):
@@ -73,8 +71,8 @@ def test_login_success(client, monkeypatch):
 
 def test_login_failure(client, monkeypatch):
     """Test unsuccessful admin login."""
-    monkeypatch.setattr("routes.admin_routes.ADMIN_USERNAME", "adm1n")
-    monkeypatch.setattr("routes.admin_routes.ADMIN_PASSWORD_HASH", "hashed_password")
+    settings = Settings({"admin_username": "adm1n", "admin_password": "secret"})
+    monkeypatch.setattr("routes.admin_routes.get_settings", lambda: settings)
 
     with patch("werkzeug.security.check_password_hash", return_value=False):
         response = client.post(
@@ -138,7 +136,7 @@ def test_dashboard_redirect(client):
         raise AssertionError(error_msg)
 
 
-@patch("sqlite3.connect")
+@patch("routes.admin_routes.connect_db")
 def test_edit_table_without_login(mock_connect, client):
     """Test edit_table route when admin_login is missing."""
     response = client.get("/admin/edit_table", follow_redirects=True)
@@ -156,7 +154,7 @@ def test_edit_table_without_login(mock_connect, client):
     mock_connect.assert_not_called()
 
 
-@patch("sqlite3.connect")
+@patch("routes.admin_routes.connect_db")
 def test_edit_table_missing_params(mock_connect, client):
     """Test edit_table route when query parameters are missing."""
     # Mock session.get to always return True
@@ -175,7 +173,9 @@ def test_edit_table_missing_params(mock_connect, client):
     mock_connect.assert_not_called()
 
 
-@patch("sqlite3.connect", side_effect=sqlite3.Error("Mocked database error"))
+@patch(
+    "routes.admin_routes.connect_db", side_effect=sqlite3.Error("Mocked database error")
+)
 def test_edit_table_db_error(mock_connect, client):
     """Test edit_table route when database connection fails."""
     # Mock session.get to always return True
@@ -195,7 +195,7 @@ def test_edit_table_db_error(mock_connect, client):
     # assert b"Error connecting to the database" in response.data
 
 
-@patch("sqlite3.connect")
+@patch("routes.admin_routes.connect_db")
 def test_edit_table_get_success(mock_connect, client):
     """Test edit_table route with valid query parameters."""
     # Mock session.get to always return True
@@ -229,7 +229,7 @@ def test_edit_table_get_success(mock_connect, client):
         raise AssertionError(error_msg)
 
 
-@patch("sqlite3.connect")
+@patch("routes.admin_routes.connect_db")
 def test_edit_table_post_success(mock_connect, client):
     """Test edit_table route with a successful POST request."""
     # Mock session.get to always return True
@@ -258,7 +258,7 @@ def test_edit_table_post_success(mock_connect, client):
     )
 
 
-@patch("sqlite3.connect")
+@patch("routes.admin_routes.connect_db")
 def test_edit_table_post_failure(mock_connect, client):
     """Test edit_table route with a failed POST request."""
     # Mock session.get to always return True
@@ -288,7 +288,7 @@ def test_edit_table_post_failure(mock_connect, client):
     # assert b"Mocked database error" in response.data
 
 
-@patch("sqlite3.connect")
+@patch("routes.admin_routes.connect_db")
 def test_edit_table_post_sqlite_error(mock_connect, client):
     """Test edit_table route when sqlite3.Error occurs during a POST request."""
     # Mock session to simulate a logged-in admin
@@ -327,7 +327,7 @@ def test_edit_table_post_sqlite_error(mock_connect, client):
     )
 
 
-@patch("sqlite3.connect")
+@patch("routes.admin_routes.connect_db")
 def test_edit_table_post_invalid_column(mock_connect, client):
     """Test edit_table route with an invalid column name in the POST request."""
     # Mock session to simulate a logged-in admin
@@ -358,3 +358,210 @@ def test_edit_table_post_invalid_column(mock_connect, client):
 
     # Ensure the UPDATE query was not attempted
     mock_cursor.execute.assert_not_called()
+
+
+@pytest.fixture
+def paged_db():
+    """Fixture to create a real 2023 database with a few expenses."""
+    from setup import setup_db
+
+    conn = setup_db.connect_db(2023)
+    conn.executemany(
+        "INSERT INTO expenses (date, item, price_sgd) VALUES (?, ?, ?)",
+        [
+            ("2023-01-02", "Second", 2.0),
+            ("2023-01-01", "First", 1.0),
+            ("2023-01-02", "Third", 3.0),
+            ("2023-02-01", "Outside", 4.0),
+        ],
+    )
+    conn.commit()
+    conn.close()
+
+
+def test_edit_table_rows_keyset_pagination(client, paged_db, monkeypatch):
+    """Test that edit_table_rows pages through a range by (date, id)."""
+    monkeypatch.setattr("routes.admin_routes.PAGE_SIZE", 2)
+    with client.session_transaction() as sess:
+        sess["admin_logged_in"] = True
+
+    response = client.get(
+        "/admin/edit_table?year=2023&start_date=2023-01-01&end_date=2023-01-31"
+    )
+    if b"First" not in response.data or b"Third" in response.data:
+        error_msg = "Only the first page should be rendered"  # pragma: no cover
+        raise AssertionError(error_msg)
+    if b'data-after-date="2023-01-02" data-after-id="1"' not in response.data:
+        error_msg = "The next page cursor should be rendered"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+    response = client.get(
+        "/admin/edit_table/rows?year=2023&start_date=2023-01-01"
+        "&end_date=2023-01-31&after_date=2023-01-02&after_id=1"
+    )
+    items = [
+        row[response.json["columns"].index("item")] for row in response.json["rows"]
+    ]
+    if items != ["Third"] or response.json["next"] is not None:
+        error_msg = f"Unexpected second page, got {response.json}"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+
+def test_edit_table_rows_requires_login(client):
+    """Test that edit_table_rows rejects anonymous requests."""
+    response = client.get(
+        "/admin/edit_table/rows?year=2023&start_date=2023-01-01&end_date=2023-01-31"
+    )
+    if response.status_code != 401:
+        error_msg = (
+            f"Expected status code 401, got {response.status_code}"  # pragma: no cover
+        )
+        raise AssertionError(error_msg)
+
+
+def test_export_table_csv(client, paged_db):
+    """Test that export_table_csv streams the whole range ordered by date."""
+    with client.session_transaction() as sess:
+        sess["admin_logged_in"] = True
+
+    response = client.get(
+        "/admin/edit_table/export.csv?year=2023&start_date=2023-01-01&end_date=2023-01-31"
+    )
+    if response.status_code != 200 or response.mimetype != "text/csv":
+        error_msg = (
+            f"Expected a CSV response, got {response.status_code}"  # pragma: no cover
+        )
+        raise AssertionError(error_msg)
+    lines = response.get_data(as_text=True).splitlines()
+    if len(lines) != 4 or not lines[0].startswith("id,date") or "First" not in lines[1]:
+        error_msg = f"Unexpected CSV export, got {lines}"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+
+def test_bulk_edit_table(client, paged_db):
+    """Test that bulk_edit_table applies valid edits and reports each result."""
+    from setup.setup_db import connect_db
+
+    with client.session_transaction() as sess:
+        sess["admin_logged_in"] = True
+
+    response = client.post(
+        "/admin/edit_table/bulk?year=2023",
+        json={
+            "edits": [
+                {"id": 1, "column": "category", "value": "Food"},
+                {"id": "2", "column": "category", "value": "Food"},
+                {"id": 3, "column": "price_sgd", "value": "0"},
+                {"id": 99, "column": "item", "value": "Missing"},
+            ]
+        },
+    )
+
+    successes = [result["success"] for result in response.json["results"]]
+    if response.json["success"] or successes != [True, True, False, False]:
+        error_msg = (
+            f"Unexpected bulk edit results, got {response.json}"  # pragma: no cover
+        )
+        raise AssertionError(error_msg)
+    conn = connect_db(2023)
+    categories = conn.execute("SELECT category FROM expenses ORDER BY id").fetchall()
+    conn.close()
+    if categories != [("Food",), ("Food",), (None,), (None,)]:
+        error_msg = f"Unexpected categories after bulk edit, got {categories}"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+
+def test_bulk_edit_table_applies_edits_in_order(client, paged_db):
+    """Test that an id edit and edits to the same row apply in request order."""
+    from setup.setup_db import connect_db
+
+    with client.session_transaction() as sess:
+        sess["admin_logged_in"] = True
+
+    response = client.post(
+        "/admin/edit_table/bulk?year=2023",
+        json={
+            "edits": [
+                {"id": 1, "column": "id", "value": 10},
+                {"id": 10, "column": "item", "value": "Renumbered"},
+                {"id": 1, "column": "item", "value": "Lost"},
+                {"id": 2, "column": "id", "value": 3},
+            ]
+        },
+    )
+
+    results = response.json["results"]
+    if [result["success"] for result in results] != [True, True, False, False]:
+        error_msg = (
+            f"Unexpected bulk edit results, got {response.json}"  # pragma: no cover
+        )
+        raise AssertionError(error_msg)
+    if results[2]["error"] != "Record not found.":
+        error_msg = (
+            f"An edit to a moved row should fail, got {results[2]}"  # pragma: no cover
+        )
+        raise AssertionError(error_msg)
+    conn = connect_db(2023)
+    rows = conn.execute("SELECT id, item FROM expenses ORDER BY id").fetchall()
+    conn.close()
+    if rows != [(2, "First"), (3, "Third"), (4, "Outside"), (10, "Renumbered")]:
+        error_msg = f"Unexpected rows after bulk edit, got {rows}"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+
+def test_bulk_edit_table_requires_login(client):
+    """Test that bulk_edit_table rejects anonymous requests."""
+    response = client.post("/admin/edit_table/bulk?year=2023", json={"edits": []})
+    if response.status_code != 401:
+        error_msg = (
+            f"Expected status code 401, got {response.status_code}"  # pragma: no cover
+        )
+        raise AssertionError(error_msg)
+
+
+@patch(
+    "routes.admin_routes.connect_db", side_effect=sqlite3.Error("Mocked database error")
+)
+def test_bulk_edit_table_db_error(mock_connect, client):
+    """Test that bulk_edit_table reports database errors."""
+    with client.session_transaction() as sess:
+        sess["admin_logged_in"] = True
+
+    response = client.post(
+        "/admin/edit_table/bulk",
+        json={"year": 2023, "edits": [{"id": 1, "column": "item", "value": "x"}]},
+    )
+    if response.status_code != 500:
+        error_msg = (
+            f"Expected status code 500, got {response.status_code}"  # pragma: no cover
+        )
+        raise AssertionError(error_msg)
+
+
+def test_export_data_csv(client, paged_db):
+    """Test that export_data streams a table as CSV."""
+    with client.session_transaction() as sess:
+        sess["admin_logged_in"] = True
+
+    response = client.get(
+        "/admin/export?table=expenses&start_date=2023-01-01&end_date=2023-01-31"
+    )
+    lines = response.get_data(as_text=True).splitlines()
+    if response.mimetype != "text/csv" or len(lines) != 4:
+        error_msg = f"Unexpected export, got {lines}"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+
+def test_export_data_invalid_params(client):
+    """Test that export_data rejects invalid tables and date ranges."""
+    with client.session_transaction() as sess:
+        sess["admin_logged_in"] = True
+
+    for query in (
+        "table=sqlite_master&start_date=2023-01-01&end_date=2023-01-31",
+        "table=expenses&start_date=2023-02-01&end_date=2023-01-31",
+    ):
+        response = client.get(f"/admin/export?{query}")
+        if response.status_code != 400:
+            error_msg = f"Expected status code 400 for {query}, got {response.status_code}"  # pragma: no cover
+            raise AssertionError(error_msg)
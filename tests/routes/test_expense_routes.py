@@ -2,8 +2,10 @@
 
 from unittest.mock import patch, MagicMock
 import pytest
+import requests
 from flask import Flask
 from routes.expense_routes import expense_bp
+from setup.setup_config import Settings
 
 
 @pytest.fixture
@@ -91,3 +93,262 @@ def test_add_expense_error(mock_get_db, client):
     if response.json != {"error": "An internal error has occurred!"}:
         error_msg = f"Expected error message, got {response.json}"  # pragma: no cover
         raise AssertionError(error_msg)
+
+
+@patch("routes.expense_routes.get_fx_queue")
+@patch("routes.expense_routes.setup_stg.convert_to_sgd")
+@patch("routes.expense_routes.get_db")
+# pylint: disable=redefined-outer-name
+def test_add_expense_async_fx(
+    mock_get_db, mock_convert_to_sgd, mock_get_fx_queue, client
+):
+    """Test that async FX mode inserts a pending expense and queues the conversion."""
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_cursor.lastrowid = 42
+    mock_get_db.return_value = mock_conn
+    mock_conn.cursor.return_value = mock_cursor
+
+    expense_data = {
+        "date": "2025-03-26",
+        "category": "Food",
+        "item": "Lunch",
+        "location": "Restaurant",
+        "price": 50.0,
+        "currency": "USD",
+    }
+
+    with patch(
+        "routes.expense_routes.setup_stg.get_api_url",
+        return_value="http://api.example.com/",
+    ):
+        with patch(
+            "routes.expense_routes.get_settings",
+            return_value=Settings({"async_fx_conversion": True}),
+        ):
+            response = client.post("/add_expense", json=expense_data)
+
+    if response.status_code != 200:
+        error_msg = (
+            f"Expected status code 200, got {response.status_code}"  # pragma: no cover
+        )
+        raise AssertionError(error_msg)
+    if response.json.get("price_sgd_pending") is not True:
+        error_msg = (
+            f"Expected pending price_sgd, got {response.json}"  # pragma: no cover
+        )
+        raise AssertionError(error_msg)
+    mock_convert_to_sgd.assert_not_called()
+    inserted_price_sgd = mock_cursor.execute.call_args.args[1][-1]
+    if inserted_price_sgd is not None:
+        error_msg = (
+            f"Expected NULL price_sgd, got {inserted_price_sgd}"  # pragma: no cover
+        )
+        raise AssertionError(error_msg)
+    mock_get_fx_queue.return_value.submit.assert_called_once_with(
+        2025, 42, 50.0, "USD", "2025-03-26"
+    )
+
+
+@pytest.fixture
+def bulk_dbs():
+    """Fixture to run bulk inserts against real databases in a temporary directory."""
+    from setup import setup_db  # pylint: disable=import-outside-toplevel
+
+    return setup_db
+
+
+# pylint: disable=redefined-outer-name
+def test_add_expenses_bulk_json(bulk_dbs, client):
+    """Test bulk JSON ingestion routes rows per year and converts once per currency."""
+    expenses = [
+        {
+            "date": "2024-12-31",
+            "category": "Food",
+            "item": "Dinner",
+            "location": "Tokyo",
+            "price": 1000,
+            "currency": "JPY",
+        },
+        {
+            "date": "2025-01-01",
+            "category": "Food",
+            "item": "Lunch",
+            "location": "Tokyo",
+            "price": 2000,
+            "currency": "JPY",
+        },
+        {"date": "2025-01-02", "item": "Missing fields"},
+        {
+            "date": "2025-01-03",
+            "category": "Transport",
+            "item": "Bus",
+            "location": "Singapore",
+            "price": 2,
+            "currency": "SGD",
+        },
+    ]
+
+    with patch(
+        "routes.expense_routes.setup_stg.get_api_url",
+        return_value="http://api.example.com/",
+    ):
+        with patch(
+            "routes.expense_routes.setup_stg.convert_many_to_sgd",
+            side_effect=lambda api_url, currency, prices, dates: [
+                price * (0.01 if currency == "JPY" else 1) for price in prices
+            ],
+        ) as mock_convert:
+            response = client.post("/add_expenses_bulk", json=expenses)
+
+    if response.json["inserted"] != 3 or response.json["failed"] != 1:
+        error_msg = f"Unexpected bulk result, got {response.json}"  # pragma: no cover
+        raise AssertionError(error_msg)
+    if response.json["results"][2]["success"]:
+        error_msg = "The row with missing fields should fail"  # pragma: no cover
+        raise AssertionError(error_msg)
+    if mock_convert.call_count != 2:
+        error_msg = f"Expected one conversion per currency, got {mock_convert.call_count}"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+    conn = bulk_dbs.connect_db(2025)
+    rows = conn.execute("SELECT item, price_sgd FROM expenses ORDER BY id").fetchall()
+    conn.close()
+    if rows != [("Lunch", 20.0), ("Bus", 2.0)]:
+        error_msg = f"Unexpected 2025 rows, got {rows}"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+
+def test_add_expenses_bulk_csv(bulk_dbs, client):
+    """Test bulk CSV ingestion."""
+    body = (
+        "date,category,item,location,price,currency\n"
+        "2025-02-01,Food,Coffee,Singapore,5.5,SGD\n"
+        "not-a-date,Food,Tea,Singapore,3,SGD\n"
+    )
+
+    response = client.post(
+        "/add_expenses_bulk", data=body, content_type="text/csv; charset=utf-8"
+    )
+
+    successes = [result["success"] for result in response.json["results"]]
+    if successes != [True, False]:
+        error_msg = (
+            f"Unexpected bulk CSV result, got {response.json}"  # pragma: no cover
+        )
+        raise AssertionError(error_msg)
+
+
+def test_add_expenses_bulk_network_error_leaves_rows_pending(bulk_dbs, client):
+    """Test that a failed rate lookup queues only the rows it inserted."""
+    conn = bulk_dbs.connect_db(2025)
+    with conn:
+        conn.execute(
+            """INSERT INTO expenses (date, category, item, location, price,
+                    currency, price_sgd) VALUES ('2025-01-01', 'Food', 'Old',
+                    'Tokyo', 500, 'JPY', NULL)"""
+        )
+    conn.close()
+    expenses = [
+        {
+            "date": "2025-01-01 09:30:00",
+            "category": "Food",
+            "item": "Lunch",
+            "location": "Tokyo",
+            "price": 2000,
+            "currency": "JPY",
+        },
+        {
+            "date": "2025-01-01garbage",
+            "category": "Food",
+            "item": "Dinner",
+            "location": "Tokyo",
+            "price": 3000,
+            "currency": "JPY",
+        },
+    ]
+
+    with patch(
+        "routes.expense_routes.setup_stg.get_api_url",
+        return_value="http://api.example.com/",
+    ):
+        with patch(
+            "routes.expense_routes.setup_stg.convert_many_to_sgd",
+            side_effect=requests.ConnectionError("offline"),
+        ):
+            with patch("routes.expense_routes.get_fx_queue") as mock_get_fx_queue:
+                response = client.post("/add_expenses_bulk", json=expenses)
+
+    results = response.json["results"]
+    if response.status_code != 200 or not results[0].get("price_sgd_pending"):
+        error_msg = f"Expected a pending row, got {response.json}"  # pragma: no cover
+        raise AssertionError(error_msg)
+    if results[1]["success"]:
+        error_msg = "A malformed date should be rejected"  # pragma: no cover
+        raise AssertionError(error_msg)
+    mock_get_fx_queue.return_value.submit.assert_called_once_with(
+        2025, 2, 2000.0, "JPY", "2025-01-01"
+    )
+
+    conn = bulk_dbs.connect_db(2025)
+    rows = conn.execute(
+        "SELECT date, price_sgd FROM expenses WHERE item = 'Lunch'"
+    ).fetchall()
+    conn.close()
+    if rows != [("2025-01-01", None)]:
+        error_msg = f"Unexpected stored rows, got {rows}"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+
+def test_add_expenses_bulk_rejects_non_text_fields(bulk_dbs, client):
+    """Test that a non-scalar text field fails only its own row."""
+    expenses = [
+        {
+            "date": "2025-02-01",
+            "category": {"x": 1},
+            "item": "Coffee",
+            "location": "Singapore",
+            "price": 5,
+            "currency": "SGD",
+        },
+        {
+            "date": "2025-02-02",
+            "category": "Food",
+            "item": "Tea",
+            "location": "Singapore",
+            "price": 3,
+            "currency": "SGD",
+        },
+        {
+            "date": "2025-02-03",
+            "category": "Food",
+            "item": 42,
+            "location": "Singapore",
+            "price": 4,
+            "currency": "SGD",
+        },
+    ]
+
+    with patch("routes.expense_routes.setup_stg.get_api_url", return_value=None):
+        response = client.post("/add_expenses_bulk", json=expenses)
+
+    successes = [result["success"] for result in response.json["results"]]
+    if successes != [False, True, True]:
+        error_msg = f"Unexpected bulk result, got {response.json}"  # pragma: no cover
+        raise AssertionError(error_msg)
+    conn = bulk_dbs.connect_db(2025)
+    items = [row[0] for row in conn.execute("SELECT item FROM expenses ORDER BY id")]
+    conn.close()
+    if items != ["Tea", "42"]:
+        error_msg = f"Unexpected stored items, got {items}"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+
+def test_add_expenses_bulk_invalid_body(client):
+    """Test that a body that is neither a JSON array nor CSV is rejected."""
+    response = client.post("/add_expenses_bulk", json={"date": "2025-01-01"})
+    if response.status_code != 400:
+        error_msg = (
+            f"Expected status code 400, got {response.status_code}"  # pragma: no cover
+        )
+        raise AssertionError(error_msg)
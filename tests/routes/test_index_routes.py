@@ -1,9 +1,11 @@
 """This module contains the tests for the index_routes module."""
 
 import sqlite3
-from unittest.mock import patch, MagicMock
+from datetime import datetime
+from unittest.mock import patch, MagicMock, ANY
 import pytest
 from flask import Flask
+from db_import.import_jobs import ImportJobManager
 from routes.index_routes import index_bp
 from routes.admin_routes import admin_bp  # Import the admin blueprint
 
@@ -56,6 +58,71 @@ def test_index_success(mock_get_db, client):
         raise AssertionError(error_msg)
 
 
+@patch("routes.index_routes.datetime")
+@patch("routes.index_routes.get_db")
+# pylint: disable=redefined-outer-name
+def test_index_uses_date_ranges(mock_get_db, mock_datetime, client):
+    """Test that the monthly summary filters on half-open date ranges."""
+    mock_datetime.now.return_value = datetime(2024, 12, 15)
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_get_db.return_value = mock_conn
+    mock_conn.cursor.return_value = mock_cursor
+    mock_cursor.fetchone.side_effect = [(100.0,), (50.0,), (200.0,)]
+
+    response = client.get("/")
+
+    if response.status_code != 200:
+        error_msg = (
+            f"Expected status code 200, got {response.status_code}"  # pragma: no cover
+        )
+        raise AssertionError(error_msg)
+    params = [
+        execute_call.args[1] for execute_call in mock_cursor.execute.call_args_list
+    ]
+    expected_params = [
+        ("2024-12",),
+        ("2024-12",),
+        ("2025-01-01", "2025-01-01"),
+    ]
+    if params != expected_params:
+        error_msg = f"Unexpected query parameters, got {params}"  # pragma: no cover
+        raise AssertionError(error_msg)
+    for execute_call in mock_cursor.execute.call_args_list:
+        if "strftime" in execute_call.args[0]:
+            error_msg = (
+                "Date filters should not wrap columns in strftime"  # pragma: no cover
+            )
+            raise AssertionError(error_msg)
+
+
+@patch("routes.index_routes.datetime")
+# pylint: disable=redefined-outer-name
+def test_index_includes_recurring_from_earlier_years(mock_datetime, client):
+    """Test that the monthly total counts items stored in an earlier year's file."""
+    from setup import setup_db  # pylint: disable=import-outside-toplevel
+
+    mock_datetime.now.return_value = datetime(2026, 3, 15)
+    conn = setup_db.connect_db(2025)
+    conn.execute(
+        "INSERT INTO recurring_expenses (start_date, price_sgd) VALUES ('2025-06-01', 1000.0)"
+    )
+    conn.commit()
+    conn.close()
+    conn = setup_db.connect_db(2026)
+    conn.execute("INSERT INTO expenses (date, price_sgd) VALUES ('2026-03-02', 25.0)")
+    conn.commit()
+    conn.close()
+
+    response = client.get("/")
+
+    if b"SGD 1025.0" not in response.data:
+        error_msg = (
+            f"Expected a total of 1025.0, got {response.data}"  # pragma: no cover
+        )
+        raise AssertionError(error_msg)
+
+
 @patch("routes.index_routes.get_db")
 # pylint: disable=redefined-outer-name
 def test_index_error(mock_get_db, client):
@@ -94,27 +161,68 @@ def test_upload_excel_get(client):
         raise AssertionError(error_msg)
 
 
+@pytest.fixture
+def import_jobs(tmp_path):
+    """Fixture to run import jobs against a temporary job table."""
+    manager = ImportJobManager(str(tmp_path / "import_jobs.db"))
+    with patch("routes.index_routes.get_import_jobs", return_value=manager):
+        yield manager
+
+
 @patch("routes.index_routes.update_database_from_excel")
 # pylint: disable=redefined-outer-name
-def test_upload_excel_post_success(mock_update_database, client):
+def test_upload_excel_post_success(mock_update_database, client, import_jobs):
     """Test the POST request to the /upload_excel route with valid data."""
     # Mock the update_database_from_excel function
-    mock_update_database.return_value = None
+    mock_update_database.return_value = 3
 
     # Send POST request with valid data
     response = client.post(
         "/upload_excel",
         data={"excel_path": "mock_file.xlsx", "year": "2023"},
-        follow_redirects=True,
+        headers={"Accept": "application/json"},
     )
 
     # Assertions
-    if response.status_code != 200:
+    if response.status_code != 202:
         error_msg = (
-            f"Expected status code 200, got {response.status_code}"  # pragma: no cover
+            f"Expected status code 202, got {response.status_code}"  # pragma: no cover
+        )
+        raise AssertionError(error_msg)
+    import_jobs.wait(response.json["job_id"], timeout=5)
+    mock_update_database.assert_called_once_with("mock_file.xlsx", 2023, progress=ANY)
+
+    job = client.get(response.json["status_url"]).json
+    if job["status"] != "succeeded" or job["rows_inserted"] != 3:
+        error_msg = f"Unexpected job status, got {job}"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+
+@patch("routes.index_routes.update_database_from_excel")
+# pylint: disable=redefined-outer-name
+def test_upload_excel_post_renders_progress(mock_update_database, client, import_jobs):
+    """Test that a form POST redirects to the upload page with a progress bar."""
+    response = client.post(
+        "/upload_excel",
+        data={"excel_path": "mock_file.xlsx", "year": "2023"},
+        follow_redirects=True,
+    )
+
+    if response.status_code != 200 or b'id="importProgress"' not in response.data:
+        error_msg = (
+            f"Expected the import progress bar, got {response.data}"  # pragma: no cover
+        )
+        raise AssertionError(error_msg)
+
+
+def test_import_job_status_not_found(client, import_jobs):
+    """Test polling an unknown import job."""
+    response = client.get("/import_jobs/unknown")
+    if response.status_code != 404:
+        error_msg = (
+            f"Expected status code 404, got {response.status_code}"  # pragma: no cover
         )
         raise AssertionError(error_msg)
-    mock_update_database.assert_called_once_with("mock_file.xlsx", 2023)
 
 
 @patch("routes.index_routes.update_database_from_excel")
@@ -139,8 +247,8 @@ def test_upload_excel_post_missing_data(mock_update_database, client):
 
 @patch("routes.index_routes.update_database_from_excel")
 # pylint: disable=redefined-outer-name
-def test_upload_excel_post_exception(mock_update_database, client):
-    """Test the POST request to the /upload_excel route when an exception occurs."""
+def test_upload_excel_post_exception(mock_update_database, client, import_jobs):
+    """Test that an import raising an exception marks its job as failed."""
     # Mock the update_database_from_excel function to raise an exception
     mock_update_database.side_effect = ValueError("Mock exception")
 
@@ -148,16 +256,28 @@ def test_upload_excel_post_exception(mock_update_database, client):
     response = client.post(
         "/upload_excel",
         data={"excel_path": "mock_file.xlsx", "year": "2023"},
-        follow_redirects=True,
+        headers={"Accept": "application/json"},
     )
+    job = import_jobs.wait(response.json["job_id"], timeout=5)
 
     # Assertions
+    if job["status"] != "failed":
+        error_msg = f"Expected a failed job, got {job}"  # pragma: no cover
+        raise AssertionError(error_msg)
+    if job["error"] != "An internal error has occurred!":
+        error_msg = f"Unexpected error message, got {job}"  # pragma: no cover
+        raise AssertionError(error_msg)
+    mock_update_database.assert_called_once_with("mock_file.xlsx", 2023, progress=ANY)
+
+
+# pylint: disable=redefined-outer-name
+def test_upload_excel_post_invalid_year(client, import_jobs):
+    """Test the POST request to the /upload_excel route with a non-numeric year."""
+    response = client.post(
+        "/upload_excel", data={"excel_path": "mock_file.xlsx", "year": "abc"}
+    )
     if response.status_code != 500:
         error_msg = (
             f"Expected status code 500, got {response.status_code}"  # pragma: no cover
         )
         raise AssertionError(error_msg)
-    if b"An internal error has occurred!" not in response.data:
-        error_msg = f"Unexpected error message, got {response.data}"  # pragma: no cover
-        raise AssertionError(error_msg)
-    mock_update_database.assert_called_once_with("mock_file.xlsx", 2023)
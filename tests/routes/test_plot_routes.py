@@ -4,7 +4,8 @@ import sqlite3
 from unittest.mock import patch, MagicMock
 import pytest
 from flask import Flask
-from routes.plot_routes import plot_bp
+from setup import setup_db
+from routes.plot_routes import plot_bp, chart_cache
 
 
 # pylint: disable=redefined-outer-name
@@ -13,132 +14,244 @@ def client():
     """Fixture to create a Flask test client."""
     app = Flask(__name__, template_folder="../../templates")
     app.register_blueprint(plot_bp)
+    setup_db.init_app(app)  # Return pooled connections after each request
 
     @app.route("/")
     def index():
         return "Home"  # pragma: no cover
 
     app.add_url_rule("/", endpoint="index.index", view_func=index)
+    chart_cache.clear()
     with app.test_client() as client:
         yield client
 
 
-@patch("routes.plot_routes.get_db")
-@patch("routes.plot_routes.go.Figure")
-# pylint: disable=redefined-outer-name
-def test_plot_expenditure_success(mock_figure, mock_get_db, client):
-    """Test the plot_expenditure route with Plotly."""
-    # Mock database connection and cursor
-    mock_conn = MagicMock()
-    mock_cursor = MagicMock()
-    mock_get_db.return_value = mock_conn
-    mock_conn.cursor.return_value = mock_cursor
-
-    # Mock monthly data
-    mock_cursor.fetchall.side_effect = [
-        [("01", 100.0), ("02", 200.0)],  # Monthly data
-        [("01", 300.0), ("02", 400.0)],  # Yearly data
-    ]
+@pytest.fixture
+def year_db():
+    """Fixture to create a real 2024 database in a temporary directory."""
+    conn = setup_db.connect_db(2024)
+    conn.executemany(
+        "INSERT INTO expenses (date, price_sgd) VALUES (?, ?)",
+        [("2024-03-01", 10.0), ("2024-03-01", 5.0), ("2024-03-04", 20.0)],
+    )
+    conn.commit()
+    yield conn
+    conn.close()
 
-    # Mock Plotly figure methods
-    mock_fig_instance = MagicMock()
-    mock_figure.return_value = mock_fig_instance
-    mock_fig_instance.to_html.side_effect = [
-        "<div>Mock Monthly Plot</div>",  # Mock monthly plot HTML
-        "<div>Mock Yearly Plot</div>",  # Mock yearly plot HTML
-    ]
 
-    # Send GET request
+def test_plot_expenditure_success(client):
+    """Test the plot_expenditure page loads its charts from the series API."""
     response = client.get("/plot_expenditure")
 
-    print(response.data)
-    # Assertions
     if response.status_code != 200:
         error_msg = (
             f"Expected status code 200, got {response.status_code}"  # pragma: no cover
         )
         raise AssertionError(error_msg)
-    if (
-        b"<div>Mock Monthly Plot</div>" not in response.data
-    ):  # Ensure the plot HTML is rendered
-        error_msg = "Monthly plot HTML not found in response data"  # pragma: no cover
+    if b"/api/series/month" not in response.data:
+        error_msg = "Month chart should load from the series API"  # pragma: no cover
+        raise AssertionError(error_msg)
+    if b"/api/series/year" not in response.data:
+        error_msg = "Year chart should load from the series API"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+
+def test_plot_custom_expenditure_success(client):
+    """Test the plot_custom_expenditure page loads its chart from the series API."""
+    response = client.get(
+        "/plot_custom_expenditure?start_date=2023-11-01&end_date=2023-11-02"
+    )
+
+    if response.status_code != 200:
+        error_msg = (
+            f"Expected status code 200, got {response.status_code}"  # pragma: no cover
+        )
         raise AssertionError(error_msg)
     if (
-        b"<div>Mock Yearly Plot</div>" not in response.data
-    ):  # Ensure the plot HTML is rendered
-        error_msg = "Yearly plot HTML not found in response data"  # pragma: no cover
+        b"/api/series/custom?start_date=2023-11-01&amp;end_date=2023-11-02"
+        not in response.data
+    ):
+        error_msg = f"Custom chart should load from the series API, got {response.data}"  # pragma: no cover
         raise AssertionError(error_msg)
-    mock_get_db.assert_called_once()
-    if mock_cursor.execute.call_count != 2:  # Ensure both queries were executed
-        error_msg = f"Expected 2 queries, got {mock_cursor.execute.call_count}"  # pragma: no cover
+
+
+# pylint: disable=unused-argument
+def test_month_series(client, year_db):
+    """Test the month series returns compact columnar JSON."""
+    response = client.get("/api/series/month?year=2024&month=3")
+
+    if response.status_code != 200:
+        error_msg = (
+            f"Expected status code 200, got {response.status_code}"  # pragma: no cover
+        )
         raise AssertionError(error_msg)
-    mock_figure.assert_called()  # Ensure Plotly figure was created
-    if mock_fig_instance.add_trace.call_count != 2:  # Ensure traces were added
-        error_msg = f"Expected 2 traces, got {mock_fig_instance.add_trace.call_count}"  # pragma: no cover
+    if response.json != {"x": [1, 4], "y": [15.0, 20.0], "recurring": 0}:
+        error_msg = f"Unexpected month series, got {response.json}"  # pragma: no cover
         raise AssertionError(error_msg)
-    if mock_fig_instance.update_layout.call_count != 2:  # Ensure layout was updated
-        error_msg = f"Expected 2 layout updates, got {mock_fig_instance.update_layout.call_count}"  # pragma: no cover
+    if not response.headers.get("ETag") or not response.headers.get("Last-Modified"):
+        error_msg = (
+            "Series responses should carry ETag and Last-Modified"  # pragma: no cover
+        )
         raise AssertionError(error_msg)
-    if mock_fig_instance.to_html.call_count != 2:  # Ensure HTML was generated
-        error_msg = f"Expected 2 HTML generations, got {mock_fig_instance.to_html.call_count}"  # pragma: no cover
+
+
+def test_year_series_revalidation(client, year_db):
+    """Test that unchanged data revalidates with a 304 and writes change the ETag."""
+    first = client.get("/api/series/year?year=2024")
+    if first.json != {"x": ["Mar"], "y": [35.0], "recurring": [None]}:
+        error_msg = f"Unexpected year series, got {first.json}"  # pragma: no cover
         raise AssertionError(error_msg)
+    etag = first.headers["ETag"]
 
+    revalidated = client.get(
+        "/api/series/year?year=2024", headers={"If-None-Match": etag}
+    )
+    if revalidated.status_code != 304:
+        error_msg = f"Expected 304, got {revalidated.status_code}"  # pragma: no cover
+        raise AssertionError(error_msg)
 
-@patch("routes.plot_routes.get_db")
-@patch("routes.plot_routes.go.Figure")
-def test_plot_custom_expenditure_success(mock_figure, mock_get_db, client):
-    """Test the plot_custom_expenditure route with Plotly."""
-    # Mock database connection and cursor
-    mock_conn = MagicMock()
-    mock_cursor = MagicMock()
-    mock_get_db.return_value = mock_conn
-    mock_conn.cursor.return_value = mock_cursor
+    year_db.execute("INSERT INTO expenses (date, price_sgd) VALUES ('2024-04-02', 1.0)")
+    year_db.commit()
+    changed = client.get("/api/series/year?year=2024", headers={"If-None-Match": etag})
+    if changed.status_code != 200 or changed.json != {
+        "x": ["Mar", "Apr"],
+        "y": [35.0, 1.0],
+        "recurring": [None, None],
+    }:
+        error_msg = f"Expected fresh series after a write, got {changed.json}"  # pragma: no cover
+        raise AssertionError(error_msg)
 
-    # Mock custom data
-    mock_cursor.fetchall.return_value = [
-        ("2023-11-01", 150.0),
-        ("2023-11-02", 250.0),
-    ]
-    mock_cursor.description = [("date",), ("amount",)]
 
-    # Mock Plotly figure methods
-    mock_fig_instance = MagicMock()
-    mock_figure.return_value = mock_fig_instance
-    mock_fig_instance.to_html.return_value = "<div>Mock Custom Plot</div>"
+def test_year_series_includes_recurring(client, year_db):
+    """Test that recurring costs are added per month and invalidate the cache."""
+    first = client.get("/api/series/year?year=2024")
 
-    # Send GET request with query parameters
+    year_db.execute(
+        """INSERT INTO recurring_expenses (start_date, end_date, price_sgd)
+            VALUES ('2024-02-15', '2024-03-31', 7.5)"""
+    )
+    year_db.commit()
     response = client.get(
-        "/plot_custom_expenditure?start_date=2023-11-01&end_date=2023-11-02"
+        "/api/series/year?year=2024", headers={"If-None-Match": first.headers["ETag"]}
     )
 
-    # Assertions
-    if response.status_code != 200:
+    if response.status_code != 200 or response.json != {
+        "x": ["Feb", "Mar"],
+        "y": [None, 35.0],
+        "recurring": [7.5, 7.5],
+    }:
+        error_msg = f"Unexpected year series, got {response.json}"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+
+def test_year_series_open_ended_recurring_adds_no_spend(client, year_db):
+    """Test that months with only recurring costs have no expense point."""
+    year_db.execute(
+        "INSERT INTO recurring_expenses (start_date, price_sgd) VALUES ('2024-11-01', 4.0)"
+    )
+    year_db.commit()
+
+    series = client.get("/api/series/year?year=2024").json
+
+    if series != {
+        "x": ["Mar", "Nov", "Dec"],
+        "y": [35.0, None, None],
+        "recurring": [None, 4.0, 4.0],
+    }:
+        error_msg = f"Unexpected year series, got {series}"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+
+def test_custom_series_includes_recurring(client, year_db):
+    """Test that the custom series carries the recurring total of each month."""
+    year_db.execute(
+        "INSERT INTO recurring_expenses (start_date, price_sgd) VALUES ('2024-01-01', 3.0)"
+    )
+    year_db.commit()
+
+    response = client.get(
+        "/api/series/custom?start_date=2024-02-10&end_date=2024-03-01"
+    )
+
+    if response.json["recurring"] != {"x": ["2024-02", "2024-03"], "y": [3.0, 3.0]}:
         error_msg = (
-            f"Expected status code 200, got {response.status_code}"  # pragma: no cover
+            f"Unexpected recurring series, got {response.json}"  # pragma: no cover
         )
         raise AssertionError(error_msg)
-    if (
-        b"<div>Mock Custom Plot</div>" not in response.data
-    ):  # Ensure the plot HTML is rendered
-        error_msg = "Custom plot HTML not found in response data"  # pragma: no cover
+
+
+def test_custom_series(client, year_db):
+    """Test the custom series across a range spanning two year databases."""
+    response = client.get(
+        "/api/series/custom?start_date=2023-12-30&end_date=2024-03-01"
+    )
+
+    if response.json != {
+        "x": ["2024-03-01"],
+        "y": [15.0],
+        "recurring": {"x": [], "y": []},
+    }:
+        error_msg = f"Unexpected custom series, got {response.json}"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+
+@pytest.fixture
+def earlier_year_rent():
+    """Fixture for an open-ended item stored in the 2025 database."""
+    conn = setup_db.connect_db(2025)
+    conn.execute(
+        "INSERT INTO recurring_expenses (start_date, price_sgd) VALUES ('2025-06-01', 1000.0)"
+    )
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def test_series_include_recurring_from_earlier_years(client, earlier_year_rent):
+    """Test that an item crossing a year boundary is charged in later years."""
+    month = client.get("/api/series/month?year=2026&month=3")
+    if month.json != {"x": [], "y": [], "recurring": 1000.0}:
+        error_msg = f"Unexpected month series, got {month.json}"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+    year = client.get("/api/series/year?year=2026").json
+    if year["recurring"] != [1000.0] * 12:
+        error_msg = f"Unexpected year series, got {year}"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+    custom = client.get(
+        "/api/series/custom?start_date=2025-11-15&end_date=2026-02-01"
+    ).json
+    if custom["recurring"] != {
+        "x": ["2025-11", "2025-12", "2026-01", "2026-02"],
+        "y": [1000.0] * 4,
+    }:
+        error_msg = f"Unexpected custom series, got {custom}"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+    # Ending the item in the earlier file invalidates the later year's series
+    earlier_year_rent.execute("UPDATE recurring_expenses SET end_date = '2026-01-31'")
+    earlier_year_rent.commit()
+    changed = client.get(
+        "/api/series/month?year=2026&month=3",
+        headers={"If-None-Match": month.headers["ETag"]},
+    )
+    if changed.status_code != 200 or changed.json["recurring"] != 0:
+        error_msg = (
+            f"Expected a fresh month series, got {changed.json}"  # pragma: no cover
+        )
         raise AssertionError(error_msg)
-    mock_get_db.assert_called_once()
-    mock_cursor.execute.assert_called_once()  # Ensure the query was executed
-    mock_figure.assert_called()  # Ensure Plotly figure was created
-    mock_fig_instance.add_trace.assert_called()  # Ensure traces were added
-    mock_fig_instance.update_layout.assert_called()  # Ensure layout was updated
-    mock_fig_instance.to_html.assert_called_once()  # Ensure HTML was generated
 
 
 @patch("routes.plot_routes.get_db")
 # pylint: disable=redefined-outer-name
-def test_plot_expenditure_error(mock_get_db, client):
-    """Test error handling for the /plot_expenditure route."""
+def test_month_series_error(mock_get_db, client):
+    """Test error handling for the /api/series/month route."""
     # Mock database connection to raise an exception
     mock_get_db.side_effect = sqlite3.DatabaseError("Mocked database error")
 
     # Send GET request
-    response = client.get("/plot_expenditure")
+    response = client.get("/api/series/month")
 
     # Assertions
     if response.status_code != 500:
@@ -173,14 +286,14 @@ def test_plot_custom_expenditure_missing_params(mock_get_db, client):
 
 @patch("routes.plot_routes.get_db")
 # pylint: disable=redefined-outer-name
-def test_plot_custom_expenditure_error(mock_get_db, client):
-    """Test error handling for the /plot_custom_expenditure route."""
+def test_custom_series_error(mock_get_db, client):
+    """Test error handling for the /api/series/custom route."""
     # Mock database connection to raise an exception
     mock_get_db.side_effect = sqlite3.DatabaseError("Mocked database error")
 
     # Send GET request
     response = client.get(
-        "/plot_custom_expenditure?start_date=2025-03-01&end_date=2025-03-02"
+        "/api/series/custom?start_date=2025-03-01&end_date=2025-03-02"
     )
 
     # Assertions
@@ -193,3 +306,39 @@ def test_plot_custom_expenditure_error(mock_get_db, client):
         error_msg = f"Expected error message, got {response.json}"  # pragma: no cover
         raise AssertionError(error_msg)
     mock_get_db.assert_called_once()
+
+
+@patch("routes.plot_routes.get_db")
+# pylint: disable=redefined-outer-name
+def test_month_series_cache(mock_get_db, client):
+    """Test that the series is re-queried only when the data version changes."""
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_get_db.return_value = mock_conn
+    mock_conn.cursor.return_value = mock_cursor
+    mock_cursor.fetchone.side_effect = [
+        (1, "2024-03-01T00:00:00Z"),
+        (1, "2024-03-01T00:00:00Z"),
+        (2, "2024-03-02T00:00:00Z"),
+    ]
+    mock_cursor.fetchall.side_effect = [
+        [("01", 100.0)],
+        [("2024-03", 20.0)],
+        [("01", 150.0)],
+        [("2024-03", 20.0)],
+    ]
+
+    responses = [
+        client.get("/api/series/month?year=2024&month=3").json for _ in range(3)
+    ]
+
+    if responses[1] != responses[0] or responses[2] != {
+        "x": [1],
+        "y": [150.0],
+        "recurring": 20.0,
+    }:
+        error_msg = f"Unexpected cached series, got {responses}"  # pragma: no cover
+        raise AssertionError(error_msg)
+    if mock_cursor.fetchall.call_count != 4:
+        error_msg = f"Expected 4 series queries, got {mock_cursor.fetchall.call_count}"  # pragma: no cover
+        raise AssertionError(error_msg)
@@ -63,7 +63,7 @@ def test_add_recurring_success(mock_convert_to_sgd, mock_get_db, client):
     # )
     mock_cursor.execute.assert_called_once()
     mock_conn.commit.assert_called_once()
-    mock_conn.close.assert_called_once()
+    mock_conn.close.assert_not_called()  # Pooled connection is released on teardown
 
 
 @patch("routes.recurring_routes.get_db")
@@ -144,4 +144,4 @@ def test_add_recurring_missing_end_date(mock_convert_to_sgd, mock_get_db, client
     # )
     mock_cursor.execute.assert_called_once()
     mock_conn.commit.assert_called_once()
-    mock_conn.close.assert_called_once()
+    mock_conn.close.assert_not_called()  # Pooled connection is released on teardown
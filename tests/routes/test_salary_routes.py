@@ -64,7 +64,7 @@ def test_add_salary_success(mock_convert_to_sgd, mock_get_db, client):
     # )
     mock_cursor.execute.assert_called()
     mock_conn.commit.assert_called_once()
-    mock_conn.close.assert_called_once()
+    mock_conn.close.assert_not_called()  # Pooled connection is released on teardown
 
 
 @patch("routes.salary_routes.get_db")
@@ -116,7 +116,7 @@ def test_add_salary_with_previous_entry(mock_convert_to_sgd, mock_get_db, client
         error_msg = f"Expected 3 calls to execute, got {mock_cursor.execute.call_count}"  # pragma: no cover
         raise AssertionError(error_msg)
     mock_conn.commit.assert_called_once()
-    mock_conn.close.assert_called_once()
+    mock_conn.close.assert_not_called()  # Pooled connection is released on teardown
 
 
 @patch("routes.salary_routes.get_db")
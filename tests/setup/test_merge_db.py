@@ -0,0 +1,89 @@
+"""This module contains tests for the merge_db module."""
+
+import sqlite3
+import pytest
+from setup import merge_db, setup_db
+from setup.merge_db import find_year_databases, merge_year_databases, main
+from setup.setup_config import Settings
+
+
+@pytest.fixture
+def year_databases(tmp_path):
+    """Fixture to create two per-year databases with one row per table."""
+    for year in (2023, 2024):
+        conn = setup_db.connect_db(year)
+        conn.execute(
+            """INSERT INTO expenses (date, category, item, location, price, currency,
+                price_sgd) VALUES (?, 'Food', 'Lunch', 'Cafe', 10, 'SGD', 10)""",
+            (f"{year}-03-01",),
+        )
+        conn.execute(
+            """INSERT INTO recurring_expenses (start_date, end_date, category, item,
+                location, ori_price, currency, price_sgd)
+                VALUES (?, NULL, 'Bills', 'Phone', 'Home', 30, 'SGD', 30)""",
+            (f"{year}-01-01",),
+        )
+        conn.execute(
+            "INSERT INTO salary (start_date, end_date, amount) VALUES (?, '', 5000)",
+            (f"{year}-01-01",),
+        )
+        conn.commit()
+        conn.close()
+    return tmp_path
+
+
+# pylint: disable=redefined-outer-name
+def test_merge_year_databases(year_databases):
+    """Test that year files are merged once into a single database."""
+    sources = find_year_databases(str(year_databases))
+    if len(sources) != 2:
+        error_msg = f"Expected two year databases, got {sources}"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+    output = str(year_databases / "expenses.db")
+    merged_rows = merge_year_databases(output, sources)
+    if merged_rows != {"expenses": 2, "recurring_expenses": 2, "salary": 2}:
+        error_msg = (
+            f"Unexpected merged row counts, got {merged_rows}"  # pragma: no cover
+        )
+        raise AssertionError(error_msg)
+
+    # Merging again must not duplicate rows
+    if sum(merge_year_databases(output, sources).values()) != 0:
+        error_msg = "Already merged files should be skipped"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+    conn = sqlite3.connect(output)
+    dates = [row[0] for row in conn.execute("SELECT date FROM expenses ORDER BY date")]
+    conn.close()
+    if dates != ["2023-03-01", "2024-03-01"]:
+        error_msg = f"Unexpected merged expenses, got {dates}"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+
+def test_main(year_databases, capsys):
+    """Test the command line entry point."""
+    main(["--output", str(year_databases / "merged.db"), "--source-dir", "."])
+    if "expenses: 2 rows merged" not in capsys.readouterr().out:
+        error_msg = "Expected a summary of merged rows"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+
+def test_main_defaults_follow_settings(year_databases, monkeypatch, capsys):
+    """Test that the default paths come from db_dir and consolidated_db_path."""
+    settings = Settings(
+        {"db_dir": str(year_databases), "consolidated_db_path": "all_years.db"}
+    )
+    monkeypatch.setattr(setup_db, "get_settings", lambda: settings)
+    monkeypatch.setattr(merge_db, "get_settings", lambda: settings)
+    (year_databases / "elsewhere").mkdir()
+    monkeypatch.chdir(year_databases / "elsewhere")
+
+    main([])
+
+    if "expenses: 2 rows merged" not in capsys.readouterr().out:
+        error_msg = "Expected the db_dir databases to be merged"  # pragma: no cover
+        raise AssertionError(error_msg)
+    if not (year_databases / "all_years.db").exists():
+        error_msg = "Expected the merge in consolidated_db_path"  # pragma: no cover
+        raise AssertionError(error_msg)
@@ -0,0 +1,33 @@
+"""This module contains tests for the rebuild_rollups module."""
+
+from setup import setup_db
+from setup.rebuild_rollups import main
+
+
+def test_main_rebuilds_every_year_file(capsys):
+    """Test that the command rebuilds the rollups of every year database."""
+    conn = setup_db.connect_db(2023)
+    conn.execute("INSERT INTO expenses (date, price_sgd) VALUES ('2023-04-01', 12)")
+    conn.execute(
+        "INSERT INTO recurring_expenses (start_date, end_date, price_sgd) VALUES ('2023-05-01', '2023-05-31', 3)"
+    )
+    conn.execute("DELETE FROM daily_totals")  # Simulate drifted rollups
+    conn.execute("DELETE FROM recurring_schedule")
+    conn.commit()
+    conn.close()
+
+    main([])
+
+    if "Rebuilt rollups for expenses_2023.db" not in capsys.readouterr().out:
+        error_msg = "Expected the 2023 database to be rebuilt"  # pragma: no cover
+        raise AssertionError(error_msg)
+    conn = setup_db.connect_db(2023)
+    daily = conn.execute("SELECT day, total FROM daily_totals").fetchall()
+    schedule = conn.execute("SELECT month, total FROM recurring_schedule").fetchall()
+    conn.close()
+    if daily != [("2023-04-01", 12.0)]:
+        error_msg = f"Unexpected rebuilt totals, got {daily}"  # pragma: no cover
+        raise AssertionError(error_msg)
+    if schedule != [("2023-05", 3.0)]:
+        error_msg = f"Unexpected rebuilt schedule, got {schedule}"  # pragma: no cover
+        raise AssertionError(error_msg)
@@ -0,0 +1,85 @@
+"""This module contains tests for the setup_config module."""
+
+import os
+
+import pytest
+from setup.setup_config import ConfigStore, Settings, load_settings
+
+
+def test_missing_file_uses_defaults(tmp_path):
+    """Test that a missing config file leaves every setting at its default."""
+    settings = load_settings(str(tmp_path / "missing.yaml"), environ={})
+
+    if (settings.pool_size, settings.storage_mode, settings.db_dir) != (
+        5,
+        "per_year",
+        "",
+    ):
+        error_msg = f"Unexpected defaults: {settings}"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+
+def test_environment_overrides_are_typed(tmp_path):
+    """Test that environment variables override the file with typed values."""
+    config_path = tmp_path / "user_config.yaml"
+    config_path.write_text("pool_size: 5\nasync_fx_conversion: False\n")
+
+    settings = load_settings(
+        str(config_path),
+        environ={
+            "FINANCE_POOL_SIZE": "8",
+            "FINANCE_ASYNC_FX_CONVERSION": "yes",
+            "FINANCE_SQLITE_PRAGMAS": "{busy_timeout: 10000}",
+        },
+    )
+
+    if settings.pool_size != 8 or settings.async_fx_conversion is not True:
+        error_msg = f"Overrides were not applied: {settings}"  # pragma: no cover
+        raise AssertionError(error_msg)
+    if settings.sqlite_pragmas != {"busy_timeout": 10000}:
+        error_msg = f"Unexpected PRAGMAs: {settings.sqlite_pragmas}"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+
+def test_invalid_values_are_rejected():
+    """Test that values that cannot be converted raise a ValueError."""
+    with pytest.raises(ValueError):
+        Settings({"pool_size": "many"})
+    with pytest.raises(ValueError):
+        Settings({"incremental_import": "sometimes"})
+
+
+def test_settings_are_read_only():
+    """Test that settings cannot be changed in place."""
+    settings = Settings()
+    with pytest.raises(AttributeError):
+        settings.pool_size = 1
+
+
+def test_repr_hides_credentials():
+    """Test that the API key and admin password are never printed."""
+    settings = Settings({"api_key": "secret-key", "admin_password": "secret-pw"})
+
+    if "secret" in repr(settings):
+        error_msg = "Credentials should not appear in the repr"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+
+def test_config_store_reloads_on_change(tmp_path):
+    """Test that the store re-reads the file only when its mtime changes."""
+    config_path = tmp_path / "user_config.yaml"
+    config_path.write_text("fx_cache_ttl: 60\n")
+    store = ConfigStore(str(config_path), reload_interval=0)
+
+    first = store.get()
+    if store.get() is not first:
+        error_msg = "Unchanged settings should be reused"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+    config_path.write_text("fx_cache_ttl: 120\n")
+    stat = os.stat(config_path)
+    os.utime(config_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    if store.get().fx_cache_ttl != 120:
+        error_msg = "Changed settings should be reloaded"  # pragma: no cover
+        raise AssertionError(error_msg)
@@ -1,7 +1,18 @@
 """This module contains tests for the setup_db module."""
 
+import sqlite3
 from unittest.mock import patch, MagicMock, call
-from setup.setup_db import get_db
+from flask import Flask
+import pytest
+from setup import setup_db
+from setup.setup_config import Settings
+from setup.setup_db import get_db, connect_db, init_app, ConnectionPool
+
+
+@pytest.fixture(autouse=True)
+def small_pool(monkeypatch):
+    """Use a small pool with a short timeout so exhaustion fails fast."""
+    monkeypatch.setattr(setup_db, "pool", ConnectionPool(size=2, timeout=0.1))
 
 
 @patch("setup.setup_db.sqlite3.connect")
@@ -12,13 +23,16 @@ def test_get_db_creates_tables(mock_connect):
     mock_cursor = MagicMock()
     mock_connect.return_value = mock_conn
     mock_conn.cursor.return_value = mock_cursor
+    mock_cursor.execute.return_value.fetchone.return_value = (0,)
 
     # Call the function
     year = 2023
     conn = get_db(year)
 
     # Verify the database name
-    mock_connect.assert_called_once_with(f"expenses_{year}.db")
+    mock_connect.assert_called_once_with(
+        f"expenses_{year}.db", check_same_thread=False, factory=sqlite3.Connection
+    )
 
     # Verify the SQL commands to create tables
     expected_calls = [
@@ -56,9 +70,312 @@ def test_get_db_creates_tables(mock_connect):
     mock_cursor.execute.assert_has_calls(expected_calls, any_order=True)
 
     # Verify commit is called
-    mock_conn.commit.assert_called_once()
+    mock_conn.commit.assert_called()
 
     # Verify the function returns the connection object
     if conn != mock_conn:
         error_msg = "get_db should return the connection object."  # pragma: no cover
         raise AssertionError(error_msg)
+
+
+@patch("setup.setup_db.sqlite3.connect")
+def test_schema_created_once_per_file(mock_connect):
+    """Test that the schema DDL only runs on the first connection to a file."""
+    mock_conn = MagicMock()
+    mock_connect.return_value = mock_conn
+    mock_conn.cursor.return_value.execute.return_value.fetchone.return_value = (
+        len(setup_db.SCHEMA_MIGRATIONS),
+    )
+
+    connect_db(2023)
+    connect_db(2023)
+
+    if mock_conn.commit.call_count != 1:
+        error_msg = f"Expected one schema commit, got {mock_conn.commit.call_count}"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+
+def test_get_db_reuses_connection_within_app_context():
+    """Test that get_db returns one pooled connection per year per app context."""
+    app = Flask(__name__)
+    init_app(app)
+
+    with app.app_context():
+        first_conn = get_db(2023)
+        second_conn = get_db("2023")
+        if first_conn is not second_conn:
+            error_msg = "get_db should reuse the connection within an app context."  # pragma: no cover
+            raise AssertionError(error_msg)
+        first_conn.execute(
+            "INSERT INTO expenses (date, price_sgd) VALUES (?, ?)", ("2023-01-01", 1)
+        )
+
+    with app.app_context():
+        pooled_conn = get_db(2023)
+        if pooled_conn is not first_conn:
+            error_msg = (
+                "Released connection should be handed out again."  # pragma: no cover
+            )
+            raise AssertionError(error_msg)
+        # Uncommitted work is rolled back when the connection is released
+        count = pooled_conn.execute("SELECT COUNT(*) FROM expenses").fetchone()[0]
+        if count != 0:
+            error_msg = (
+                f"Expected rolled back insert, got {count} rows"  # pragma: no cover
+            )
+            raise AssertionError(error_msg)
+
+
+def test_release_uses_the_file_it_was_acquired_from(monkeypatch, tmp_path):
+    """Test that a settings reload mid-request does not misplace the connection."""
+    app = Flask(__name__)
+    init_app(app)
+    (tmp_path / "moved").mkdir()
+
+    with app.app_context():
+        conn = get_db(2023)
+        monkeypatch.setattr(
+            setup_db,
+            "get_settings",
+            lambda: Settings({"db_dir": str(tmp_path / "moved")}),
+        )
+
+    if setup_db.pool.acquire("expenses_2023.db") is not conn:
+        error_msg = (
+            "The connection should return to its own file's pool"  # pragma: no cover
+        )
+        raise AssertionError(error_msg)
+
+
+def test_pool_is_bounded():
+    """Test that the pool refuses to open more connections than its size."""
+    test_pool = ConnectionPool(size=1, timeout=0.1)
+    conn = test_pool.acquire("expenses_2023.db")
+
+    with pytest.raises(setup_db.sqlite3.OperationalError, match="Timed out"):
+        test_pool.acquire("expenses_2023.db")
+
+    test_pool.release("expenses_2023.db", conn)
+    if test_pool.acquire("expenses_2023.db") is not conn:
+        error_msg = "Pool should hand out the released connection."  # pragma: no cover
+        raise AssertionError(error_msg)
+    test_pool.close_all()
+
+
+def test_migrations_create_indexes():
+    """Test that migrations add the indexes and record the schema version."""
+    conn = connect_db(2023)
+    indexes = {
+        row[0]
+        for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"
+        )
+    }
+    expected_indexes = {
+        "idx_expenses_date",
+        "idx_expenses_key",
+        "idx_recurring_dates",
+        "idx_recurring_key",
+        "idx_salary_dates",
+    }
+    if not expected_indexes <= indexes:
+        error_msg = f"Missing indexes, got {indexes}"  # pragma: no cover
+        raise AssertionError(error_msg)
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version != setup_db.SCHEMA_MIGRATIONS[-1][0]:
+        error_msg = f"Unexpected schema version {version}"  # pragma: no cover
+        raise AssertionError(error_msg)
+    conn.close()
+
+
+def test_migrations_upgrade_existing_file():
+    """Test that an existing year file without indexes is migrated idempotently."""
+    legacy_conn = setup_db.sqlite3.connect("expenses_2022.db")
+    for statement in setup_db.SCHEMA_STATEMENTS:
+        legacy_conn.execute(statement)
+    legacy_conn.execute(
+        "INSERT INTO expenses (date, category, item, location) VALUES (?, ?, ?, ?)",
+        ("2022-05-01", "Food", "Lunch", "Cafe"),
+    )
+    legacy_conn.commit()
+    legacy_conn.close()
+
+    conn = connect_db(2022)
+    setup_db.migrate_schema(conn)  # Running again must be a no-op
+    plan = conn.execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM expenses WHERE date BETWEEN ? AND ?",
+        ("2022-01-01", "2022-12-31"),
+    ).fetchall()
+    if "idx_expenses_date" not in str(plan):
+        error_msg = (
+            f"Range query should use the date index, got {plan}"  # pragma: no cover
+        )
+        raise AssertionError(error_msg)
+    count = conn.execute("SELECT COUNT(*) FROM expenses").fetchone()[0]
+    if count != 1:
+        error_msg = (
+            f"Existing rows should be preserved, got {count}"  # pragma: no cover
+        )
+        raise AssertionError(error_msg)
+    conn.close()
+
+
+def test_month_and_year_range():
+    """Test the half-open date ranges used for sargable date predicates."""
+    if setup_db.month_range(2024, 2) != ("2024-02-01", "2024-03-01"):
+        error_msg = "Unexpected range for February 2024"  # pragma: no cover
+        raise AssertionError(error_msg)
+    if setup_db.month_range("2024", "12") != ("2024-12-01", "2025-01-01"):
+        error_msg = "December should roll over to the next year"  # pragma: no cover
+        raise AssertionError(error_msg)
+    if setup_db.year_range(2024) != ("2024-01-01", "2025-01-01"):
+        error_msg = "Unexpected range for 2024"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+
+def test_split_range_by_db_per_year():
+    """Test that a multi-year range is split into one range per year file."""
+    ranges = setup_db.split_range_by_db("2023-11-15", "2025-01-01")
+    expected = [
+        (2023, "2023-11-15", "2024-01-01"),
+        (2024, "2024-01-01", "2025-01-01"),
+    ]
+    if ranges != expected:
+        error_msg = f"Expected {expected}, got {ranges}"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+
+def test_consolidated_storage(monkeypatch):
+    """Test that consolidated mode maps every year to a single database."""
+    monkeypatch.setattr(
+        setup_db, "storage_config", lambda: ("consolidated", "expenses.db")
+    )
+    if (
+        setup_db.db_path(2023) != "expenses.db"
+        or setup_db.db_path(2024) != "expenses.db"
+    ):
+        error_msg = (
+            "All years should share the consolidated database"  # pragma: no cover
+        )
+        raise AssertionError(error_msg)
+    ranges = setup_db.split_range_by_db("2023-11-15", "2025-01-01")
+    if ranges != [(2023, "2023-11-15", "2025-01-01")]:
+        error_msg = f"Expected a single range, got {ranges}"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+
+def test_rollups_follow_expense_writes():
+    """Test that triggers keep daily and monthly totals current."""
+    conn = connect_db(2024)
+    conn.executemany(
+        "INSERT INTO expenses (date, price_sgd) VALUES (?, ?)",
+        [("2024-01-05", 10), ("2024-01-05 00:00:00", 5), ("2024-02-01", None)],
+    )
+    conn.execute("UPDATE expenses SET price_sgd = 7 WHERE date = '2024-02-01'")
+    conn.execute("UPDATE expenses SET date = '2024-01-06' WHERE price_sgd = 5")
+    conn.execute("DELETE FROM expenses WHERE price_sgd = 7")
+    conn.commit()
+
+    daily = conn.execute("SELECT day, total FROM daily_totals ORDER BY day").fetchall()
+    monthly = conn.execute("SELECT month, total FROM monthly_totals").fetchall()
+    if daily != [("2024-01-05", 10.0), ("2024-01-06", 5.0)]:
+        error_msg = f"Unexpected daily totals, got {daily}"  # pragma: no cover
+        raise AssertionError(error_msg)
+    if monthly != [("2024-01", 15.0)]:
+        error_msg = f"Unexpected monthly totals, got {monthly}"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+    # A rebuild from the raw table must agree with the incremental totals
+    setup_db.rebuild_rollups(conn)
+    rebuilt = conn.execute(
+        "SELECT day, total FROM daily_totals ORDER BY day"
+    ).fetchall()
+    conn.close()
+    if rebuilt != daily:
+        error_msg = f"Rebuilt totals differ, got {rebuilt}"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+
+def test_data_versions_bump_on_expense_changes():
+    """Test that each expense change bumps the version of its month."""
+    conn = connect_db(2024)
+    conn.execute("INSERT INTO expenses (date, price_sgd) VALUES ('2024-03-02', 1)")
+    conn.execute("INSERT INTO expenses (date, price_sgd) VALUES ('2024-03-09', 2)")
+    conn.execute("UPDATE expenses SET date = '2024-04-01' WHERE price_sgd = 2")
+    conn.commit()
+
+    versions = dict(conn.execute("SELECT month, version FROM data_versions"))
+    conn.close()
+    if versions != {"2024-03": 3, "2024-04": 1}:
+        error_msg = f"Unexpected data versions, got {versions}"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+
+def test_recurring_schedule_follows_recurring_writes():
+    """Test that triggers expand recurring expenses into per-month totals."""
+    conn = connect_db(2024)
+    conn.executemany(
+        "INSERT INTO recurring_expenses (start_date, end_date, price_sgd) VALUES (?, ?, ?)",
+        [("2024-01-15", "2024-03-10", 10), ("2024-02-01", "", 5)],
+    )
+    conn.execute(
+        "UPDATE recurring_expenses SET end_date = '2024-02-29' WHERE price_sgd = 10"
+    )
+    conn.commit()
+
+    schedule = conn.execute(
+        "SELECT month, total FROM recurring_schedule WHERE month <= '2024-04'"
+    ).fetchall()
+    last_month = conn.execute("SELECT MAX(month) FROM recurring_schedule").fetchone()[0]
+    if schedule != [
+        ("2024-01", 10.0),
+        ("2024-02", 15.0),
+        ("2024-03", 5.0),
+        ("2024-04", 5.0),
+    ]:
+        error_msg = f"Unexpected recurring schedule, got {schedule}"  # pragma: no cover
+        raise AssertionError(error_msg)
+    if last_month != setup_db.SCHEDULE_LAST_MONTH:
+        error_msg = f"Open-ended items should run to the horizon, got {last_month}"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+    # A rebuild from the raw table must agree with the incremental totals
+    full = conn.execute("SELECT * FROM recurring_schedule").fetchall()
+    setup_db.rebuild_recurring_schedule(conn)
+    if conn.execute("SELECT * FROM recurring_schedule").fetchall() != full:
+        error_msg = "Rebuilt schedule differs"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+    conn.execute("DELETE FROM recurring_expenses")
+    conn.commit()
+    remaining = conn.execute("SELECT COUNT(*) FROM recurring_schedule").fetchone()[0]
+    conn.close()
+    if remaining:
+        error_msg = (
+            f"Expected an empty schedule, got {remaining} rows"  # pragma: no cover
+        )
+        raise AssertionError(error_msg)
+
+
+def test_connect_db_applies_pragmas():
+    """Test that connections open in WAL mode with the configured PRAGMAs."""
+    conn = connect_db(2023)
+    journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    busy_timeout = conn.execute("PRAGMA busy_timeout").fetchone()[0]
+    conn.close()
+
+    if journal_mode != "wal" or busy_timeout != 5000:
+        error_msg = f"Unexpected PRAGMAs, got {journal_mode}, {busy_timeout}"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+
+@pytest.mark.parametrize(
+    "pragmas",
+    [{"temp_store_directory": "'/tmp'"}, {"synchronous": "OFF; DROP TABLE expenses"}],
+)
+def test_pragma_config_rejects_invalid_entries(monkeypatch, pragmas):
+    """Test that unknown PRAGMAs and unsafe values in the config are rejected."""
+    settings = Settings({"sqlite_pragmas": pragmas})
+    monkeypatch.setattr(setup_db, "get_settings", lambda: settings)
+    with pytest.raises(ValueError):
+        setup_db.pragma_config()
@@ -0,0 +1,88 @@
+"""This module contains tests for the setup_fx module."""
+
+import pytest
+from setup.setup_fx import FxRateStore
+
+
+@pytest.fixture
+def fx_store(tmp_path):
+    """Fixture to create an FxRateStore in a temporary directory."""
+    store = FxRateStore(str(tmp_path / "fx_rates.db"))
+    yield store
+    store.close()
+
+
+# pylint: disable=redefined-outer-name
+def test_lookup_rate_uses_nearest_previous_date(fx_store):
+    """Test that lookups return the rate recorded on or before the date."""
+    fx_store.record_rates("2024-01-01", "USD", {"SGD": 1.30, "EUR": 0.9})
+    fx_store.record_rates("2024-03-01", "USD", {"SGD": 1.35})
+
+    if fx_store.lookup_rate("USD", "SGD", "2024-02-15") != 1.30:
+        error_msg = "Expected the January rate for February"  # pragma: no cover
+        raise AssertionError(error_msg)
+    if fx_store.lookup_rate("USD", "SGD", "2024-03-01") != 1.35:
+        error_msg = "Expected the March rate on its own date"  # pragma: no cover
+        raise AssertionError(error_msg)
+    if fx_store.lookup_rate("USD", "SGD", "2023-12-31") is not None:
+        error_msg = (
+            "Expected no rate before the first recorded date"  # pragma: no cover
+        )
+        raise AssertionError(error_msg)
+
+
+def test_max_age_only_limits_dates_after_the_newest_rate(fx_store):
+    """Test that max_age_days bounds only lookups past the recorded history."""
+    fx_store.record_rates("2024-01-01", "USD", {"SGD": 1.30})
+    fx_store.record_rates("2024-03-01", "USD", {"SGD": 1.35})
+
+    if fx_store.lookup_rate("USD", "SGD", "2024-02-15", max_age_days=4) != 1.30:
+        error_msg = (
+            "Dates inside the history should use the nearest rate"  # pragma: no cover
+        )
+        raise AssertionError(error_msg)
+    if fx_store.lookup_rate("USD", "SGD", "2024-03-10", max_age_days=4) is not None:
+        error_msg = (
+            "A rate 9 days past the newest should be too old"  # pragma: no cover
+        )
+        raise AssertionError(error_msg)
+    rates = fx_store.lookup_rates(
+        "USD",
+        "SGD",
+        ["2024-02-15", "2024-03-01", "2024-03-05", "2024-03-06"],
+        max_age_days=4,
+    )
+    if rates != [1.30, 1.35, 1.35, None]:
+        error_msg = f"Unexpected bounded rates, got {rates}"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+
+def test_lookup_rate_inverse_and_same_currency(fx_store):
+    """Test inverse lookups and the identity rate."""
+    fx_store.record_rates("2024-01-01", "SGD", {"USD": 0.8})
+
+    if fx_store.lookup_rate("USD", "SGD", "2024-06-01") != pytest.approx(1.25):
+        error_msg = "Expected the inverse of the SGD->USD rate"  # pragma: no cover
+        raise AssertionError(error_msg)
+    if fx_store.lookup_rate("SGD", "SGD", "2024-06-01") != 1.0:
+        error_msg = "Same-currency rate should be 1.0"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+
+def test_lookup_rates_and_rate_file(fx_store, tmp_path):
+    """Test bulk lookups against rates loaded from a stand-in CSV file."""
+    rate_file = tmp_path / "rates.csv"
+    rate_file.write_text(
+        "date,base,quote,rate\n2024-01-01,EUR,SGD,1.45\n2024-02-01,EUR,SGD,1.47\n",
+        encoding="utf-8",
+    )
+    if fx_store.load_rate_file(str(rate_file)) != 2:
+        error_msg = "Expected two rows loaded from the rate file"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+    rates = fx_store.lookup_rates(
+        "EUR", "SGD", ["2023-12-01", "2024-01-20", "2024-02-01", "2024-05-05"]
+    )
+    if rates != [None, 1.45, 1.47, 1.47]:
+        error_msg = f"Unexpected bulk lookup result, got {rates}"  # pragma: no cover
+        raise AssertionError(error_msg)
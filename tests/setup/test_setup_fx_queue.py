@@ -0,0 +1,130 @@
+"""This module contains tests for the setup_fx_queue module."""
+
+from unittest.mock import patch, MagicMock
+import pytest
+import requests
+from setup.setup_db import connect_db
+from setup.setup_fx import FxRateStore
+from setup.setup_fx_queue import FxConversionQueue
+
+
+@pytest.fixture
+def pending_expenses(tmp_path):
+    """Fixture to create a year database with pending expenses."""
+    conn = connect_db(2024)
+    conn.executemany(
+        """INSERT INTO expenses (date, category, item, location, price, currency,
+            price_sgd) VALUES (?, 'Food', 'Lunch', 'Cafe', ?, ?, NULL)""",
+        [
+            ("2024-01-05", 10, "USD"),
+            ("2024-01-06", 20, "USD"),
+            ("2024-01-07", 30, "EUR"),
+        ],
+    )
+    conn.commit()
+    conn.close()
+    return tmp_path
+
+
+# pylint: disable=redefined-outer-name, unused-argument
+def test_process_batch_groups_by_currency(pending_expenses):
+    """Test that a batch settles all rows with one rate lookup per currency."""
+    fx_store = FxRateStore(str(pending_expenses / "fx_rates.db"))
+    # Stored rates are only used within the cache TTL of each expense's date
+    fx_store.record_rates("2024-01-05", "USD", {"SGD": 1.5})
+    fx_store.record_rates("2024-01-06", "USD", {"SGD": 1.5})
+    mock_cache = MagicMock()
+    mock_cache.get_rates.return_value = {"SGD": 2.0}
+
+    fx_queue = FxConversionQueue("http://api.example.com/")
+    batch = [
+        (2024, 1, 10, "USD", "2024-01-05"),
+        (2024, 2, 20, "USD", "2024-01-06"),
+        (2024, 3, 30, "EUR", "2024-01-07"),
+    ]
+    with patch("setup.setup_fx_queue.setup_stg.get_fx_store", return_value=fx_store):
+        with patch(
+            "setup.setup_fx_queue.setup_stg.get_rate_cache", return_value=mock_cache
+        ):
+            settled = fx_queue.process_batch(batch)
+
+    if settled != 3:
+        error_msg = f"Expected 3 settled conversions, got {settled}"  # pragma: no cover
+        raise AssertionError(error_msg)
+    # USD is answered by the local store, EUR needs one API lookup
+    mock_cache.get_rates.assert_called_once_with("http://api.example.com/", "EUR")
+
+    conn = connect_db(2024)
+    prices = [
+        row[0] for row in conn.execute("SELECT price_sgd FROM expenses ORDER BY id")
+    ]
+    conn.close()
+    fx_store.close()
+    if prices != [15.0, 30.0, 60.0]:
+        error_msg = f"Unexpected converted prices, got {prices}"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+
+def test_submit_runs_in_background(pending_expenses):
+    """Test that submitted conversions are settled by the worker thread."""
+    fx_queue = FxConversionQueue("http://api.example.com/", batch_wait=0.01)
+    with patch.object(fx_queue, "process_batch") as mock_process_batch:
+        if fx_queue.enqueue_pending(2024) != 3:
+            error_msg = "Expected 3 pending expenses to be queued"  # pragma: no cover
+            raise AssertionError(error_msg)
+        fx_queue.join()
+
+    queued = sum(len(c.args[0]) for c in mock_process_batch.call_args_list)
+    if queued != 3:
+        error_msg = (
+            f"Expected 3 conversions processed, got {queued}"  # pragma: no cover
+        )
+        raise AssertionError(error_msg)
+
+
+def test_worker_survives_rate_api_errors(pending_expenses):
+    """Test that a network error is retried and does not stop the worker."""
+    fx_queue = FxConversionQueue(
+        "http://api.example.com/", batch_wait=0.01, retry_delay=0
+    )
+    with patch.object(
+        fx_queue,
+        "process_batch",
+        side_effect=[requests.ConnectionError("offline"), 1, 1],
+    ) as mock_process_batch:
+        fx_queue.submit(2024, 1, 10, "USD", "2024-01-05")
+        fx_queue.join()
+        worker_alive = fx_queue._worker.is_alive()  # pylint: disable=protected-access
+        fx_queue.submit(2024, 2, 20, "USD", "2024-01-06")
+        fx_queue.join()
+
+    if not worker_alive:
+        error_msg = (
+            "The worker should keep running after a network error"  # pragma: no cover
+        )
+        raise AssertionError(error_msg)
+    if mock_process_batch.call_count != 3:
+        error_msg = f"Expected one retry, got {mock_process_batch.call_count} calls"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+
+def test_enqueue_all_pending_covers_every_year(pending_expenses):
+    """Test that startup recovery queues pending rows from each year file."""
+    conn = connect_db(2023)
+    conn.execute(
+        """INSERT INTO expenses (date, price, currency, price_sgd)
+            VALUES ('2023-05-01', 5, 'USD', NULL)"""
+    )
+    conn.commit()
+    conn.close()
+
+    fx_queue = FxConversionQueue("http://api.example.com/")
+    with patch.object(fx_queue, "submit") as mock_submit:
+        queued = fx_queue.enqueue_all_pending()
+
+    years = sorted({c.args[0] for c in mock_submit.call_args_list})
+    if queued != 4 or years != [2023, 2024]:
+        error_msg = (
+            f"Unexpected recovery, got {queued} rows for {years}"  # pragma: no cover
+        )
+        raise AssertionError(error_msg)
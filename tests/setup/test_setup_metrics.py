@@ -0,0 +1,141 @@
+"""This module contains tests for the setup_metrics module."""
+
+import pytest
+from flask import Flask
+from setup import setup_db, setup_metrics
+from routes.plot_routes import plot_bp, chart_cache
+
+
+# pylint: disable=redefined-outer-name
+@pytest.fixture
+def metrics(monkeypatch):
+    """Fixture to install a fresh metrics registry."""
+    registry = setup_metrics.Metrics()
+    monkeypatch.setattr(setup_metrics, "metrics", registry)
+    return registry
+
+
+@pytest.fixture
+def client(metrics):  # pylint: disable=unused-argument
+    """Fixture to create an instrumented Flask test client over a real database."""
+    app = Flask(__name__, template_folder="../../templates")
+    app.register_blueprint(plot_bp)
+    setup_metrics.init_app(app)
+    chart_cache.clear()
+
+    conn = setup_db.connect_db(2024)
+    conn.executemany(
+        "INSERT INTO expenses (date, price_sgd) VALUES (?, ?)",
+        [("2024-03-01", 10.0), ("2024-03-04", 20.0)],
+    )
+    conn.commit()
+    conn.close()
+
+    with app.test_client() as client:
+        yield client
+
+
+def test_connections_are_plain_when_disabled(monkeypatch):
+    """Test that connections are not instrumented unless metrics are enabled."""
+    monkeypatch.setattr(setup_metrics, "metrics", setup_metrics.Metrics())
+
+    conn = setup_db.connect_db(2024)
+    conn.close()
+
+    if isinstance(conn, setup_metrics.InstrumentedConnection):
+        error_msg = (
+            "Connections should not be instrumented by default"  # pragma: no cover
+        )
+        raise AssertionError(error_msg)
+
+
+def test_server_timing_header(client):
+    """Test that responses break down their SQL and serialization time."""
+    response = client.get("/api/series/month?year=2024&month=3")
+
+    if response.status_code != 200:
+        error_msg = (
+            f"Expected status code 200, got {response.status_code}"  # pragma: no cover
+        )
+        raise AssertionError(error_msg)
+    server_timing = response.headers.get("Server-Timing", "")
+    for entry in ("total;dur=", "sql;dur=", "serialize;dur="):
+        if entry not in server_timing:
+            error_msg = (
+                f"Missing {entry} in Server-Timing: {server_timing}"  # pragma: no cover
+            )
+            raise AssertionError(error_msg)
+
+
+def test_template_render_is_timed(client):
+    """Test that template rendering is recorded."""
+    response = client.get("/plot_expenditure")
+
+    if "render;dur=" not in response.headers.get("Server-Timing", ""):
+        error_msg = (
+            "Template render time should be in Server-Timing"  # pragma: no cover
+        )
+        raise AssertionError(error_msg)
+
+
+def test_sql_metrics_count_statements_and_rows(client, metrics):
+    """Test that SQL totals count each statement once along with its rows."""
+    client.get("/api/series/month?year=2024&month=3")
+
+    selects = [
+        totals
+        for (kind, labels), totals in metrics.snapshot().items()
+        if kind == "sql"
+        and dict(labels) == {"endpoint": "plot.month_series", "operation": "SELECT"}
+    ]
+    if not selects:
+        error_msg = (
+            "SELECT statements should be recorded per endpoint"  # pragma: no cover
+        )
+        raise AssertionError(error_msg)
+    count, _, rows = selects[0]
+    # The data version lookup, the daily series and the recurring schedule queries
+    if count != 3 or rows < 2:
+        error_msg = f"Unexpected SELECT totals: {selects[0]}"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+
+def test_metrics_endpoint(client):
+    """Test that /metrics serves the totals in the Prometheus text format."""
+    client.get("/api/series/month?year=2024&month=3")
+
+    response = client.get("/metrics")
+    body = response.get_data(as_text=True)
+
+    if not response.content_type.startswith("text/plain"):
+        error_msg = (
+            f"Unexpected content type {response.content_type}"  # pragma: no cover
+        )
+        raise AssertionError(error_msg)
+    for line in (
+        "# TYPE finance_request_duration_seconds summary",
+        'finance_request_duration_seconds_count{endpoint="plot.month_series",'
+        'method="GET",status="200"} 1',
+        "# TYPE finance_sql_rows_total counter",
+    ):
+        if line not in body:
+            error_msg = f"Missing {line!r} in metrics output"  # pragma: no cover
+            raise AssertionError(error_msg)
+
+
+def test_timed_records_outside_requests(metrics):
+    """Test that timings outside a request are labelled as background work."""
+    metrics.enabled = True
+    with setup_metrics.timed("fx", base="USD"):
+        pass
+
+    if ("fx", (("base", "USD"), ("endpoint", "background"))) not in metrics.snapshot():
+        error_msg = f"Unexpected series: {metrics.snapshot()}"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+
+def test_format_labels_escapes_values():
+    """Test that label values are escaped for the text format."""
+    if setup_metrics.format_labels([("path", 'a"b\\c')]) != '{path="a\\"b\\\\c"}':
+        error_msg = "Label values should be escaped"  # pragma: no cover
+        raise AssertionError(error_msg)
@@ -1,16 +1,21 @@
 """This module contains tests for the setup_stg module."""
 
-from unittest.mock import patch
+from unittest.mock import patch, MagicMock
 import pytest
-from setup.setup_stg import cfg_setup
+from setup import setup_stg
+from setup.setup_config import Settings
+from setup.setup_fx import FxRateStore
+from setup.setup_stg import cfg_setup, RateCache
 
 # filepath: c:\Users\waele\Documents\Github\Finance_Track_Web\setup\test_setup_stg.py
 
 
-@patch("setup.setup_stg.yaml.safe_load")
-def test_cfg_setup_with_valid_api_key(mock_safe_load):
+@patch("setup.setup_stg.get_settings")
+def test_cfg_setup_with_valid_api_key(mock_get_settings):
     """Test cfg_setup with a valid API key."""
-    mock_safe_load.return_value = {"error_bypass": False, "api_key": "valid_api_key"}
+    mock_get_settings.return_value = Settings(
+        {"error_bypass": False, "api_key": "valid_api_key"}
+    )
     api_key, error_bypass = cfg_setup()
     if api_key != "valid_api_key":
         error_msg = "API Key should be 'valid_api_key'!"  # pragma: no cover
@@ -20,10 +25,10 @@ def test_cfg_setup_with_valid_api_key(mock_safe_load):
         raise AssertionError(error_msg)
 
 
-@patch("setup.setup_stg.yaml.safe_load")
-def test_cfg_setup_with_missing_api_key_and_error_bypass(mock_safe_load):
+@patch("setup.setup_stg.get_settings")
+def test_cfg_setup_with_missing_api_key_and_error_bypass(mock_get_settings):
     """Test cfg_setup with a missing API key and error_bypass enabled."""
-    mock_safe_load.return_value = {"error_bypass": True, "api_key": ""}
+    mock_get_settings.return_value = Settings({"error_bypass": True, "api_key": ""})
     api_key, error_bypass = cfg_setup()
     if api_key is not None:
         error_msg = "API Key should be None!"  # pragma: no cover
@@ -33,14 +38,34 @@ def test_cfg_setup_with_missing_api_key_and_error_bypass(mock_safe_load):
         raise AssertionError(error_msg)
 
 
-@patch("setup.setup_stg.yaml.safe_load")
-def test_cfg_setup_with_missing_api_key_and_no_error_bypass(mock_safe_load):
+@patch("setup.setup_stg.get_settings")
+def test_cfg_setup_with_missing_api_key_and_no_error_bypass(mock_get_settings):
     """Test cfg_setup with a missing API key and error_bypass disabled."""
-    mock_safe_load.return_value = {"error_bypass": False, "api_key": ""}
+    mock_get_settings.return_value = Settings({"error_bypass": False, "api_key": ""})
     with pytest.raises(ValueError, match="API Key is empty in user_config.yaml!"):
         cfg_setup()
 
 
+def test_get_api_url_is_resolved_once_per_key(monkeypatch):
+    """Test that the API URL is built from the settings once per API key."""
+    settings = Settings({"error_bypass": False, "api_key": "key"})
+    monkeypatch.setattr(setup_stg, "get_settings", lambda: settings)
+    cfg = MagicMock(wraps=cfg_setup)
+    monkeypatch.setattr(setup_stg, "cfg_setup", cfg)
+    setup_stg.api_url_for.cache_clear()
+    try:
+        urls = {setup_stg.get_api_url() for _ in range(3)}
+    finally:
+        setup_stg.api_url_for.cache_clear()
+
+    if urls != {"https://v6.exchangerate-api.com/v6/key/latest/"}:
+        error_msg = f"Unexpected API URLs: {urls}"  # pragma: no cover
+        raise AssertionError(error_msg)
+    if cfg.call_count != 1:
+        error_msg = "The API key should be checked once"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+
 # Skip convert_to_sgd tests due to API key requirement
 # @patch("setup.setup_stg.requests.get")
 # def test_convert_to_sgd_with_sgd_currency():
@@ -70,3 +95,117 @@ def test_cfg_setup_with_missing_api_key_and_no_error_bypass(mock_safe_load):
 #
 #    result = convert_to_sgd("http://api.example.com/", 100, "USD")
 #    assert result is None
+
+
+@patch("setup.setup_stg.requests.get")
+def test_rate_cache_reuses_rates_within_ttl(mock_get, tmp_path):
+    """Test that RateCache fetches each base currency once within the TTL."""
+    mock_response = MagicMock()
+    mock_response.status_code = 200
+    mock_response.json.return_value = {"conversion_rates": {"SGD": 1.35, "EUR": 0.9}}
+    mock_get.return_value = mock_response
+
+    cache = RateCache(ttl=60, path=str(tmp_path / "fx_cache.json"))
+    first_rates = cache.get_rates("http://api.example.com/", "USD")
+    second_rates = cache.get_rates("http://api.example.com/", "USD")
+
+    if first_rates != second_rates or first_rates["SGD"] != 1.35:
+        error_msg = f"Unexpected rates, got {first_rates}"  # pragma: no cover
+        raise AssertionError(error_msg)
+    mock_get.assert_called_once_with("http://api.example.com/USD", timeout=100)
+
+
+@patch("setup.setup_stg.requests.get")
+def test_rate_cache_persists_to_disk(mock_get, tmp_path):
+    """Test that a new RateCache is warm from the persisted file."""
+    cache_path = str(tmp_path / "fx_cache.json")
+    RateCache(ttl=60, path=cache_path).put("USD", {"SGD": 1.35})
+
+    rates = RateCache(ttl=60, path=cache_path).get_rates(
+        "http://api.example.com/", "USD"
+    )
+
+    if rates != {"SGD": 1.35}:
+        error_msg = f"Expected persisted rates, got {rates}"  # pragma: no cover
+        raise AssertionError(error_msg)
+    mock_get.assert_not_called()
+
+
+@patch("setup.setup_stg.time.time")
+@patch("setup.setup_stg.requests.get")
+def test_rate_cache_expires_and_falls_back(mock_get, mock_time, tmp_path):
+    """Test that expired rates are refetched and reused if the API fails."""
+    mock_time.return_value = 1000.0
+    cache = RateCache(ttl=60, path=str(tmp_path / "fx_cache.json"))
+    cache.put("USD", {"SGD": 1.35})
+
+    mock_time.return_value = 2000.0
+    mock_response = MagicMock()
+    mock_response.status_code = 500
+    mock_get.return_value = mock_response
+
+    rates = cache.get_rates("http://api.example.com/", "USD")
+
+    mock_get.assert_called_once()
+    if rates != {"SGD": 1.35}:
+        error_msg = f"Expected stale rates as fallback, got {rates}"  # pragma: no cover
+        raise AssertionError(error_msg)
+
+
+@pytest.fixture
+def weekday_rates(tmp_path, monkeypatch):
+    """Fixture with USD rates stored for Fri 2025-03-07 and Mon 2025-03-10."""
+    store = FxRateStore(str(tmp_path / "fx_rates.db"))
+    store.record_rates("2025-03-07", "USD", {"SGD": 1.30})
+    store.record_rates("2025-03-10", "USD", {"SGD": 1.32})
+    monkeypatch.setattr(setup_stg, "get_fx_store", lambda: store)
+    monkeypatch.setattr(
+        setup_stg, "get_settings", lambda: Settings({"fx_rate_max_age_days": 4})
+    )
+    cache = RateCache(ttl=60, path=str(tmp_path / "fx_cache.json"))
+    monkeypatch.setattr(setup_stg, "get_rate_cache", lambda: cache)
+    yield store
+    store.close()
+
+
+# pylint: disable=redefined-outer-name,unused-argument
+@patch("setup.setup_stg.requests.get")
+def test_stored_rates_cover_weekends_offline(mock_get, weekday_rates):
+    """Test that dates without a stored rate use the previous one offline."""
+    dates = ["2025-03-08", "2025-03-09", "2025-03-11"]
+
+    single = [setup_stg.convert_to_sgd(None, 10, "USD", on_date=d) for d in dates]
+    many = setup_stg.convert_many_to_sgd(None, "USD", [10, 10, 10], dates)
+
+    expected = [pytest.approx(13.0), pytest.approx(13.0), pytest.approx(13.2)]
+    if single != expected:
+        error_msg = f"Unexpected single conversions, got {single}"  # pragma: no cover
+        raise AssertionError(error_msg)
+    if many != expected:
+        error_msg = f"Unexpected bulk conversions, got {many}"  # pragma: no cover
+        raise AssertionError(error_msg)
+    mock_get.assert_not_called()
+
+
+@patch("setup.setup_stg.requests.get")
+def test_old_stored_rates_fall_back_to_the_api(mock_get, weekday_rates):
+    """Test that the newest stored rate is not reused past the max age."""
+    mock_response = MagicMock()
+    mock_response.status_code = 200
+    mock_response.json.return_value = {"conversion_rates": {"SGD": 1.35}}
+    mock_get.return_value = mock_response
+
+    single = setup_stg.convert_to_sgd(
+        "http://api.example.com/", 100, "USD", on_date="2025-10-18"
+    )
+    many = setup_stg.convert_many_to_sgd(
+        "http://api.example.com/", "USD", [100, 100], ["2025-03-08", "2025-10-18"]
+    )
+
+    if single != pytest.approx(135.0):
+        error_msg = f"Expected the latest rate, got {single}"  # pragma: no cover
+        raise AssertionError(error_msg)
+    if many != [pytest.approx(130.0), pytest.approx(135.0)]:
+        error_msg = f"Unexpected bulk conversion, got {many}"  # pragma: no cover
+        raise AssertionError(error_msg)
+    mock_get.assert_called_once_with("http://api.example.com/USD", timeout=100)
@@ -1,8 +1,11 @@
 """This module contains tests for the main module."""
 
 import os
+import subprocess
+import sys
 from unittest.mock import patch
 from main import create_app
+from setup.setup_config import Settings
 
 
 @patch("main.register_blueprints")
@@ -15,6 +18,21 @@ def test_register_blueprints_called(mock_register_blueprints):
     mock_register_blueprints.assert_called_once_with(app)
 
 
+@patch("main.setup_fx_queue.recover_pending")
+@patch("main.setup_stg.get_api_url", return_value="http://api.example.com/")
+def test_pending_conversions_recovered_on_start(_mock_api_url, mock_recover):
+    """Test that async FX conversion re-queues pending rows at startup."""
+    with patch(
+        "main.get_settings", return_value=Settings({"async_fx_conversion": True})
+    ):
+        create_app()
+    mock_recover.assert_called_once_with("http://api.example.com/")
+
+    mock_recover.reset_mock()
+    create_app()
+    mock_recover.assert_not_called()
+
+
 @patch("os.getenv")
 def test_debug_mode_enabled(mock_getenv):
     """Test if debug mode is enabled when FLASK_DEBUG is set to 'True'."""
@@ -49,3 +67,27 @@ def test_app_secret_key():
     if len(app.secret_key) <= 0:
         error_msg = "Secret key should not be empty."  # pragma: no cover
         raise AssertionError(error_msg)
+
+
+def test_import_defers_heavy_dependencies():
+    """Test that starting the app does not import the Excel import or export stack."""
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, main; "
+            "print('loaded:', [m for m in "
+            "('pandas', 'numpy', 'openpyxl', 'plotly', 'pyarrow') "
+            "if m in sys.modules])",
+        ],
+        cwd=repo_root,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    loaded = result.stdout.rsplit("loaded:", 1)[-1].strip()
+    if loaded != "[]":
+        error_msg = f"Heavy modules imported at startup: {loaded}"  # pragma: no cover
+        raise AssertionError(error_msg)